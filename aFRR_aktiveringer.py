@@ -1,15 +1,15 @@
 #pip install -r requirements.txt
 
+import os
+
 import streamlit as st
 import numpy as np
 import pandas as pd
-import requests
-import matplotlib.pyplot as plt
 
-from datetime import date, datetime, timedelta, time
-from dateutil.relativedelta import relativedelta
-from zoneinfo import ZoneInfo
-import holidays
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import flex_beregner as fb
 
 ############## Layout ##############
 
@@ -29,40 +29,81 @@ st.markdown("<hr style='border:2px solid black'>", unsafe_allow_html=True)
 
 #######################################################################################################
 # Init: Nulstil filtreret data ved rerun
+#
+# Hukommelse: aktiveringsdata ligger én gang pr. maskine (memory-mappet, delt af alle sessioner og processer).
+# En session holder kun beregningsgrafens knuder (én værdi pr. knude, se flex_beregner/graf.py):
+#   udsnit          views på de delte arrays (ingen kopi)
+#   priser          timepriser for perioden (~100 bytes pr. time)
+#   justering       heltalsindeks fra hvert sekund ind i spot- og rådighedspriserne (16 bytes pr. sekund)
+#   tarif           strømpris pr. sekund (8 bytes pr. sekund)
+#   aktivering      summer pr. position i aktiveringsforløbene (24 bytes pr. sekund i det længste forløb)
+#   tidsserie       tidsserien pr. sekund for perioder op til fb.MAKS_DETALJE_SEKUNDER (7 dage, ~100 MB)
 if "filters_applied" not in st.session_state:
-    st.session_state.df_filtered = None
     st.session_state.filters_applied = False
 
-    st.session_state.df_filtered_2 = None # spotpriser
-    st.session_state.spot_applied = False
-
 ################################################################################################################################################
 ############## Hent data ##############
-@st.cache_data(ttl=2592000)  # 30 dage
-def load_data_parquet(path):
-    cols_needed = ['ActivationTime', 'PriceArea', 'aFRR_DownActivatedPriceEUR', 'aFRR_UpActivatedPriceEUR']
-    df = pd.read_parquet(path, columns=cols_needed)
-
-    # Rename til dine ønskede navne
-    df.columns = ['Tid (UTC)', 'Synkronområde', 'aFRR-ned aktiveringspris (EUR)', 'aFRR-op aktiveringspris (EUR)']
-
-    # Konverter EUR til DKK
-    df["aFRR-ned aktiveringspris (DKK)"] = df["aFRR-ned aktiveringspris (EUR)"] * 7.45
-    df["aFRR-op aktiveringspris (DKK)"] = df["aFRR-op aktiveringspris (EUR)"] * 7.45
-    
-    # Tidshåndtering
-    df['Tid (UTC)'] = pd.to_datetime(df['Tid (UTC)'], utc=True)
-    df['Tid (DK)'] = df['Tid (UTC)'].dt.tz_convert(ZoneInfo('Europe/Copenhagen'))
-    
-    return df
-
-#df_data = load_data_parquet('./data/aFRR_aktiveringsdata_kopi.parquet')
-if "df_data" not in st.session_state:
-    #st.session_state.df_data = load_data_parquet('./data/aFRR_aktiveringsdata_20250627.parquet')
-    #st.session_state.df_data = load_data_parquet('./data/aFRR_aktiveringsdata_kopi.parquet')
-     st.session_state.df_data = load_data_parquet('./data/aFRR_aktiveringsdata_kopi.parquet')
-    
-df_data = st.session_state.df_data
+# Selve beregningerne ligger i flex_beregner - her caches de blot pr. Streamlit-proces
+DATA_STI = './data/aFRR_aktiveringsdata_kopi.parquet'
+LAGER_STI = './data/aktiveringsdata'  # partitioneret pr. PriceArea og måned
+PRISCACHE_STI = './data/api_cache'    # vedvarende cache af svar fra Energi Data Service
+INDBAKKE_STI = './data/indbakke'      # nye filer med aktiveringsdata (parquet/csv med Energinets kolonner) droppes her
+INDLÆSNING_URL = os.environ.get("AFRR_INDLAESNING_URL")  # alternativt: filserver med manifest.json
+MÅLELOG_STI = os.environ.get("AFRR_MAALELOG")             # JSON-linjer med tid og hukommelse pr. trin (driftsovervågning)
+MÅLELOG_HISTORIK = 20                                     # kørsler der vises i diagnostikken
+LIVE_KILDE = os.environ.get("AFRR_LIVE_KILDE", fb.LIVE_STI)  # csv-fil der skrives til løbende, eller vært:port (JSON-linjer)
+LIVE_INTERVAL = 2                                         # sekunder mellem opdateringer af live-visningen
+
+# --------------------------------------------
+# Diagnostik: tid, rækker og hukommelse pr. trin for hver kørsel af siden.
+# Slået fra er fb.trin(...) blot et opslag - der måles ingenting
+# --------------------------------------------
+def arkivér_målelog(log):
+    log.afslut()
+    st.session_state.målelogs = (st.session_state.get("målelogs", []) + [log])[-MÅLELOG_HISTORIK:]
+    if MÅLELOG_STI:
+        log.gem(MÅLELOG_STI)
+
+if st.session_state.get("målelog") is not None:
+    arkivér_målelog(st.session_state.målelog)  # forrige kørsel blev stoppet undervejs (st.stop)
+if st.sidebar.checkbox("Diagnostik (tid og hukommelse pr. trin)", key="diagnostik"):
+    st.session_state.kørsel = st.session_state.get("kørsel", 0) + 1
+    st.session_state.målelog = fb.sæt_målelog(fb.Målelog(kørsel=st.session_state.kørsel))
+else:
+    st.session_state.målelog = fb.sæt_målelog(None)
+
+@st.cache_data(ttl=600, show_spinner="Kigger efter nye aktiveringsdata...")  # højst hvert 10. minut
+def lager_version(rod):
+    if not os.path.isdir(rod):
+        # Første opstart: byg det partitionerede lager ud fra den samlede parquet-fil
+        fb.skriv_partitioneret(DATA_STI, rod)
+    # Nye filer lægges ind i lageret og de kompakte kopier opdateres - uden genindlæsning og uden genstart
+    fejl = None
+    try:
+        fb.indlæs(rod, fb.HTTPKilde(INDLÆSNING_URL) if INDLÆSNING_URL else fb.Mappekilde(INDBAKKE_STI))
+    except Exception as e:
+        fejl = str(e)
+    return fb.lager_version(rod), fejl
+
+@st.cache_data(ttl=2592000)  # 30 dage (eller til lageret ændres)
+def lager_oversigt(rod, version):
+    return fb.lager_oversigt(rod)
+
+@st.cache_resource(ttl=2592000, max_entries=4)
+def tidsindeks(rod, Synkronområde, version):
+    # Områdets data mappes én gang ind som kompakt tidsindeks (skrivebeskyttet - deles mellem sessioner og processer):
+    # int64 sekunder + float32 EUR-priser. Perioder skæres herefter ud med binær søgning uden kopi.
+    # version skifter når der er indlæst nye data, så den nye fil mappes ind ved næste "Anvend filtre"
+    return fb.kortlæg_tidsindeks(rod, Synkronområde)
+
+@st.cache_resource(ttl=2592000, max_entries=4)
+def timekube(rod, Synkronområde, version):
+    # Aktiveringspriserne opsummeret pr. time (antal, sum, kvantiler, histogram) - til overblik og hurtige estimater
+    return fb.kortlæg_timekube(rod, Synkronområde)
+
+with fb.trin("lager"):
+    version, indlæsningsfejl = lager_version(LAGER_STI)
+    oversigt = lager_oversigt(LAGER_STI, version)
 
 ################################################################################################################################################
 ############## Sidehoved filter med input fra bruger ##############
@@ -75,13 +116,13 @@ with st.sidebar.form("filter_form"):
     st.subheader('Synkronområde')
     Synkronområde = st.selectbox(
         label='Vælg synkronområde',
-        options=df_data['Synkronområde'].unique(),
+        options=sorted(oversigt),
         key="område_valg"
     )
 
     st.subheader('Datointerval')
-    min_val = df_data['Tid (DK)'].min().date() + timedelta(days=1)
-    max_val = df_data['Tid (DK)'].max().date()
+    min_val = min(lav for lav, _ in oversigt.values()).tz_convert(fb.TIDSZONE).date() + timedelta(days=1)
+    max_val = max(høj for _, høj in oversigt.values()).tz_convert(fb.TIDSZONE).date()
     start_date = st.date_input('Start Dato', min_value=min_val, max_value=max_val, value=min_val)
     end_date = st.date_input('Slut Dato', min_value=min_val, max_value=max_val, value=max_val)
     if start_date > end_date:
@@ -96,6 +137,12 @@ with st.sidebar.form("filter_form"):
 
     submitted = st.form_submit_button("Anvend filtre")
 
+if st.sidebar.button("Hent nye aktiveringsdata"):
+    lager_version.clear()
+    st.rerun()
+if indlæsningsfejl:
+    st.sidebar.warning(f"Nye aktiveringsdata kunne ikke indlæses: {indlæsningsfejl}")
+
 ## Gem status i session_state
 if submitted:
     st.session_state["filtre_anvendt"] = True
@@ -112,13 +159,9 @@ else:
 # Filtrering af data
 # --------------------------------------------
 if submitted:
-    mask = (
-        (df_data['Synkronområde'] == Synkronområde) &
-        (df_data['Tid (DK)'].dt.date >= start_date) &
-        (df_data['Tid (DK)'].dt.date <= end_date)
-    )
-    df_filtered = df_data.loc[mask].reset_index(drop=True)
-    st.session_state.df_filtered = df_filtered
+    indeks = tidsindeks(LAGER_STI, Synkronområde, version)
+    st.session_state.antal_dage = indeks.antal_dage(Synkronområde, start_date, end_date)
+    st.session_state.hukommelse_MB = indeks.hukommelse()["I alt"] / 1e6
     st.session_state.filters_applied = True
     st.session_state.applied_filters = {
         "Synkronområde": Synkronområde,
@@ -132,119 +175,47 @@ if submitted:
     }
 
 # --------------------------------------------
-# Spotdata (cached)
+# Spot- og rådighedspriser (cached)
 # --------------------------------------------
-@st.cache_data(ttl=2592000)
-def get_spotdata(Synkronområde, start_date, end_date):
-    url = "https://api.energidataservice.dk/dataset/Elspotprices"
+@st.cache_resource
+def prislager(rod):
+    # Deles af alle sessioner - henter kun de dage der ikke allerede ligger på disk
+    return fb.Prislager(rod)
 
-    params = {
-        "filter": f'{{"PriceArea":["{Synkronområde}"]}}',
-        "start": start_date.strftime("%Y-%m-%d"),
-        "end": (end_date + timedelta(days=1)).strftime("%Y-%m-%d"),
-    }
-    response = requests.get(url, params=params)
-    records = response.json().get('records', [])
-    df_spot = pd.DataFrame(records)
-    df_spot = df_spot.iloc[::-1].reset_index(drop=True)
-    df_spot["HourUTC"] = pd.to_datetime(df_spot["HourUTC"], utc=True)
-    df_spot["HourDK"] = pd.to_datetime(df_spot["HourDK"]).dt.tz_localize("Europe/Copenhagen")
-    return df_spot
-
-# --------------------------------------------
-# Vektoriseret tarif-beregning
-# --------------------------------------------
-def beregn_tarif(df, kundetype, lavlast, højlast, spidslast):
-    df = df.copy()
-    kolonne_0 = np.array([lavlast]*6 + [højlast]*11 + [spidslast]*4 + [højlast]*3)
-    kolonne_1 = np.array([lavlast]*6 + [spidslast]*15 + [højlast]*3)
-    kolonne_2 = np.array([lavlast]*6 + [højlast]*18)
-    kolonne_3 = np.array([lavlast]*24)
-    dk_holidays = holidays.Denmark()
-    
-    df['hour'] = df['HourDK'].dt.hour
-    df['weekday'] = df['HourDK'].dt.weekday
-    df['month'] = df['HourDK'].dt.month
-    df['is_holiday'] = df['HourDK'].dt.date.isin(dk_holidays)
-
-    if kundetype == "C":
-        df['tarif'] = kolonne_0[df['hour']]
-    else:
-        conditions = [
-            ((df['month'] >= 4) & (df['month'] <= 9)) & ((df['weekday'] >= 5) | df['is_holiday']),
-            ((df['month'] >= 4) & (df['month'] <= 9)) & ((df['weekday'] < 5) & (~df['is_holiday'])),
-            ((df['month'] < 4) | (df['month'] > 9)) & ((df['weekday'] >= 5) | df['is_holiday']),
-            ((df['month'] < 4) | (df['month'] > 9)) & ((df['weekday'] < 5) & (~df['is_holiday']))
-        ]
-        choices = [kolonne_3[df['hour']], kolonne_2[df['hour']], kolonne_2[df['hour']], kolonne_1[df['hour']]]
-        df['tarif'] = np.select(conditions, choices)
-    
-    return df
+@st.cache_data(ttl=2592000)
+def hent_prisdata(Synkronområde, start_date, end_date):
+    # Elspotprices og AfrrReservesNordic hentes samtidigt
+    return prislager(PRISCACHE_STI).hent_prisdata(Synkronområde, start_date, end_date)
 
 # --------------------------------------------
-# Hovedvisning
+# Beregningsgraf: udsnit og priser -> tidsjustering -> tarif -> rådighed -> aktivering -> resultat.
+# Knuderne gemmes i sessionen under en nøgle for deres input, så kun de knuder hvis input er ændret
+# regnes igen - og priserne følger altid de anvendte filtre
 # --------------------------------------------
-if st.session_state.filters_applied:
-    df_filtered2 = st.session_state.df_filtered.copy()
-    
-    # Spotdata
-    if "df_spot" not in st.session_state:
-        st.session_state.df_spot = get_spotdata(Synkronområde, start_date, end_date)
-    df_spot = st.session_state.df_spot
-    #st.dataframe(df_spot)
-
-    # Beregn tarif
-    df_spot = beregn_tarif(df_spot, kundetype, lavlast, højlast, spidslast)
-
-    # Map spotdata til df_filtered
-    df_filtered2['Tid_H'] = df_filtered2['Tid (UTC)'].dt.floor("H")
-    spot_map = df_spot.set_index(df_spot['HourUTC'].dt.floor("H"))
-    df_filtered2["Spotpriser (DKK)"] = df_filtered2["Tid_H"].map(spot_map["SpotPriceDKK"])
-    df_filtered2["tarif"] = df_filtered2["Tid_H"].map(spot_map["tarif"])
-    
-    # Eltarif + strømpris
-    df_spot["El-tariffer (DKK)"] = eltarif
-    df_spot["Strømpris (DKK)"] = df_spot["SpotPriceDKK"] + df_spot["tarif"] + df_spot["El-tariffer (DKK)"]
-    df_filtered2["El-tariffer (DKK)"] = eltarif
-    df_filtered2["Strømpris (DKK)"] = df_filtered2["Spotpriser (DKK)"] + df_filtered2["tarif"] + df_filtered2["El-tariffer (DKK)"]
-
-    st.session_state.df_filtered2 = df_filtered2
-    #st.dataframe(df_filtered2)
+def hent_udsnit(Synkronområde, start_date, end_date):
+    # Views på områdets memory-mappede tidsindeks
+    return tidsindeks(LAGER_STI, Synkronområde, version).arrays(Synkronområde, start_date, end_date)
+
+def hent_kube(Synkronområde):
+    return timekube(LAGER_STI, Synkronområde, version)
+
+graf = fb.aktiveringsgraf(hent_udsnit, hent_prisdata, cache=st.session_state.setdefault("graf", {}), hent_kube=hent_kube)
+periode = {
+    "Synkronområde": st.session_state.applied_filters["Synkronområde"],
+    "start_date": st.session_state.applied_filters["Startdato"],
+    "end_date": st.session_state.applied_filters["Slutdato"],
+    "version": version,
+}
+df_spot, df_kapacitet = graf.hent("priser", **periode)
 
 st.markdown("<hr style='border:2px solid black'>", unsafe_allow_html=True)
 
 ################################################################################################################################################
 ############## Rådighedspriser ############## 
 
-@st.cache_data(ttl=2592000)
-def Rådighedspriser(Synkronområde, start_date, end_date):
-
-    url = "https://api.energidataservice.dk/dataset/AfrrReservesNordic"
-    params = {"filter": f'{{"PriceArea":["{Synkronområde}"]}}',
-            "start": start_date.strftime("%Y-%m-%d"),
-            "end": (end_date + timedelta(days=1)).strftime("%Y-%m-%d"),
-            }
-    response = requests.get(url, params=params)
-    result = response.json()
-    records = result.get('records', [])
-    df = pd.DataFrame(records)
-    df = df.iloc[::-1].reset_index(drop=True)
-    df["TimeUTC"] = pd.to_datetime(df["TimeUTC"], utc=True)
-    df["TimeDK"] = pd.to_datetime(df["TimeDK"]).dt.tz_localize("Europe/Copenhagen")
-
-    return df
-
-if "df_kapacitet" not in st.session_state:
-    st.session_state.df_kapacitet = Rådighedspriser(Synkronområde, start_date, end_date)
-df_kapacitet = st.session_state.df_kapacitet
-
 ############## Layout ##############
 if st.session_state.filters_applied:
     st.markdown("#### Tabel med aFRR rådighedspriser i det valgte interval")
-    # rådighedspriser
-    if "df_kapacitet" not in st.session_state:
-        st.session_state.df_kapacitet = Rådighedspriser()
-    df_kapacitet = st.session_state.df_kapacitet
 
     # Vis brugte filtre
     filters = st.session_state.applied_filters
@@ -262,7 +233,18 @@ if st.session_state.filters_applied:
         unsafe_allow_html=True
     )
 
-    st.dataframe(df_kapacitet)
+    with fb.trin("vis_rådighedspriser") as m:
+        st.dataframe(df_kapacitet)
+        m.rækker = len(df_kapacitet)
+
+    with st.expander("🗓️ Overblik over aktiveringspriserne pr. dag (fra time-kuben - uden at læse sekunddata)"):
+        c1, c2 = st.columns(2)
+        tærskel_op = c1.number_input("Tæl sekunder med op-pris over [DKK/MWh]", value=0.0)
+        tærskel_ned = c2.number_input("Tæl sekunder med ned-pris under [DKK/MWh]", value=0.0)
+        kube = timekube(LAGER_STI, filters["Synkronområde"], version).udsnit(filters["Startdato"], filters["Slutdato"])
+        df_dagligt = kube.dagligt(tærskel_op, tærskel_ned)
+        st.line_chart(df_dagligt[["op middel (DKK)", "ned middel (DKK)"]])
+        st.dataframe(df_dagligt.round(1))
 
 else:
     pass
@@ -308,10 +290,7 @@ if kundepris_valg is not None:
 st.markdown("###### Indtast positive kW-værdier ind i manuelet eller brug knappen til at indsætte samme værdi ind i hele tabellen")
 # Initialiser input-tabel kun én gang
 if "df_input" not in st.session_state:
-    timer = [f"{h:02d}-{(h+1)%24:02d}" for h in range(24)]
-    ugedage = ["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag", "Lørdag", "Søndag"]
-    df = pd.DataFrame(0, index=timer, columns=ugedage)
-    st.session_state.df_input = df.copy() 
+    st.session_state.df_input = fb.tom_budprofil()
 
 #st.markdown('''<div style="color: green; font-size:16px; font-weight:bold;">- Op-reguleringsbud = indsæt positive værdier </div>
 #               <div style="color: red; font-size:16px; font-weight:bold;">- Ned-reguleringsbud = indsæt negative værdier </div>''', unsafe_allow_html=True)
@@ -452,232 +431,287 @@ st.markdown("<hr style='border:2px solid black'>", unsafe_allow_html=True)
 
 st.markdown("#### Beregninger")  
 
-st.markdown("<span style='color:blue'>Noter at hvis nogle af de ovenstående parametre ændres, så forsvinder rådighedsberegningen og skal laves igen ved at trykke på knappen nedenfor</span>", unsafe_allow_html=True)
-st.markdown(f"**Info:** Antal dage i det valgte datointerval = **{st.session_state.df_filtered['Tid (DK)'].dt.date.nunique()} dage**")
+st.markdown("<span style='color:blue'>Noter at hvis nogle af de ovenstående parametre ændres, så forsvinder rådighedsberegningen og skal laves igen ved at trykke på knappen nedenfor - kun de dele af beregningen der afhænger af de ændrede parametre regnes igen. Ændres kun delay og/eller ramp-up opdateres aktiveringsberegningen med det samme.</span>", unsafe_allow_html=True)
+st.markdown(f"**Info:** Antal dage i det valgte datointerval = **{st.session_state.antal_dage} dage**")
 st.markdown(f"Fleksibilitetspotentiale på markedet for **{st.session_state.applied_filters['Reguleringsretning']}**")
 
-def afrr_aktivering(retning, df, marginalpris, aktiveringspris):
-
-    if np.isnan(marginalpris):
-        marginalpris = 0
-
-        if retning == "aFRR-opregulering":
-            count = df[(aktiveringspris < df["aFRR-op aktiveringspris (DKK)"])].shape[0]
-            df["aFRR_op"] = np.where((aktiveringspris < df["aFRR-op aktiveringspris (DKK)"]), df["aFRR-op aktiveringspris (DKK)"], np.nan)
-            df["aFRR_op_strøm"] = np.where((aktiveringspris < df["aFRR-op aktiveringspris (DKK)"]), df["Strømpris (DKK)"], np.nan)
-            # meromkostning for at divere fra den oprindelige driftsplan:
-            df['Abs. forskel ift. marginalprisen'] = np.where((aktiveringspris < df["aFRR-op aktiveringspris (DKK)"]), 0, np.nan)
-            aFRR_navn = "aFRR_op"
-    
-        elif retning == "aFRR-nedregulering":
-            count = df[(-aktiveringspris > df["aFRR-ned aktiveringspris (DKK)"])].shape[0]
-            df["aFRR_ned"] = np.where((-aktiveringspris > df["aFRR-ned aktiveringspris (DKK)"]), -df["aFRR-ned aktiveringspris (DKK)"], np.nan)
-            df["aFRR_ned_strøm"] = np.where((-aktiveringspris > df["aFRR-ned aktiveringspris (DKK)"]), df["Strømpris (DKK)"], np.nan)
-            # meromkostning for at divere fra den oprindelige driftsplan:
-            df['Prisforskel i absolut værdi'] = np.where((-aktiveringspris > df["aFRR-ned aktiveringspris (DKK)"]), 0, np.nan)
-            aFRR_navn = "aFRR_ned"
-        else:
-            st.warning("! Fejl ifm. valg af reguleringsretning !")
-
-    else:
-        if retning == "aFRR-opregulering":
-            count = df[(marginalpris+aktiveringspris-df["Strømpris (DKK)"] < df["aFRR-op aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] < marginalpris)].shape[0]
-            df["aFRR_op"] = np.where((marginalpris+aktiveringspris-df["Strømpris (DKK)"] < df["aFRR-op aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] < marginalpris), df["aFRR-op aktiveringspris (DKK)"], np.nan)
-            df["aFRR_op_strøm"] = np.where((marginalpris+aktiveringspris-df["Strømpris (DKK)"] < df["aFRR-op aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] < marginalpris), df["Strømpris (DKK)"], np.nan)
-            # meromkostning for at divere fra den oprindelige driftsplan:
-            df['Prisforskel i absolut værdi'] = np.where((marginalpris+aktiveringspris-df["Strømpris (DKK)"] < df["aFRR-op aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] < marginalpris), (marginalpris - df['Strømpris (DKK)']).abs(), np.nan)
-            aFRR_navn = "aFRR_op"
-        
-        elif retning == "aFRR-nedregulering":
-            count = df[(marginalpris-aktiveringspris-df["Strømpris (DKK)"] > df["aFRR-ned aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] > marginalpris)].shape[0]
-            df["aFRR_ned"] = np.where((marginalpris-aktiveringspris-df["Strømpris (DKK)"] > df["aFRR-ned aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] > marginalpris), -df["aFRR-ned aktiveringspris (DKK)"], np.nan)
-            df["aFRR_ned_strøm"] = np.where((marginalpris-aktiveringspris-df["Strømpris (DKK)"] > df["aFRR-ned aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] > marginalpris), df["Strømpris (DKK)"], np.nan)
-            # meromkostning for at divere fra den oprindelige driftsplan:
-            df['Prisforskel i absolut værdi'] = np.where((marginalpris-aktiveringspris-df["Strømpris (DKK)"] > df["aFRR-ned aktiveringspris (DKK)"]) & (df["Strømpris (DKK)"] > marginalpris), (df['Strømpris (DKK)'] - marginalpris).abs(), np.nan)
-            aFRR_navn = "aFRR_ned"
-        else:
-            st.warning("! Fejl ifm. valg af reguleringsretning !")
-
-
-    return(count, aFRR_navn)
-
-def delay_function(delay_tid, rampup_tid, df, aFRR_navn):
-
-        # Lav en maske for, hvor aFRR_navn indeholder en værdi
-        mask = df[aFRR_navn].notna()
-
-        # Tæl hvor mange sekunder i træk aFRR_navn har været "aktiv"
-        df["aktiv serie"] = mask.groupby((~mask).cumsum()).cumsum()
+def lav_scenarie():
+    filters = st.session_state.applied_filters
+    if not (st.session_state.filters_applied and st.session_state.df_saved is not None and "Rådighedsbetaling" in filters and "Reguleringsretning" in filters):
+        return None
+
+    return fb.Scenarie(
+        Synkronområde=filters["Synkronområde"],
+        start_date=filters["Startdato"],
+        end_date=filters["Slutdato"],
+        reguleringsretning=filters["Reguleringsretning"],
+        budprofil=st.session_state.df_saved,
+        marginalpris=filters["Minimumspris"],
+        Rådighedsbetaling=filters["Rådighedsbetaling"],
+        Aktiveringsbetaling=filters["Aktiveringsbetaling"],
+        delay=delay,
+        ramp_up=ramp_up,
+        kundetype=filters["kundetype"],
+        lavlast=filters["lavlast"],
+        højlast=filters["højlast"],
+        spidslast=filters["spidslast"],
+        eltarif=filters["eltarif"],
+    )
 
-        # 3️⃣ Beregn aktiveringsprocent
-        # - Starter ved 0 før rampup_tid sek.
-        # - Stiger lineært fra 0 → 1 over delay_tid sek.
-        # - Bliver 1 (100%) derefter
-        df["aktivering"] = np.clip((df["aktiv serie"] - delay_tid) / rampup_tid, 0, 1)
+scenarie = lav_scenarie()
 
-        # 4️⃣ Beregn aktiveringsindtjening som aktiveret produkt
-        df["indtjening_aktiveringer"] = (df["bud_kw"]/1000) * df[aFRR_navn] * df["aktivering"]
+if scenarie is not None:
+    # Hurtigt estimat fra time-kuben - kan bruges til at vurdere scenariet før den fulde beregning.
+    # Knude i grafen, så det kun regnes igen når scenariet eller lageret ændres (ikke ved hver genkørsel)
+    with fb.trin("hurtigt_estimat"):
+        estimat = graf.hent("estimat", scenarie, version=version)
+    st.info(f"⚡ Hurtigt estimat (time-kube, uden delay og ramp-up): aktiveringsindtjening ≈ **{estimat['aktiveringsindtjening']:,.0f} DKK**, "
+            f"omkostninger ≈ {estimat['aktiveringsomkostninger']:,.0f} DKK, aktiveret ≈ {estimat['aktiveret_MWh']:,.1f} MWh i dataperioden")
 
-        # Beregn omkostninger ifm. aktiveret produkt
-        df["omkostninger_aktiveringer"] = (df["bud_kw"]/1000) * df["Prisforskel i absolut værdi"] * df["aktivering"]
+# Valgfri motor: DuckDB kører beregningen som én parallel SQL-plan direkte på parquet-lageret (kræver pip install duckdb)
+brug_duckdb = st.checkbox("Beregn med DuckDB direkte på parquet-filerne", value=False, disabled=not fb.duckdb_tilgængelig(),
+                          help="Samme resultat - aktiveringsdata læses og behandles af DuckDB i stedet for fra hukommelsen")
 
-        # Beregn aktiveret produkt MWh
-        df["aktiveret_MW"] = (df["bud_kw"]/1000) * df["aktivering"]
+if st.button("Lav Berening"):
 
-        return(df)
+    if scenarie is None:
+        st.warning("! Mangler enten at anvende filtre, gemme en ugeprofilm indtaste en minimumspris for at stå til rådgihed og/eller vælge en reguleringsretning !")
+        st.stop()
 
+    with st.spinner("Udfører hurtig vektoriseret beregning..."), fb.trin("beregning"):
+        if brug_duckdb:
+            st.session_state.resultat = fb.beregn_duckdb(scenarie, LAGER_STI, df_spot, df_kapacitet)
+            st.session_state.resultat_nøgle = scenarie.nøgle()
+        else:
+            # Kun knuderne hvis input er ændret siden sidst regnes
+            graf.hent("resultat", scenarie, version=version)
+            beregnede = graf.beregnede
+            graf.hent("tidsserie", scenarie, version=version)
+            beregnede += graf.beregnede
+            st.caption(f"Regnet igen: {', '.join(beregnede)}" if beregnede else "Alt var allerede beregnet")
+
+# Vis seneste beregning så længe kun delay/ramp-up er ændret siden - aktiveringstotalerne
+# regnes da direkte på de gemte summer pr. position i aktiveringsforløbene
+resultat = None
+if scenarie is not None and brug_duckdb and st.session_state.get("resultat_nøgle") == scenarie.nøgle():
+    try:
+        with fb.trin("aktiveringsspecifikationer"):
+            resultat = st.session_state.resultat.med_aktiveringsspecifikationer(delay, ramp_up)
+    except ValueError as fejl:
+        # DuckDB-resultatet dækker kun delay + ramp-up op til en time ud over det beregnede
+        st.warning(f"{fejl} - tryk 'Lav Berening' igen")
+        st.stop()
+elif scenarie is not None and not brug_duckdb and graf.ajour("aktivering", scenarie, version=version):
+    with fb.trin("aktiveringsspecifikationer"):
+        resultat = replace(graf.hent("resultat", scenarie, version=version),
+                           df_aktivering=graf.gemt("tidsserie", scenarie, version=version))
 
-if st.button("Lav Berening"):
+# --------------------------------------------
+# Resultatviser: kun én side eller en aggregering (time/dag/måned) sendes til browseren,
+# graferne decimeres til højst fb.MAKS_PUNKTER punkter pr. serie og hele tabellen hentes som fil
+# --------------------------------------------
+def vis_resultattabel(df, nøgle, filnavn):
+    visning = st.radio("Vis", ["Sider"] + list(fb.FREKVENSER), horizontal=True, key=f"{nøgle}_visning")
+    if visning == "Sider":
+        sider = fb.antal_sider(df)
+        nummer = st.number_input(f"Side (af {sider:,}, {fb.SIDESTØRRELSE:,} rækker pr. side)", min_value=1, value=1, key=f"{nøgle}_side")
+        st.dataframe(fb.side(df, nummer))
+    else:
+        st.dataframe(fb.aggreger(df, fb.FREKVENSER[visning]))
+
+    # Filen skrives først når der trykkes (i en tråd ved siden af scriptet)
+    for kolonne, filtype in zip(st.columns(len(fb.FILTYPER)), fb.FILTYPER):
+        kolonne.download_button(f"Hent alle {len(df):,} rækker ({filtype})", lambda filtype=filtype: fb.til_fil(df, filtype),
+                                file_name=f"{filnavn}.{filtype}", mime=fb.FILTYPER[filtype], key=f"{nøgle}_{filtype}", on_click="ignore")
+
+def vis_tidsseriegrafer(df, reguleringsretning):
+    metode = st.radio("Decimering", ["minmax", "lttb"], horizontal=True, key="decimering",
+                      help="minmax: første, mindste, største og sidste punkt pr. spand (bevarer toppe). lttb: Largest-Triangle-Three-Buckets")
+    st.caption(f"Graferne viser højst {fb.MAKS_PUNKTER:,} punkter pr. serie ud af {len(df):,} sekunder")
+    for kolonne, titel in ((fb.AKTIVERINGSPRIS[reguleringsretning], "Aktiveringspris [DKK/MWh]"),
+                           ("aktivering", "Aktiveringsgrad [0-1]"),
+                           ("indtjening_aktiveringer", "Aktiveringsindtjening [DKK/h]")):
+        st.markdown(f"###### {titel}")
+        st.line_chart(fb.decimer(df, kolonne, metode=metode))
+
+if resultat is not None:
+    filters = st.session_state.applied_filters
 
     col1, col2 = st.columns(2)
 
     with col1:
         st.markdown("##### Rådighedsberegninger")
 
-        if  st.session_state.filters_applied and "df_saved" in st.session_state and "Rådighedsbetaling" in st.session_state.applied_filters and "Reguleringsretning" in st.session_state.applied_filters:
-            #st.write(st.session_state.applied_filters['Minimumspris'])
-            #st.write(st.session_state.applied_filters['kundetype'])
-            #st.write(st.session_state.applied_filters['Rådighedsbetaling'])
-            
-            if st.session_state.applied_filters['Reguleringsretning'] == "aFRR-opregulering":
-                navn_reguleringsretning = "UpPriceDKK"
-            elif st.session_state.applied_filters['Reguleringsretning'] == "aFRR-nedregulering":
-                navn_reguleringsretning = "DownPriceDKK"
-            else:
-                st.warning("! Fejl ifm. valg af reguleringsretning !")
-                st.stop()
-            
-            df_prices = df_kapacitet.copy()
-
-            # Træk time og ugedag ud
-            df_prices["hour"] = df_prices["TimeDK"].dt.hour
-            df_prices["weekday"] = df_prices["TimeDK"].dt.day_name()
-
-            # Lav interval-kode som i budtabel
-            df_prices["interval"] = df_prices["hour"].apply(lambda h: f"{h:02d}-{(h+1)%24:02d}")
-
-            # Map engelske ugedage til danske (for at matche budtabel)
-            weekday_map = {
-                "Monday": "Mandag", "Tuesday": "Tirsdag", "Wednesday": "Onsdag",
-                "Thursday": "Torsdag", "Friday": "Fredag", "Saturday": "Lørdag", "Sunday": "Søndag"
-            }
-            df_prices["weekday_dk"] = df_prices["weekday"].map(weekday_map)
-
-            # Hent budstørrelse fra 24x7 tabellen
-            def hent_bud(row):
-                try:
-                    return st.session_state.df_saved.loc[row["interval"], row["weekday_dk"]]
-                except:
-                    return 0  # Hvis noget går galt, indsæt 0
-
-            df_prices["bud_kw"] = df_prices.apply(hent_bud, axis=1)
-
-            # Strøm prisen
-            df_prices["Strømpris (DKK/MWh)"] = df_spot["Strømpris (DKK)"] 
-
-            # Beregn indtjening i DKK
-            if np.isnan(st.session_state.applied_filters['Minimumspris']): # hvis brugeren klikker "har ikke en marginalpris"
-                df_prices["indtjening"] = df_prices["bud_kw"] * df_prices[navn_reguleringsretning] / 1000  # konverter kW til MW
-                total = df_prices["indtjening"].sum()
-                # st.success("✅ Beregning færdig!")
-
-            elif st.session_state.applied_filters['Minimumspris'] >= -100000: # hvis brugeren har en marginalpris
-                with st.spinner("Udfører hurtig vektoriseret beregning..."):
-                    A = df_prices[navn_reguleringsretning].to_numpy(copy=False)
-                    B = df_prices["bud_kw"].to_numpy(copy=False)
-                    C = df_prices["Strømpris (DKK/MWh)"].to_numpy(copy=False)
-                    D = st.session_state.applied_filters['Minimumspris']
-
-                    if st.session_state.applied_filters['Reguleringsretning'] == "aFRR-opregulering":
-                        mask = C < D
-                    elif st.session_state.applied_filters['Reguleringsretning'] == "aFRR-nedregulering":
-                        mask = C > D
-                    else:
-                        st.warning("! Fejl ifm. valg af reguleringsretning !")
-                        st.stop()
-                    
-                    # brug float til at kunne indsætte NaN for rækker hvor mask=False
-                    price_result = np.empty_like(A, dtype=np.float64)
-                    price_result.fill(np.nan)
-                    np.multiply(A, B, out=price_result, where=mask)
-
-                    df_prices["indtjening"] = price_result/1000  # konverter kW til MW
-                    total = df_prices["indtjening"].sum()
-                    # st.success("✅ Beregning færdig!")
-            else:
-                st.warning("! Fejl ved indtasning af Marginalpris !")
-            
-            
-            # Få antal unikke dage
-            df_prices["Dato"] = pd.to_datetime(df_prices["TimeDK"]).dt.date
-            antal_dage = df_prices["Dato"].nunique()
-
-            # Vis resultat
-            st.success(f"💰 Rådighedsindtjening i dataperiode: **{total:,.0f} DKK**")
-            st.success(f"💰 Estimeret årlig rådighedsindtjening ud fra den anvendte dataperiode: **{(total*365)/antal_dage:,.0f} DKK**")
+        # Vis resultat
+        st.success(f"💰 Rådighedsindtjening i dataperiode: **{resultat.rådighedsindtjening:,.0f} DKK**")
+        st.success(f"💰 Estimeret årlig rådighedsindtjening ud fra den anvendte dataperiode: **{resultat.årlig_rådighedsindtjening:,.0f} DKK**")
 
-            st.write("Gennemsnitlig rådighedsindtjening, som aktivet modtager for at levere ", st.session_state.applied_filters["Reguleringsretning"], ": ", round(df_prices["indtjening"].mean(), 1), " **DKK/time**")
-            st.write("Antal timer der bydes ", st.session_state.applied_filters["Reguleringsretning"], ": ", df_prices["indtjening"].count(), " i dataperioden")
+        st.write("Gennemsnitlig rådighedsindtjening, som aktivet modtager for at levere ", filters["Reguleringsretning"], ": ", round(resultat.gns_rådighedsindtjening, 1), " **DKK/time**")
+        st.write("Antal timer der bydes ", filters["Reguleringsretning"], ": ", resultat.timer_budt, " i dataperioden")
 
+        st.session_state.df_prices_subset = resultat.df_rådighed
 
-            kolonner = ["TimeDK", "interval", "weekday_dk", navn_reguleringsretning, "bud_kw", "Strømpris (DKK/MWh)", "indtjening"]
-            st.session_state.df_prices_subset = df_prices[kolonner]
-            
-            with st.expander("📊 Se tidsserien over buddata og indtjening"):
-                st.dataframe(st.session_state.df_prices_subset)
-            
-        else:
-            st.warning("! Mangler enten at anvende filtre, gemme en ugeprofilm indtaste en minimumspris for at stå til rådgihed og/eller vælge en reguleringsretning !")
+        with st.expander("📊 Se tidsserien over buddata og indtjening"), fb.trin("vis_rådighed") as m:
+            vis_resultattabel(st.session_state.df_prices_subset, "rådighed", "rådighed")
+            m.rækker = len(st.session_state.df_prices_subset)
 
     with col2:
         st.markdown("##### Aktiveringsbetalinger")
 
-        if  st.session_state.filters_applied and "df_saved" in st.session_state and "Aktiveringsbetaling" in st.session_state.applied_filters and "Rådighedsbetaling" in st.session_state.applied_filters and delay and ramp_up:
-            pass
-        else:
-            st.warning("! Mangler data !")
-            st.stop()
-
-
-        if "df_prices_subset" not in st.session_state:
-            st.warning("! Mangler at lave en rådighedsberegning først !")
-            st.stop()
-        else:
-            df_prices_subset = st.session_state.df_prices_subset
-            df_aktivering = st.session_state.df_filtered2.copy()
-            
-            # Filtrer df2, så kun rækker med B != None/NaN er med
-            df2_valid = df_prices_subset[df_prices_subset["indtjening"].notna()].copy()
-            # Lav en timekolonne i df1, så den kan matches til df2["TimeDK"] 
-            df_aktivering["TimeDK"] = df_aktivering["Tid (DK)"].dt.floor("H")
-            # Merge kun med de "gyldige timer" fra df2
-            df_aktivering = df_aktivering.merge(df2_valid[["TimeDK", "bud_kw"]], on="TimeDK", how="left")
-        
-        count, aFRR_navn = afrr_aktivering(st.session_state.applied_filters['Reguleringsretning'], df_aktivering, st.session_state.applied_filters["Minimumspris"], st.session_state.applied_filters["Aktiveringsbetaling"])
-
-        df_aktivering_resultater = delay_function(delay, ramp_up, df_aktivering, aFRR_navn)
-
-        total = df_aktivering["indtjening_aktiveringer"].sum()/3600
-        aktiveret_MW = df_aktivering["aktiveret_MW"].sum()/3600
-        omkost = df_aktivering["omkostninger_aktiveringer"].sum()/3600
-     
-
         # Vis resultat
-        st.success(f"💰 Aktiveringsindtjening i dataperiode: **{total:,.0f} DKK**")
-        st.success(f"💰 Estimeret årlig aktiveringsindtjening ud fra den anvendte dataperiode: **{(total*365)/antal_dage:,.0f} DKK**")
-        #st.markdown(f" {st.session_state.applied_filters['delay']}, {st.session_state.applied_filters['ramp_up']}")
+        st.success(f"💰 Aktiveringsindtjening i dataperiode: **{resultat.aktiveringsindtjening:,.0f} DKK**")
+        st.success(f"💰 Estimeret årlig aktiveringsindtjening ud fra den anvendte dataperiode: **{resultat.årlig_aktiveringsindtjening:,.0f} DKK**")
 
-        st.markdown(f"Antal aktiveret MWh i dataperioden = **{aktiveret_MW:,.1f} MWh**")
+        st.markdown(f"Antal aktiveret MWh i dataperioden = **{resultat.aktiveret_MWh:,.1f} MWh**")
         st.markdown(f"""<div style='line-height:1.5; font-size:16px;'>
-                        Forbrugsomkostninger forbundet med at divergere fra oprindelig driftsplan: 
-                        <strong>-{omkost:,.0f} DKK</strong> i dataperioden.<br>
+                        Forbrugsomkostninger forbundet med at divergere fra oprindelig driftsplan:
+                        <strong>-{resultat.aktiveringsomkostninger:,.0f} DKK</strong> i dataperioden.<br>
                         <span style='color:gray; font-size:14px;'>(Hvis aktivet **ikke** har en marginalpris, så sættes omkostningerne til 0 DKK)</span></div>""", unsafe_allow_html=True)
 
+        with st.expander("📊 Se tidsserien over aktiveringsdata og indtjening"):
+            if resultat.df_aktivering is not None:
+                with fb.trin("vis_tidsserie") as m:
+                    vis_tidsseriegrafer(resultat.df_aktivering, scenarie.reguleringsretning)
+                    vis_resultattabel(resultat.df_aktivering, "tidsserie", "aktiveringer")
+                    m.rækker = len(resultat.df_aktivering)
+            elif not fb.med_tidsserie(scenarie.start_date, scenarie.end_date):
+                st.info(f"Tidsserien pr. sekund vises kun for perioder op til {fb.MAKS_DETALJE_SEKUNDER // 86400} dage")
+            else:
+                st.info("Tidsserien vises for det delay/ramp-up der blev brugt ved seneste tryk på 'Lav Berening'")
 
-        #st.markdown(aFRR_navn)
+        with st.expander("📈 Følsomhed: aktiveringsindtjening [DKK] for delay (rækker) og ramp-up (kolonner)"):
+            delays = sorted(set(range(0, 121, 15)) | {delay})
+            ramp_ups = sorted(set(range(0, 301, 30)) | {ramp_up})
+            with fb.trin("følsomhed"):
+                følsomhed = resultat.følsomhed(delays, ramp_ups)
+            st.dataframe(følsomhed.pivot(index="delay", columns="ramp_up", values="aktiveringsindtjening").round(0))
 
-        with st.expander("📊 Se tidsserien over aktiveringsdata og indtjening"):
-                st.dataframe(df_aktivering_resultater)
+# --------------------------------------------
+# Budoptimering - hele gitteret af marginalpris, rådighedsbud og aktiveringsbud i én beregning
+# --------------------------------------------
+def budsweep_nøgle(scenarie):
+    # Alt undtagen de tre bud der optimeres over
+    return (replace(scenarie, marginalpris=np.nan, Rådighedsbetaling=0, Aktiveringsbetaling=0).nøgle(), scenarie.delay, scenarie.ramp_up)
+
+if scenarie is not None:
+    with st.expander("🔎 Budoptimering: find marginalpris, rådighedsbud og aktiveringsbud med højest samlet indtjening"):
+        with st.form("budsweep_form"):
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                mp_fra = st.number_input("Marginalpris fra [DKK/MWh]", value=0.0)
+                mp_til = st.number_input("Marginalpris til [DKK/MWh]", value=3000.0)
+                mp_antal = st.number_input("Antal marginalpriser", min_value=1, max_value=100, value=20)
+                uden_mp = st.checkbox("Medtag 'ingen marginalpris'", value=True)
+            with c2:
+                rb_fra = st.number_input("Rådighedsbud fra [DKK/MW/h]", value=0.0)
+                rb_til = st.number_input("Rådighedsbud til [DKK/MW/h]", value=200.0)
+                rb_antal = st.number_input("Antal rådighedsbud", min_value=1, max_value=100, value=20)
+            with c3:
+                ab_fra = st.number_input("Aktiveringsbud fra [DKK/MWh]", value=0.0)
+                ab_til = st.number_input("Aktiveringsbud til [DKK/MWh]", value=2000.0)
+                ab_antal = st.number_input("Antal aktiveringsbud", min_value=1, max_value=100, value=20)
+            kør_sweep = st.form_submit_button("Kør budoptimering")
+
+        if kør_sweep:
+            marginalpriser = list(np.linspace(mp_fra, mp_til, int(mp_antal))) + ([np.nan] if uden_mp else [])
+            with st.spinner("Beregner hele budgitteret..."):
+                st.session_state.budsweep = fb.sweep_bud(scenarie, graf.hent("udsnit", **periode), df_spot, df_kapacitet, marginalpriser,
+                                                         np.linspace(rb_fra, rb_til, int(rb_antal)), np.linspace(ab_fra, ab_til, int(ab_antal)),
+                                                         justering=graf.hent("justering", **periode))
+            st.session_state.budsweep_nøgle = budsweep_nøgle(scenarie)
+
+        if st.session_state.get("budsweep_nøgle") == budsweep_nøgle(scenarie):
+            sweep = st.session_state.budsweep
+            optimum = sweep.optimum()
+            marginalpris_tekst = "ingen" if np.isnan(optimum["marginalpris"]) else f"{optimum['marginalpris']:,.0f} DKK/MWh"
+            st.success(f"💰 Bedste samlede indtjening i dataperioden: **{optimum['samlet']:,.0f} DKK** ved marginalpris **{marginalpris_tekst}**, "
+                       f"rådighedsbud **{optimum['Rådighedsbetaling']:,.1f} DKK/MW/h** og aktiveringsbud **{optimum['Aktiveringsbetaling']:,.0f} DKK/MWh**")
+            st.write("Samlet indtjening [DKK] (rådighed + aktivering - omkostninger) ved den bedste marginalpris: rådighedsbud (rækker) og aktiveringsbud (kolonner)")
+            i = int(np.nanargmax(np.nanmax(sweep.samlet, axis=(1, 2))))
+            st.dataframe(pd.DataFrame(sweep.samlet[i], index=sweep.rådighedsbud.round(1), columns=sweep.aktiveringsbud.round(0)).round(0))
+            st.caption("I budoptimeringen accepteres rådighedsbuddet kun i timer hvor rådighedsprisen mindst er buddet. "
+                       "Hovedberegningen ovenfor byder i alle timer med en rådighedspris, så tallene er kun ens ved rådighedsbud 0.")
+
+# --------------------------------------------
+# Backtest - årlig indtjening for alle rullende vinduer i perioden
+# --------------------------------------------
+if scenarie is not None:
+    with st.expander("📅 Backtest: årlig indtjening for alle rullende vinduer i dataperioden"):
+        vinduer_tekst = st.text_input("Vindueslængder [dage], kommasepareret", value="7, 30, 90")
+        if st.button("Kør backtest"):
+            vinduer = sorted({int(v) for v in vinduer_tekst.replace(";", ",").split(",") if v.strip().isdigit() and int(v) > 0})
+            with st.spinner("Beregner daglig indtjening..."):
+                daglig = fb.daglig_indtjening(scenarie, graf.hent("udsnit", **periode), df_spot, df_kapacitet,
+                                              justering=graf.hent("justering", **periode))
+            df_vinduer = fb.rullende_vinduer(daglig, vinduer)
+            if df_vinduer.empty:
+                st.info("Ingen af vindueslængderne passer ind i den valgte dataperiode (med data alle dage)")
+            else:
+                st.write("Fordeling af estimeret årlig indtjening [DKK] pr. vindueslængde")
+                st.dataframe(fb.vinduesfordeling(df_vinduer).round(0))
+                st.write("Daglig indtjening [DKK]")
+                st.caption("Aktiveringsforløb der startede dagen før et vindue fortsætter ind i vinduet - "
+                           "derfor kan et vindue afvige lidt fra en beregning der starter på vinduets første dag")
+                st.dataframe(daglig.round(1))
+
+# --------------------------------------------
+# Usikkerhed - bootstrap af årlig indtjening fra dagene i perioden (stratificeret efter sæson og dagtype)
+# --------------------------------------------
+if scenarie is not None:
+    with st.expander("🎲 Usikkerhed: konfidensinterval for estimeret årlig indtjening"):
+        antal_træk = st.number_input("Antal syntetiske år", min_value=100, max_value=100_000, value=10_000, step=1000)
+        if st.button("Beregn konfidensinterval"):
+            with st.spinner("Trækker syntetiske år..."):
+                daglig = fb.daglig_indtjening(scenarie, graf.hent("udsnit", **periode), df_spot, df_kapacitet,
+                                              justering=graf.hent("justering", **periode))
+                bootstrap = fb.bootstrap_år(daglig, int(antal_træk))
+            st.write("Estimeret årlig indtjening [DKK]: punktestimat og percentiler af de syntetiske år")
+            st.dataframe(bootstrap.percentiler().round(0))
+            if bootstrap.erstattede_strata:
+                st.info("Perioden dækker ikke både sommer (april-september) og vinter - dage fra den manglende sæson er trukket "
+                        "fra samme dagtype (hverdag/fridag) i den anden sæson")
+
+# --------------------------------------------
+# Live - løbende "hvad ville vi have tjent" for scenariet mens nye aktiveringssekunder kommer ind.
+# Tilstanden (igangværende forløb, totaler) ligger i sessionen, og hver opdatering regner kun de nye poster.
+# Kun denne del af siden køres igen ved hver opdatering (st.fragment)
+# --------------------------------------------
+@st.fragment(run_every=LIVE_INTERVAL)
+def vis_live():
+    live = st.session_state.live_beregning
+    try:
+        live.opdater(st.session_state.live_kilde.læs())
+    except (OSError, ValueError) as fejl:
+        st.warning(f"Kilden kunne ikke læses: {fejl}")
+    if live.sidste is None:
+        st.info("Venter på aktiveringsdata fra kilden...")
+        return
+
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("Rådighedsindtjening [DKK]", f"{live.rådighedsindtjening:,.0f}")
+    c2.metric("Aktiveringsindtjening [DKK]", f"{live.aktiveringsindtjening:,.0f}")
+    c3.metric("Omkostninger [DKK]", f"{-live.aktiveringsomkostninger:,.0f}")
+    c4.metric("Aktiveret [MWh]", f"{live.aktiveret_MWh:,.2f}")
+    tilstand = f"aktiveret i **{live.serie} s** i træk, niveau **{live.niveau:.0%}**" if live.serie else "ingen igangværende aktivering"
+    st.markdown(f"Seneste sekund: **{live.som_dict()['sidste']:%Y-%m-%d %H:%M:%S}** ({live.poster:,} sekunder) - {tilstand}")
+    timer = live.timetabel().tail(48)
+    timer.index = timer.index.tz_localize(None)
+    st.bar_chart(timer[["rådighedsindtjening", "aktiveringsindtjening"]])
+
+if scenarie is not None:
+    with st.expander("🔴 Live: løbende indtjening for scenariet fra nye aktiveringsdata"):
+        kilde_tekst = st.text_input("Kilde: csv-fil der skrives til løbende, eller vært:port med JSON-linjer over TCP", value=LIVE_KILDE)
+        st.caption("Historiske data kan afspilles til filen med `python -m flex_beregner.live --fra 2025-03-28 --til 2025-04-01`")
+        if st.toggle("Følg kilden", key="live"):
+            live_nøgle = (kilde_tekst, scenarie.nøgle(), scenarie.delay, scenarie.ramp_up)
+            if st.session_state.get("live_nøgle") != live_nøgle:
+                # Nyt scenarie eller ny kilde: start forfra
+                if "live_kilde" in st.session_state:
+                    st.session_state.live_kilde.luk()
+                st.session_state.live_kilde = fb.åbn_kilde(kilde_tekst)
+                st.session_state.live_beregning = fb.Livberegning(scenarie, hent_prisdata)
+                st.session_state.live_nøgle = live_nøgle
+            vis_live()
 
 st.markdown("<hr style='border:2px solid black'>", unsafe_allow_html=True)
 
@@ -688,11 +722,28 @@ st.table(st.session_state.applied_filters)
 
 st.markdown("<hr style='border:2px solid black'>", unsafe_allow_html=True)
 
+# --------------------------------------------
+# Diagnostik for denne kørsel (og de seneste) - kun når den er slået til i sidebaren
+# --------------------------------------------
+if st.session_state.målelog is not None:
+    arkivér_målelog(st.session_state.målelog)
+    st.session_state.målelog = None
+    log = st.session_state.målelogs[-1]
+    with st.expander(f"🩺 Diagnostik: kørsel {log.kørsel} tog {log.sekunder:.2f} s"):
+        st.write("Tid, rækker og hukommelse (største allokering undervejs, Python og numpy) pr. trin i denne kørsel")
+        st.dataframe(log.som_dataframe().round(4))
+        st.write("Seneste kørsler")
+        st.dataframe(pd.DataFrame([{"kørsel": l.kørsel, "tidspunkt": l.tidspunkt, "sekunder": l.sekunder, "trin": len(l.målinger)}
+                                   for l in st.session_state.målelogs]))
+        st.download_button("Hent målelog (JSON-linjer)", "".join(l.json_linjer() for l in st.session_state.målelogs),
+                           file_name="målelog.jsonl", mime="application/jsonl")
+
 ################################################################################################################################################
 ############## Afsluttende sidebar layout ##############
 if "applied_filters" in st.session_state:
     st.sidebar.write("#### Anvendte filtre:")
     st.sidebar.dataframe(st.session_state.applied_filters, height= len(st.session_state.applied_filters) * 38)
+    st.sidebar.caption(f"Aktiveringsdata i hukommelsen: {st.session_state.hukommelse_MB:.1f} MB")
 else:
     st.sidebar.info("Ingen filtre er anvendt endnu.")
 
@@ -0,0 +1 @@
+# Gør flex_beregner importerbar for tests/ når pytest køres fra roden
@@ -0,0 +1,32 @@
+# Beregningsmotor bag aFRR_aktiveringer.py - kan importeres uden Streamlit (f.eks. til batchkørsler)
+
+from .data import EUR_DKK, TIDSZONE, RÅ_KOLONNER, load_data_parquet, klargør_aktiveringsdata, filtrer_data
+from .tidsindeks import Tidsindeks, Aktiveringsudsnit, epoch_sekunder, dag_grænser
+from .justering import Prisakse, Prisjustering, priskolonne, tidskolonne
+from .aktivering import find_forløb, aktiv_serie
+from .lager import skriv_partitioneret, læs_partitioneret, læs_tidsindeks, skriv_kompakt, kortlæg_tidsindeks, lager_oversigt, lager_version
+from .api import (API_URL, DATASÆT, KVARTERPRISER_FRA, hent_records, klargør_records, spotdatasæt, saml_spotpriser, get_spotdata,
+                  Rådighedspriser, hent_prisdata)
+from .prislager import Prislager
+from .tarif import LAVLAST, HØJLAST, SPIDSLAST, dagkalender, dagtyper, tarifkalender, tarifperioder, tarif_pr_tidspunkt, beregn_tarif
+from .beregning import (
+    RETNINGER, KUNDETYPER, TIMER, UGEDAGE, MAKS_DETALJE_SEKUNDER, med_tidsserie,
+    Scenarie, Resultat,
+    tom_budprofil, budmatrix, rådighedsbud, bud_pr_sekund, prisnavn,
+    aktiveringspriser, strømpriser, strømpris_pr_sekund, tilføj_strømpris,
+    beregn_rådighed, aktiveringsgrundlag, afrr_aktivering, aktiveringsgrad, delay_function,
+    byg_aktiveringsforløb, aktiveringstidsserie, tidsserie_pr_sekund, saml_resultat,
+    beregn, lav_justering, beregn_filtreret,
+)
+from .optimering import Budsweep, sweep_bud
+from .portefølje import Porteføljeresultat, beregn_portefølje
+from .backtest import daglig_indtjening, rullende_vinduer, vinduesfordeling
+from .bootstrap import Bootstrapresultat, bootstrap_år
+from .indlæsning import Mappekilde, HTTPKilde, indlæs, indlæs_tabel, skriv_manifest
+from .kube import GRÆNSER_EUR, KVANTILER, Timekube, byg_timekube, kortlæg_timekube, opdater_timekube, estimér_aktivering
+from .aktivering import Positionssummer
+from .sqlmotor import duckdb_tilgængelig, beregn_duckdb
+from .måling import Trinmåling, Målelog, sæt_målelog, målelog, trin
+from .graf import Knude, Beregningsgraf, aktiveringsgraf
+from .visning import MAKS_PUNKTER, SIDESTØRRELSE, FREKVENSER, AKTIVERINGSPRIS, FILTYPER, antal_sider, side, aggreger, minmax_indeks, lttb_indeks, decimer, til_fil
+from .live import LIVE_STI, Filhale, Socketkilde, Afspilning, Livberegning, åbn_kilde
@@ -0,0 +1,87 @@
+import numpy as np
+
+from dataclasses import dataclass
+
+# --------------------------------------------
+# Aktiveringsforløb (run-length kerne)
+#
+# En aktivering er et forløb af sekunder i træk, hvor aktiveringsprisen opfylder buddet.
+# For de aktive sekunder summeres
+#   w = bud [MW] * pris        (indtjening, omkostning og aktiveret MW)
+# pr. sekundnummer k (1, 2, ...) i forløbet på tværs af forløbene (Positionssummer, 24 bytes pr. sekund
+# i det længste forløb). Så kan delay/ramp-up energien for alle forløb regnes på én gang:
+#   aktivering(k) = 0 for k <= delay, (k-delay)/ramp_up under ramp-up og 1 derefter
+# --------------------------------------------
+
+INDTJENING, OMKOSTNINGER, AKTIVERET_MW = 0, 1, 2
+
+
+def find_forløb(mask):
+    # Start-indeks og længde for hvert sammenhængende forløb af True i mask
+    mask = np.asarray(mask, dtype=bool)
+    kant = np.diff(mask.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    start = np.flatnonzero(kant == 1)
+    slut = np.flatnonzero(kant == -1)
+    return start, slut - start
+
+
+def aktiv_serie(mask):
+    # Hvor mange sekunder i træk mask har været True (0 udenfor forløb)
+    mask = np.asarray(mask, dtype=bool)
+    _, længde = find_forløb(mask)
+    serie = np.zeros(len(mask), dtype=np.int64)
+    serie[mask] = _position_i_forløb(længde)
+    return serie
+
+
+def _position_i_forløb(længde):
+    # 1, 2, ..., L for hvert forløb efter hinanden
+    offset = np.cumsum(længde) - længde
+    return np.arange(1, int(længde.sum()) + 1, dtype=np.int64) - np.repeat(offset, længde)
+
+
+@dataclass
+class Positionssummer:
+    # Totalerne ud fra summerne af w pr. position k i forløbene:
+    #   W[:, k] for k = 1..K og W[:, K+1] for alle positioner efter K
+    # Eksakt for alle delay/ramp-up hvor tabet ligger inden for de første K sekunder (delay + ramp-up - 1 <= K)
+    # - og for alle delay/ramp-up når K er det længste forløb (byg), så W[:, K+1] er tom.
+    W: np.ndarray  # (3, K + 2) - kolonne 0 er ubrugt
+    antal: int = 0  # antal forløb
+
+    @classmethod
+    def byg(cls, mask, bud_kw, værdi, forskel):
+        # Summer pr. position til og med det længste forløb (timer uden rådighedsbud tæller som 0 MW)
+        mask = np.asarray(mask, dtype=bool)
+        _, længde = find_forløb(mask)
+        K = int(længde.max()) if len(længde) else 0
+        k = _position_i_forløb(længde)
+
+        bud_mw = np.nan_to_num(np.asarray(bud_kw, dtype=np.float64)[mask]) / 1000
+        W = np.empty((3, K + 2), dtype=np.float64)
+        W[INDTJENING] = np.bincount(k, weights=bud_mw * np.asarray(værdi, dtype=np.float64)[mask], minlength=K + 2)
+        W[OMKOSTNINGER] = np.bincount(k, weights=bud_mw * np.asarray(forskel, dtype=np.float64)[mask], minlength=K + 2)
+        W[AKTIVERET_MW] = np.bincount(k, weights=bud_mw, minlength=K + 2)
+        return cls(W=W, antal=len(længde))
+
+    @property
+    def K(self):
+        return self.W.shape[1] - 2
+
+    def summer(self, delay_tid, rampup_tid):
+        if delay_tid + max(rampup_tid - 1, 0) > self.K and self.W[:, -1].any():
+            raise ValueError(f"delay + ramp-up ({delay_tid} + {rampup_tid}) ligger ud over de {self.K} positioner der er summeret")
+        k = np.arange(self.K + 2)
+        if rampup_tid <= 0:
+            grad = (k > delay_tid).astype(np.float64)
+        else:
+            grad = np.clip((k - delay_tid) / rampup_tid, 0, 1)
+        grad[-1] = 1.0
+        return (self.W * grad).sum(axis=1) / 3600
+
+    def følsomhed(self, delays, ramp_ups):
+        gitter = np.empty((len(delays), len(ramp_ups), 3), dtype=np.float64)
+        for i, delay_tid in enumerate(delays):
+            for j, rampup_tid in enumerate(ramp_ups):
+                gitter[i, j] = self.summer(delay_tid, rampup_tid)
+        return gitter
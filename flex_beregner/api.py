@@ -0,0 +1,186 @@
+import json
+import os
+import threading
+
+import pandas as pd
+import requests
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --------------------------------------------
+# Energi Data Service
+# --------------------------------------------
+API_URL = os.environ.get("ENERGIDATASERVICE_URL", "https://api.energidataservice.dk")
+
+# Datasæt -> (UTC-tidskolonne, dansk tidskolonne)
+DATASÆT = {
+    "Elspotprices": ("HourUTC", "HourDK"),
+    "DayAheadPrices": ("TimeUTC", "TimeDK"),
+    "AfrrReservesNordic": ("TimeUTC", "TimeDK"),
+}
+
+# Datasæt -> priskolonner (bruges til en tom ramme med de rigtige kolonner, når der ingen records er)
+PRISKOLONNER = {
+    "Elspotprices": ["SpotPriceDKK", "SpotPriceEUR"],
+    "DayAheadPrices": ["DayAheadPriceDKK", "DayAheadPriceEUR"],
+    "AfrrReservesNordic": ["UpPriceDKK", "DownPriceDKK", "UpPriceEUR", "DownPriceEUR"],
+}
+
+# Spotpriserne skiftede fra timer (Elspotprices) til kvarterer (DayAheadPrices) med dette døgn
+KVARTERPRISER_FRA = date(2025, 10, 1)
+TIL_KVARTERFORMAT = {"HourUTC": "TimeUTC", "HourDK": "TimeDK", "SpotPriceDKK": "DayAheadPriceDKK", "SpotPriceEUR": "DayAheadPriceEUR"}
+
+SIDESTØRRELSE = 10000   # records pr. side (limit/offset)
+PERIODE_DAGE = 90       # lange perioder deles i bidder der hentes parallelt
+ARBEJDERE = 8           # samtidige forespørgsler (= størrelsen på forbindelses-poolen)
+TIMEOUT = (5, 60)       # (forbind, læs) sekunder
+
+_session = None
+_session_lås = threading.Lock()
+
+
+def session():
+    # Én delt session med forbindelses-pool og automatisk genforsøg ved netværks-/serverfejl
+    global _session
+    with _session_lås:
+        if _session is None:
+            genforsøg = Retry(total=4, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504], allowed_methods=["GET"])
+            adapter = HTTPAdapter(pool_connections=ARBEJDERE, pool_maxsize=ARBEJDERE, max_retries=genforsøg)
+            _session = requests.Session()
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+
+def _læs_kolonner(tekst, tidskolonne):
+    # Parse JSON-svaret direkte til kolonner: hver record (objekt med tidskolonnen) lægges
+    # i kolonnelister i stedet for at blive en dict i en liste
+    kolonner = {}
+    antal = [0]
+
+    def record(par):
+        if not any(navn == tidskolonne for navn, _ in par):
+            return dict(par)  # selve svar-objektet (total, records, ...)
+        for navn, værdi in par:
+            if navn not in kolonner:
+                kolonner[navn] = [None] * antal[0]
+            kolonner[navn].append(værdi)
+        antal[0] += 1
+        for liste in kolonner.values():
+            if len(liste) < antal[0]:
+                liste.append(None)
+        return None
+
+    svar = json.loads(tekst, object_pairs_hook=record)
+    return kolonner, antal[0], svar.get("total")
+
+
+def _hent_periode(url, tidskolonne, Synkronområde, start_date, end_date):
+    # Alle sider for én periode - nyeste time først, som API'et leverer dem
+    params = {
+        "filter": f'{{"PriceArea":["{Synkronområde}"]}}',
+        "start": start_date.strftime("%Y-%m-%d"),
+        "end": (end_date + timedelta(days=1)).strftime("%Y-%m-%d"),
+        "limit": SIDESTØRRELSE,
+        "offset": 0,
+    }
+    sider = []
+    hentet = 0
+    while True:
+        response = session().get(url, params=params, timeout=TIMEOUT)
+        response.raise_for_status()
+        kolonner, antal, total = _læs_kolonner(response.content, tidskolonne)
+        sider.append(pd.DataFrame(kolonner))
+        hentet += antal
+        if total is None or hentet >= total:
+            break
+        if antal == 0:
+            raise RuntimeError(f"Ufuldstændigt svar fra {url}: {hentet} af {total} records for {start_date} - {end_date}")
+        params["offset"] = hentet
+    return pd.concat(sider, ignore_index=True) if len(sider) > 1 else sider[0]
+
+
+def _perioder(start_date, end_date):
+    # [start_date, end_date] delt i bidder á PERIODE_DAGE - nyeste først
+    perioder = []
+    fra = start_date
+    while fra <= end_date:
+        til = min(fra + timedelta(days=PERIODE_DAGE - 1), end_date)
+        perioder.append((fra, til))
+        fra = til + timedelta(days=1)
+    return perioder[::-1]
+
+
+def tom_ramme(dataset):
+    # Ingen records: samme kolonner og typer som klargør_records giver, så opslag længere nede ikke fejler
+    utc, dk = DATASÆT[dataset]
+    return pd.DataFrame({
+        utc: pd.Series(dtype="datetime64[ns, UTC]"),
+        dk: pd.Series(dtype="datetime64[ns, Europe/Copenhagen]"),
+        "PriceArea": pd.Series(dtype=object),
+        **{kolonne: pd.Series(dtype=float) for kolonne in PRISKOLONNER[dataset]},
+    })
+
+
+def klargør_records(dataset, df):
+    # API'et leverer nyeste time først - vend om og lav tidskolonnerne tidszone-bevidste.
+    # Dansk tid udledes af UTC, så den dobbelte time ved skift til vintertid ikke er tvetydig
+    utc, dk = DATASÆT[dataset]
+    if len(df) == 0:
+        return tom_ramme(dataset)
+    df = df.iloc[::-1].reset_index(drop=True)
+    df[utc] = pd.to_datetime(df[utc], utc=True)
+    df[dk] = df[utc].dt.tz_convert("Europe/Copenhagen")
+    return df
+
+
+def hent_records(dataset, Synkronområde, start_date, end_date, api_url=None):
+    # Rå records for danske kalenderdage [start_date, end_date] (begge inklusiv), nyeste først
+    url = f"{api_url or API_URL}/dataset/{dataset}"
+    tidskolonne = DATASÆT[dataset][0]
+    perioder = _perioder(start_date, end_date)
+    if len(perioder) == 1:
+        return _hent_periode(url, tidskolonne, Synkronområde, *perioder[0])
+
+    with ThreadPoolExecutor(max_workers=ARBEJDERE) as pool:
+        dele = list(pool.map(lambda p: _hent_periode(url, tidskolonne, Synkronområde, *p), perioder))
+    return pd.concat(dele, ignore_index=True)
+
+
+def spotdatasæt(start_date, end_date):
+    # [(datasæt, fra, til)] - timepriser før KVARTERPRISER_FRA, kvarterpriser fra og med
+    dele = []
+    if start_date < KVARTERPRISER_FRA:
+        dele.append(("Elspotprices", start_date, min(end_date, KVARTERPRISER_FRA - timedelta(days=1))))
+    if end_date >= KVARTERPRISER_FRA:
+        dele.append(("DayAheadPrices", max(start_date, KVARTERPRISER_FRA), end_date))
+    return dele
+
+
+def saml_spotpriser(dele):
+    # Én spotramme: timepriserne alene, ellers det hele i kvarterformatet (TimeUTC/DayAheadPriceDKK)
+    # - Prisakse giver hver række sin egen varighed, så timer og kvarterer kan stå i samme ramme
+    if len(dele) <= 1:
+        return dele[0] if dele else tom_ramme("DayAheadPrices")
+    dele = [df.rename(columns=TIL_KVARTERFORMAT) for df in dele]
+    return pd.concat(dele, ignore_index=True).sort_values("TimeUTC").reset_index(drop=True)
+
+
+def get_spotdata(Synkronområde, start_date, end_date):
+    return saml_spotpriser([klargør_records(dataset, hent_records(dataset, Synkronområde, fra, til))
+                            for dataset, fra, til in spotdatasæt(start_date, end_date)])
+
+
+def Rådighedspriser(Synkronområde, start_date, end_date):
+    return klargør_records("AfrrReservesNordic", hent_records("AfrrReservesNordic", Synkronområde, start_date, end_date))
+
+
+def hent_prisdata(Synkronområde, start_date, end_date, get_spotdata=get_spotdata, Rådighedspriser=Rådighedspriser):
+    # Spotpriser og rådighedspriser hentes samtidigt: (df_spot, df_kapacitet)
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        spot = pool.submit(get_spotdata, Synkronområde, start_date, end_date)
+        kapacitet = pool.submit(Rådighedspriser, Synkronområde, start_date, end_date)
+        return spot.result(), kapacitet.result()
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+
+from .aktivering import INDTJENING, OMKOSTNINGER, AKTIVERET_MW
+from .portefølje import beregn_portefølje
+from .tidsindeks import Aktiveringsudsnit, dag_grænser, epoch_sekunder
+
+# --------------------------------------------
+# Backtest over rullende vinduer
+#
+# Indtjeningen regnes én gang pr. dansk kalenderdag (aktivering fordelt på rådighedstimer). Hvert vindue
+# er derefter en differens af prefix-summer over dagene, så alle vinduer for alle vindueslængder koster
+# O(antal dage) i stedet for én beregning pr. vindue.
+# Forløbene regnes over hele perioden: et forløb der startede dagen før vinduet er allerede forbi delay
+# og ramp-up ved midnat. Et vindue arver altså forløbene fra dagen før og er ikke det samme som en
+# beregning der starter ved vinduets første sekund (som regner forløbene forfra fra midnat).
+# --------------------------------------------
+DAGLIGE_KOLONNER = ["rådighedsindtjening", "aktiveringsindtjening", "aktiveringsomkostninger", "aktiveret_MWh"]
+PERCENTILER = [5, 25, 50, 75, 95]
+
+
+def daglig_indtjening(scenarie, df_filtered, df_spot, df_kapacitet, justering=None):
+    # Én række pr. dansk kalenderdag i perioden. har_data: dagen har både rådighedspriser og aktiveringsdata.
+    # Forløb der fortsætter over midnat tæller med deres fulde aktiveringsgrad fra dagen før
+    resultat = beregn_portefølje([scenarie], df_filtered, df_spot, df_kapacitet, justering=justering, pr_time=True)
+    dato = pd.Series(resultat.tider.date)
+
+    df = pd.DataFrame({
+        "Dato": dato,
+        "rådighedsindtjening": resultat.rådighed_pr_time[0],
+        "aktiveringsindtjening": resultat.aktivering_pr_time[INDTJENING, 0],
+        "aktiveringsomkostninger": resultat.aktivering_pr_time[OMKOSTNINGER, 0],
+        "aktiveret_MWh": resultat.aktivering_pr_time[AKTIVERET_MW, 0],
+    }).groupby("Dato").sum()
+
+    alle = pd.date_range(scenarie.start_date, scenarie.end_date, freq="D").date
+    df = df.reindex(alle, fill_value=0.0)
+    df.index.name = "Dato"
+
+    sekunder = df_filtered.sekunder if isinstance(df_filtered, Aktiveringsudsnit) else epoch_sekunder(df_filtered["Tid (UTC)"])
+    df["sekunder"] = np.diff(np.searchsorted(sekunder, dag_grænser(scenarie.start_date, scenarie.end_date)))
+    df["har_data"] = df.index.isin(set(dato)) & (df["sekunder"] > 0)
+    return df
+
+
+def rullende_vinduer(daglig, vinduer=(30, 90), min_dækning=1.0):
+    """Totaler og årlig indtjening for hvert vindue af hver længde i vinduer (antal dage).
+
+    Årlig indtjening = total * 365 / dage med data i vinduet. Vinduer hvor under min_dækning
+    af dagene har data udelades.
+    """
+    har_data = daglig["har_data"].to_numpy()
+    værdier = np.where(har_data[:, None], daglig[DAGLIGE_KOLONNER].to_numpy(dtype=np.float64), 0.0)
+    kum = np.vstack([np.zeros((1, værdier.shape[1])), np.cumsum(værdier, axis=0)])
+    kum_dage = np.concatenate([[0], np.cumsum(har_data)])
+    datoer = np.asarray(daglig.index)
+
+    dele = []
+    for længde in vinduer:
+        if længde > len(daglig):
+            continue
+        start = np.arange(len(daglig) - længde + 1)
+        total = kum[start + længde] - kum[start]
+        dage = kum_dage[start + længde] - kum_dage[start]
+        behold = (dage > 0) & (dage >= min_dækning * længde)
+        df = pd.DataFrame(total[behold], columns=DAGLIGE_KOLONNER)
+        df.insert(0, "vindue", længde)
+        df.insert(1, "start", datoer[start[behold]])
+        df.insert(2, "slut", datoer[start[behold] + længde - 1])
+        df["dage_med_data"] = dage[behold]
+        df["årlig_rådighedsindtjening"] = df["rådighedsindtjening"] * 365 / df["dage_med_data"]
+        df["årlig_aktiveringsindtjening"] = df["aktiveringsindtjening"] * 365 / df["dage_med_data"]
+        df["årlig_aktiveringsomkostninger"] = df["aktiveringsomkostninger"] * 365 / df["dage_med_data"]
+        dele.append(df)
+
+    if not dele:
+        return pd.DataFrame(columns=["vindue", "start", "slut", *DAGLIGE_KOLONNER, "dage_med_data"])
+    return pd.concat(dele, ignore_index=True)
+
+
+def vinduesfordeling(df_vinduer, percentiler=PERCENTILER):
+    # Fordelingen af årlig indtjening pr. vindueslængde (antal vinduer, middel, min, percentiler, max)
+    kolonner = ["årlig_rådighedsindtjening", "årlig_aktiveringsindtjening", "årlig_aktiveringsomkostninger"]
+    rækker = []
+    for længde, df in df_vinduer.groupby("vindue"):
+        for kolonne in kolonner:
+            x = df[kolonne].to_numpy()
+            række = {"vindue": længde, "størrelse": kolonne, "antal_vinduer": len(x), "middel": x.mean(), "min": x.min()}
+            række.update({f"p{p}": v for p, v in zip(percentiler, np.percentile(x, percentiler))})
+            række["max"] = x.max()
+            rækker.append(række)
+    return pd.DataFrame(rækker)
@@ -0,0 +1,222 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from .beregning import TIMER, UGEDAGE, Scenarie, tom_budprofil
+from .data import TIDSZONE
+from .justering import tidskolonne
+from .lager import kortlæg_tidsindeks, skriv_partitioneret
+from .portefølje import FÆLLES_FELTER, beregn_portefølje
+from .prislager import Prislager
+
+# --------------------------------------------
+# Batchkørsel af mange scenarier (samme beregning som "Lav Berening")
+#
+#   python -m flex_beregner.batch scenarier.csv --ud resultater.parquet
+#
+# Scenariefilen (CSV eller YAML - kræver pyyaml) har én række/post pr. scenarie med felterne fra Scenarie:
+#   navn, Synkronområde, start_date, end_date, reguleringsretning, budprofil, marginalpris,
+#   Rådighedsbetaling, Aktiveringsbetaling, delay, ramp_up, kundetype, lavlast, højlast, spidslast, eltarif
+# budprofil er enten et tal (samme kW i alle timer) eller stien til en CSV med 24x7 budtabellen
+# (index TIMER, kolonner UGEDAGE) - relativt til scenariefilen.
+#
+# Priserne hentes én gang (via Prislager) og skrives som ukomprimeret Arrow, som hver arbejderproces læser
+# én gang (sin egen kopi - få MB pr. år) - intet prisdata sendes med de enkelte opgaver. Aktiveringsdataene
+# memory-mappes og deles mellem arbejderne.
+# Scenarier med fælles område, periode, retning og tariffer regnes samlet som en portefølje.
+# --------------------------------------------
+LAGER_STI = './data/aktiveringsdata'
+DATA_STI = './data/aFRR_aktiveringsdata_kopi.parquet'
+PRISCACHE_STI = './data/api_cache'
+
+STANDARDVÆRDIER = {f: Scenarie.__dataclass_fields__[f].default for f in
+                   ("marginalpris", "Rådighedsbetaling", "Aktiveringsbetaling", "delay", "ramp_up",
+                    "kundetype", "lavlast", "højlast", "spidslast", "eltarif")}
+HELTAL = ("delay", "ramp_up")
+GRUPPESTØRRELSE = 200  # scenarier pr. opgave - store porteføljer deles så de kan fordeles på flere processer
+
+
+################################################################################################################################################
+############## Scenariefil ##############
+
+def _læs_budprofil(værdi, mappe, cache):
+    if isinstance(værdi, (int, float, np.integer, np.floating)):
+        return tom_budprofil(float(værdi))
+    værdi = str(værdi).strip()
+    try:
+        return tom_budprofil(float(værdi))
+    except ValueError:
+        pass
+    sti = værdi if os.path.isabs(værdi) else os.path.join(mappe, værdi)
+    if sti not in cache:
+        profil = pd.read_csv(sti, index_col=0)
+        cache[sti] = profil.reindex(index=TIMER, columns=UGEDAGE)
+    return cache[sti]
+
+
+def _som_dato(værdi):
+    return værdi if isinstance(værdi, date) else date.fromisoformat(str(værdi)[:10])
+
+
+def læs_scenarier(sti):
+    # Scenariefil -> (navne, scenarier)
+    if sti.lower().endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError as fejl:
+            raise ImportError("YAML-scenariefiler kræver pyyaml (pip install pyyaml)") from fejl
+        with open(sti, encoding="utf-8") as f:
+            poster = yaml.safe_load(f)
+        if isinstance(poster, dict):
+            poster = poster.get("scenarier", [])
+    else:
+        poster = pd.read_csv(sti).to_dict("records")
+
+    mappe = os.path.dirname(os.path.abspath(sti))
+    profiler = {}
+    navne, scenarier = [], []
+    for i, post in enumerate(poster):
+        post = {k: v for k, v in post.items() if not (isinstance(v, float) and np.isnan(v) and k != "marginalpris")}
+        felter = {**STANDARDVÆRDIER, **{k: v for k, v in post.items() if k in STANDARDVÆRDIER}}
+        for felt in HELTAL:
+            felter[felt] = int(felter[felt])
+        felter["marginalpris"] = np.nan if felter["marginalpris"] in (None, "") else float(felter["marginalpris"])
+        scenarier.append(Scenarie(
+            Synkronområde=post["Synkronområde"],
+            start_date=_som_dato(post["start_date"]),
+            end_date=_som_dato(post["end_date"]),
+            reguleringsretning=post["reguleringsretning"],
+            budprofil=_læs_budprofil(post.get("budprofil", 0), mappe, profiler),
+            **felter,
+        ))
+        navne.append(str(post.get("navn", f"Scenarie {i + 1}")))
+    return navne, scenarier
+
+
+################################################################################################################################################
+############## Delte priser ##############
+
+def _skriv_arrow(df, sti):
+    tabel = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(sti, "wb") as fil, pa.ipc.new_file(fil, tabel.schema) as skriver:
+        skriver.write_table(tabel)
+
+
+def _læs_arrow(sti):
+    # Filen memory-mappes, men to_pandas kopierer - hver arbejder får sin egen kopi af (de små) pristabeller
+    return pa.ipc.open_file(pa.memory_map(sti, "r")).read_all().to_pandas()
+
+
+def forbered_priser(scenarier, mappe, priscache=PRISCACHE_STI):
+    # Hent spot- og rådighedspriser én gang pr. område for hele den periode scenarierne dækker
+    prislager = Prislager(priscache)
+    filer = {}
+    for område in sorted({s.Synkronområde for s in scenarier}):
+        start = min(s.start_date for s in scenarier if s.Synkronområde == område)
+        slut = max(s.end_date for s in scenarier if s.Synkronområde == område)
+        df_spot, df_kapacitet = prislager.hent_prisdata(område, start, slut)
+        filer[område] = (os.path.join(mappe, f"spot_{område}.arrow"), os.path.join(mappe, f"kapacitet_{område}.arrow"))
+        _skriv_arrow(df_spot, filer[område][0])
+        _skriv_arrow(df_kapacitet, filer[område][1])
+    return filer
+
+
+def _periode(df, kolonne, start_date, end_date):
+    datoer = df[kolonne].dt.tz_convert(TIDSZONE).dt.date
+    return df[(datoer >= start_date) & (datoer <= end_date)].reset_index(drop=True)
+
+
+################################################################################################################################################
+############## Arbejdere ##############
+
+_arbejder = {}
+
+
+def _start_arbejder(lager, prisfiler):
+    _arbejder["lager"] = lager
+    _arbejder["prisfiler"] = prisfiler
+    _arbejder["indeks"] = {}
+    _arbejder["priser"] = {}
+
+
+def _data(område):
+    if område not in _arbejder["indeks"]:
+        _arbejder["indeks"][område] = kortlæg_tidsindeks(_arbejder["lager"], område)
+        spot, kapacitet = _arbejder["prisfiler"][område]
+        _arbejder["priser"][område] = (_læs_arrow(spot), _læs_arrow(kapacitet))
+    return _arbejder["indeks"][område], _arbejder["priser"][område]
+
+
+def _kør_gruppe(positioner, navne, scenarier):
+    # Én gruppe scenarier med fælles område/periode/retning/tariffer - regnes som portefølje
+    fælles = scenarier[0]
+    indeks, (df_spot, df_kapacitet) = _data(fælles.Synkronområde)
+    udsnit = indeks.arrays(fælles.Synkronområde, fælles.start_date, fælles.end_date)
+    df_spot = _periode(df_spot, tidskolonne(df_spot), fælles.start_date, fælles.end_date)
+    df_kapacitet = _periode(df_kapacitet, "TimeDK", fælles.start_date, fælles.end_date)
+
+    resultat = beregn_portefølje(scenarier, udsnit, df_spot, df_kapacitet, navne=navne)
+    df = resultat.aktiver
+    df.insert(0, "position", positioner)
+    df["antal_dage"] = resultat.antal_dage
+    return df
+
+
+def grupper(scenarier):
+    # Scenarie-positioner grupperet efter de felter en portefølje skal have til fælles
+    ud = {}
+    for i, scenarie in enumerate(scenarier):
+        ud.setdefault(tuple(getattr(scenarie, f) for f in FÆLLES_FELTER), []).append(i)
+    return [g[i:i + GRUPPESTØRRELSE] for g in ud.values() for i in range(0, len(g), GRUPPESTØRRELSE)]
+
+
+def kør_batch(navne, scenarier, lager=LAGER_STI, priscache=PRISCACHE_STI, arbejdere=None):
+    """Beregn alle scenarier parallelt og returnér én række pr. scenarie (i scenariefilens rækkefølge)."""
+    if not os.path.isdir(lager):
+        skriv_partitioneret(DATA_STI, lager)
+    for område in {s.Synkronområde for s in scenarier}:
+        kortlæg_tidsindeks(lager, område)  # skriv de memory-mappede filer før arbejderne starter
+
+    with tempfile.TemporaryDirectory(prefix="flex_batch_") as mappe:
+        prisfiler = forbered_priser(scenarier, mappe, priscache)
+        dele = []
+        with ProcessPoolExecutor(max_workers=arbejdere, initializer=_start_arbejder, initargs=(lager, prisfiler)) as pool:
+            opgaver = [pool.submit(_kør_gruppe, g, [navne[i] for i in g], [scenarier[i] for i in g]) for g in grupper(scenarier)]
+            for opgave in as_completed(opgaver):
+                dele.append(opgave.result())
+
+    df = pd.concat(dele, ignore_index=True).sort_values("position").drop(columns="position").reset_index(drop=True)
+    timer = df["timer_budt"].replace(0, np.nan)
+    df["gns_rådighedsindtjening"] = (df["rådighedsindtjening"] / timer).fillna(0.0)
+    df["årlig_rådighedsindtjening"] = df["rådighedsindtjening"] * 365 / df["antal_dage"]
+    df["årlig_aktiveringsindtjening"] = df["aktiveringsindtjening"] * 365 / df["antal_dage"]
+
+    # Inputs med i resultatet, så filen kan læses for sig selv
+    inputs = pd.DataFrame([{f: getattr(s, f) for f in ("Synkronområde", "start_date", "end_date", "reguleringsretning", *STANDARDVÆRDIER)}
+                           for s in scenarier])
+    return pd.concat([df[["navn"]], inputs, df.drop(columns="navn")], axis=1)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Beregn mange aFRR-scenarier parallelt (samme beregning som 'Lav Berening')")
+    parser.add_argument("scenarier", help="scenariefil (.csv eller .yaml)")
+    parser.add_argument("--ud", default="resultater.parquet", help="parquet-fil til resultaterne")
+    parser.add_argument("--lager", default=LAGER_STI, help="partitioneret lager med aktiveringsdata")
+    parser.add_argument("--priscache", default=PRISCACHE_STI, help="cache-mappe for Energi Data Service")
+    parser.add_argument("--arbejdere", type=int, default=None, help="antal processer (standard: antal CPU'er)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    navne, scenarier = læs_scenarier(args.scenarier)
+    df = kør_batch(navne, scenarier, args.lager, args.priscache, args.arbejdere)
+    df.to_parquet(args.ud, index=False)
+    print(f"{len(df)} scenarier beregnet på {time.perf_counter() - t0:.1f} s -> {args.ud}")
@@ -0,0 +1,383 @@
+import gc
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from datetime import date, datetime, timezone
+
+from .beregning import (Scenarie, afrr_aktivering, beregn_filtreret, beregn_rådighed, bud_pr_sekund, delay_function,
+                        tilføj_strømpris, tom_budprofil)
+from .data import EUR_DKK, RÅ_KOLONNER, TIDSZONE, filtrer_data, load_data_parquet
+from .tarif import beregn_tarif
+
+# --------------------------------------------
+# Benchmark af beregningskæden på syntetiske data
+#
+#   python -m flex_beregner.benchmark --størrelse år --ud benchmark-år.json
+#   python -m flex_beregner.benchmark --sammenlign før.json efter.json
+#
+# Aktiveringspriserne pr. sekund for DK1 og DK2 dannes deterministisk (samme seed = samme fil) ud fra
+# eksempeldataene: præcis én retning er aktiveret i hvert sekund, retningen skifter i geometrisk
+# fordelte forløb, prisen skifter i gennemsnit hvert PRISSKIFT_S sekund og har tunge haler (t-fordeling
+# omkring et time-niveau der følger en AR(1)). Spot- og rådighedspriserne pr. time har samme kolonner
+# som svarene fra Energi Data Service (klargør_records), så der hentes intet over nettet.
+#
+# Rådata skrives dag for dag til én parquet-fil i DATA_MAPPE (genbruges ved næste kørsel), så også
+# 5 år (~315 mio. rækker) kan dannes med konstant hukommelse. Hvert trin køres én gang med måling af
+# hukommelse (tracemalloc: Python- og numpy-allokeringer, samt procesens RSS-top hvor /proc findes)
+# og derefter `gentagelser` gange med tidtagning - den hurtigste tid tæller.
+# --------------------------------------------
+DATA_MAPPE = './data/benchmark'
+GENERATOR_VERSION = 1  # del af filnavnet - tæl op når de syntetiske data ændres
+
+STØRRELSER = {
+    "måned": (date(2024, 1, 1), date(2024, 1, 31)),
+    "år": (date(2024, 1, 1), date(2024, 12, 31)),
+    "5år": (date(2020, 1, 1), date(2024, 12, 31)),
+}
+OMRÅDER = ["DK1", "DK2"]
+
+# Groft tilpasset eksempeldataene (marts/april 2025)
+PROFILER = {
+    "DK1": {"op_andel": 1 / 3, "forløb_s": 390, "op_median": 110.0, "ned_median": 6.7, "ned_spredning": 40.0},
+    "DK2": {"op_andel": 1 / 3, "forløb_s": 1250, "op_median": 390.0, "ned_median": -13.4, "ned_spredning": 45.0},
+}
+PRISSKIFT_S = 12
+PRISLOFT_EUR = 15000.0
+
+TRIN = ["load_data_parquet", "filtrer_data", "beregn_tarif", "tilføj_strømpris", "beregn_rådighed",
+        "bud_pr_sekund", "afrr_aktivering", "delay_function", "beregn_filtreret"]
+
+
+################################################################################################################################################
+############## Syntetiske data ##############
+
+def _lokale_grænser(start_date, end_date):
+    # UTC-tidspunkter for dansk midnat ved start_date og dagen efter end_date
+    t0 = pd.Timestamp(start_date).tz_localize(TIDSZONE).tz_convert("UTC")
+    t1 = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).tz_localize(TIDSZONE).tz_convert("UTC")
+    return t0, t1
+
+
+class _Prisforløb:
+    # Tilstanden for ét område mellem to bidder: retning, sekunder tilbage af forløbet og time-niveauet
+
+    def __init__(self, profil, rng):
+        self.profil, self.rng = profil, rng
+        self.op = bool(rng.random() < profil["op_andel"])
+        self.rest = 0
+        self.niveau = 0.0
+
+    def _retning(self, n):
+        # True = opregulering. Forløbene skiftevis op/ned med geometrisk fordelte længder
+        p = self.profil
+        middel = {True: 2 * p["forløb_s"] * p["op_andel"], False: 2 * p["forløb_s"] * (1 - p["op_andel"])}
+        længder, retninger, i_alt = [], [], 0
+        if self.rest:
+            længder.append(self.rest)
+            retninger.append(self.op)
+            i_alt = self.rest
+        while i_alt < n:
+            self.op = not self.op
+            længde = int(self.rng.geometric(1 / middel[self.op]))
+            længder.append(længde)
+            retninger.append(self.op)
+            i_alt += længde
+        self.rest = i_alt - n
+        return np.repeat(np.array(retninger), længder)[:n]
+
+    def bid(self, n):
+        # (ned, op) i EUR for n sekunder (n er et helt antal timer)
+        p, rng = self.profil, self.rng
+        op = self._retning(n)
+
+        niveauer = np.empty(n // 3600)
+        for h in range(len(niveauer)):
+            self.niveau = 0.9 * self.niveau + rng.normal(0, 0.15)
+            niveauer[h] = self.niveau
+        niveau = np.repeat(niveauer, 3600)
+
+        skift = rng.random(n) < 1 / PRISSKIFT_S
+        skift[1:] |= op[1:] != op[:-1]
+        blok = np.cumsum(skift)
+        z = rng.standard_t(5, size=blok[-1] + 1)[blok]
+
+        op_pris = np.minimum(p["op_median"] * np.exp(niveau + 0.5 * z), PRISLOFT_EUR)
+        ned_pris = p["ned_median"] + p["ned_spredning"] * (np.where(z < 0, 1.5 * z, z) + niveau)
+        ned_pris = np.clip(ned_pris, -PRISLOFT_EUR, PRISLOFT_EUR)
+        return (np.where(op, np.nan, np.round(ned_pris, 2)),
+                np.where(op, np.round(op_pris, 2), np.nan))
+
+
+def syntetiske_aktiveringer(start_date, end_date, områder=OMRÅDER, seed=0):
+    """Rådata (RÅ_KOLONNER, som Energinets fil) for de danske dage [start_date, end_date] - én Arrow-tabel pr. døgn."""
+    t0, t1 = _lokale_grænser(start_date, end_date)
+    forløb = [_Prisforløb(PROFILER[område], np.random.default_rng([seed, OMRÅDER.index(område)])) for område in områder]
+    start, slut = int(t0.timestamp()), int(t1.timestamp())
+    for fra in range(start, slut, 86400):
+        n = min(86400, slut - fra)
+        sekunder = np.arange(fra, fra + n, dtype=np.int64)
+        priser = [f.bid(n) for f in forløb]
+        # Rækkerne ligger som i Energinets fil: pr. sekund et område ad gangen
+        tid = pa.array(np.repeat(sekunder, len(områder)).astype("datetime64[s]"))
+        yield pa.table({
+            "ActivationTime": tid.cast(pa.string()),  # "2024-01-01 00:00:00" som i eksempeldataene
+            "PriceArea": pa.array(np.tile(np.asarray(områder, dtype=object), n), type=pa.string()),
+            "aFRR_DownActivatedPriceEUR": pa.array(np.column_stack([ned for ned, _ in priser]).ravel(), from_pandas=True),
+            "aFRR_UpActivatedPriceEUR": pa.array(np.column_stack([op for _, op in priser]).ravel(), from_pandas=True),
+        }).select(RÅ_KOLONNER)
+
+
+def skriv_syntetiske_data(sti, start_date, end_date, områder=OMRÅDER, seed=0):
+    # Én parquet-fil, skrevet dag for dag (én rækkegruppe pr. døgn)
+    midlertidig = f"{sti}.{os.getpid()}.tmp"
+    skriver = None
+    try:
+        for tabel in syntetiske_aktiveringer(start_date, end_date, områder, seed):
+            if skriver is None:
+                skriver = pq.ParquetWriter(midlertidig, tabel.schema)
+            skriver.write_table(tabel)
+    finally:
+        if skriver is not None:
+            skriver.close()
+    os.replace(midlertidig, sti)
+    return sti
+
+
+def syntetiske_priser(Synkronområde, start_date, end_date, seed=0):
+    """(df_spot, df_kapacitet) pr. time som get_spotdata og Rådighedspriser returnerer dem."""
+    rng = np.random.default_rng([seed, OMRÅDER.index(Synkronområde), 1])
+    t0, t1 = _lokale_grænser(start_date, end_date)
+    tid_utc = pd.date_range(t0, t1, freq="h", inclusive="left")
+    tid_dk = tid_utc.tz_convert(TIDSZONE)
+    n = len(tid_utc)
+
+    # Spot: dagsniveau (AR(1)) x døgnprofil med morgen- og aftentop + støj
+    dage = (tid_dk.tz_localize(None).normalize() - pd.Timestamp(start_date)).days.to_numpy()
+    dagsniveau = np.empty(dage[-1] + 1)
+    niveau = 0.0
+    for d in range(len(dagsniveau)):
+        niveau = 0.8 * niveau + rng.normal(0, 0.25)
+        dagsniveau[d] = niveau
+    time = tid_dk.hour.to_numpy()
+    profil = 1 + 0.3 * np.exp(-((time - 8) ** 2) / 4) + 0.45 * np.exp(-((time - 18) ** 2) / 6) - 0.2 * np.exp(-((time - 13) ** 2) / 8)
+    spot = np.round(600 * np.exp(dagsniveau[dage]) * profil + rng.normal(0, 90, n), 2)
+
+    op = np.round(np.minimum(150 * np.exp(rng.normal(0, 0.7, n)), 15000), 2)
+    ned = np.round(np.minimum(100 * np.exp(rng.normal(0, 0.8, n)), 15000), 2)
+
+    df_spot = pd.DataFrame({"HourUTC": tid_utc, "HourDK": tid_dk, "PriceArea": Synkronområde,
+                            "SpotPriceDKK": spot, "SpotPriceEUR": np.round(spot / EUR_DKK, 2)})
+    df_kapacitet = pd.DataFrame({"TimeUTC": tid_utc, "TimeDK": tid_dk, "PriceArea": Synkronområde,
+                                 "UpPriceDKK": op, "DownPriceDKK": ned,
+                                 "UpPriceEUR": np.round(op / EUR_DKK, 2), "DownPriceEUR": np.round(ned / EUR_DKK, 2)})
+    return df_spot, df_kapacitet
+
+
+def syntetisk_fil(størrelse, seed=0, mappe=DATA_MAPPE):
+    # Stien til rådata for en størrelse - dannes første gang
+    os.makedirs(mappe, exist_ok=True)
+    sti = os.path.join(mappe, f"syntetisk-v{GENERATOR_VERSION}-{størrelse}-{seed}.parquet")
+    if not os.path.exists(sti):
+        skriv_syntetiske_data(sti, *STØRRELSER[størrelse], seed=seed)
+    return sti
+
+
+################################################################################################################################################
+############## Måling ##############
+
+class _RSSmåler:
+    # Højeste RSS for processen mens blokken kører (samplet fra /proc/self/statm - kun Linux)
+    STATM = "/proc/self/statm"
+    INTERVAL_S = 0.005
+
+    def __init__(self):
+        self.top = None
+        self._stop = threading.Event()
+
+    def _rss(self):
+        with open(self.STATM) as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+    def _kør(self):
+        while not self._stop.wait(self.INTERVAL_S):
+            self.top = max(self.top, self._rss())
+
+    def __enter__(self):
+        if os.path.exists(self.STATM):
+            self.top = self._rss()
+            self._tråd = threading.Thread(target=self._kør, daemon=True)
+            self._tråd.start()
+        return self
+
+    def __exit__(self, *_):
+        if self.top is not None:
+            self._stop.set()
+            self._tråd.join()
+            self.top = max(self.top, self._rss())
+
+
+def mål(funktion, gentagelser=3):
+    """Kør funktion én gang med hukommelsesmåling og derefter `gentagelser` gange med tidtagning.
+
+    Returnerer (sidste returværdi, måling).
+    """
+    gc.collect()
+    with _RSSmåler() as rss:
+        tracemalloc.start()
+        try:
+            ud = funktion()
+            _, top = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    tider = []
+    for _ in range(max(gentagelser, 1)):
+        ud = None
+        gc.collect()
+        t0 = time.perf_counter()
+        ud = funktion()
+        tider.append(time.perf_counter() - t0)
+
+    måling = {
+        "sekunder": min(tider),
+        "tider": tider,
+        "top_python_mb": top / 1e6,
+        "top_rss_mb": rss.top / 1e6 if rss.top is not None else None,
+    }
+    return ud, måling
+
+
+def _miljø():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyarrow": pa.__version__,
+        "platform": platform.platform(),
+        "cpu": os.cpu_count(),
+    }
+
+
+def kør_benchmark(størrelse="måned", Synkronområde="DK1", gentagelser=3, seed=0, mappe=DATA_MAPPE, scenarie=None):
+    """Mål hvert trin i beregningskæden på de syntetiske data. Returnerer resultatet som dict (til JSON)."""
+    start_date, end_date = STØRRELSER[størrelse]
+    if scenarie is None:
+        scenarie = Scenarie(Synkronområde, start_date, end_date, "aFRR-opregulering", tom_budprofil(1000), marginalpris=600)
+
+    t0 = time.perf_counter()
+    sti = syntetisk_fil(størrelse, seed, mappe)
+    dannelse_s = time.perf_counter() - t0
+    df_spot, df_kapacitet = syntetiske_priser(Synkronområde, start_date, end_date, seed)
+
+    trin = {}
+
+    def trin_(navn, funktion, rækker=None):
+        ud, måling = mål(funktion, gentagelser)
+        måling["rækker"] = rækker(ud) if rækker else None
+        trin[navn] = måling
+        return ud
+
+    df_data = trin_("load_data_parquet", lambda: load_data_parquet(sti), len)
+    df_filtered = trin_("filtrer_data", lambda: filtrer_data(df_data, Synkronområde, start_date, end_date), len)
+    trin_("beregn_tarif", lambda: beregn_tarif(df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast), len)
+    df_filtered2, df_spot2 = trin_("tilføj_strømpris", lambda: tilføj_strømpris(
+        df_filtered, df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif),
+        lambda ud: len(ud[0]))
+    df_prices = trin_("beregn_rådighed", lambda: beregn_rådighed(scenarie, df_kapacitet, df_spot2), len)
+
+    def med_bud():
+        df = df_filtered2.copy()
+        df["bud_kw"] = bud_pr_sekund(df["Tid (UTC)"], df_prices)
+        return df
+
+    df_aktivering = trin_("bud_pr_sekund", med_bud, len)
+    # afrr_aktivering og delay_function skriver kolonner i df_aktivering - det samme resultat ved hver gentagelse
+    _, aFRR_navn = trin_("afrr_aktivering", lambda: afrr_aktivering(
+        scenarie.reguleringsretning, df_aktivering, scenarie.marginalpris, scenarie.Aktiveringsbetaling), lambda ud: ud[0])
+    trin_("delay_function", lambda: delay_function(scenarie.delay, scenarie.ramp_up, df_aktivering, aFRR_navn), len)
+    resultat = trin_("beregn_filtreret", lambda: beregn_filtreret(scenarie, df_filtered, df_spot, df_kapacitet, detaljer=False))
+
+    return {
+        "størrelse": størrelse,
+        "periode": [start_date.isoformat(), end_date.isoformat()],
+        "Synkronområde": Synkronområde,
+        "seed": seed,
+        "generator_version": GENERATOR_VERSION,
+        "rækker_i_fil": pq.read_metadata(sti).num_rows,
+        "fil_mb": os.path.getsize(sti) / 1e6,
+        "dannelse_s": dannelse_s,
+        "gentagelser": gentagelser,
+        "tidspunkt": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "miljø": _miljø(),
+        "trin": trin,
+        "kontrol": {
+            "aktiveringsindtjening": resultat.aktiveringsindtjening,
+            "rådighedsindtjening": resultat.rådighedsindtjening,
+            "antal_aktiveringer": resultat.antal_aktiveringer,
+        },
+    }
+
+
+def _læs_json(sti):
+    with open(sti, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def sammenlign(før, efter):
+    # To benchmark-resultater (dicts eller stier til JSON) -> tabel med tid og hukommelse pr. trin
+    før, efter = (_læs_json(r) if isinstance(r, str) else r for r in (før, efter))
+    rækker = []
+    for navn in [t for t in TRIN if t in før["trin"] or t in efter["trin"]]:
+        a, b = før["trin"].get(navn, {}), efter["trin"].get(navn, {})
+        rækker.append({
+            "trin": navn,
+            "før_s": a.get("sekunder"),
+            "efter_s": b.get("sekunder"),
+            "top_før_mb": a.get("top_python_mb"),
+            "top_efter_mb": b.get("top_python_mb"),
+        })
+    df = pd.DataFrame(rækker)
+    df["faktor"] = df["efter_s"] / df["før_s"]
+    return df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark af aFRR-beregningen på syntetiske data")
+    parser.add_argument("--størrelse", choices=list(STØRRELSER), default="måned", help="datasættets længde")
+    parser.add_argument("--område", choices=OMRÅDER, default="DK1", help="synkronområde der beregnes for")
+    parser.add_argument("--gentagelser", type=int, default=3, help="antal tidtagninger pr. trin (den hurtigste tæller)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data", default=DATA_MAPPE, help="mappe til de syntetiske rådata")
+    parser.add_argument("--ud", default=None, help="JSON-fil til resultatet (standard: benchmark-<størrelse>.json)")
+    parser.add_argument("--sammenlign", nargs=2, metavar=("FØR", "EFTER"), help="sammenlign to resultatfiler og afslut")
+    args = parser.parse_args()
+
+    if args.sammenlign:
+        print(sammenlign(*args.sammenlign).to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    else:
+        resultat = kør_benchmark(args.størrelse, args.område, args.gentagelser, args.seed, args.data)
+        ud = args.ud or f"benchmark-{args.størrelse}.json"
+        with open(ud, "w", encoding="utf-8") as f:
+            json.dump(resultat, f, indent=1, ensure_ascii=False)
+        for navn, måling in resultat["trin"].items():
+            rss = f"{måling['top_rss_mb']:9.1f} MB RSS" if måling["top_rss_mb"] is not None else ""
+            print(f"{navn:<20} {måling['sekunder']:9.3f} s  {måling['top_python_mb']:9.1f} MB  {rss}")
+        print(f"-> {ud}")
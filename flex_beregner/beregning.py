@@ -0,0 +1,472 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field, replace
+from datetime import date
+
+from .data import TIDSZONE, filtrer_data
+from .tarif import beregn_tarif, tarif_pr_tidspunkt
+from .tidsindeks import Tidsindeks, Aktiveringsudsnit, epoch_sekunder
+from .justering import Prisakse, Prisjustering, opslag, priskolonne, tidskolonne
+from .aktivering import Positionssummer, aktiv_serie, INDTJENING, OMKOSTNINGER, AKTIVERET_MW
+from .måling import trin
+
+RETNINGER = ["aFRR-opregulering", "aFRR-nedregulering"]
+KUNDETYPER = ['C', 'B-lav', 'B-høj', 'A-lav', 'A-høj']
+
+# Budtabellens akser (samme som input-tabellen i appen)
+TIMER = [f"{h:02d}-{(h+1)%24:02d}" for h in range(24)]
+UGEDAGE = ["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag", "Lørdag", "Søndag"]
+
+# Tidsserien pr. sekund (Resultat.df_aktivering, ~160 bytes pr. sekund) laves kun for perioder op til
+# 7 dage (~100 MB), så et resultat der gemmes i en session ikke vokser med periodens længde
+MAKS_DETALJE_SEKUNDER = 7 * 86400
+
+
+def med_tidsserie(start_date, end_date):
+    # Reglen for tidsserien pr. sekund i alle motorer og på siden: periodens længde i danske døgn (à 86400 sekunder,
+    # så en uge med skift til vintertid er med) - ikke antal rækker, som afhænger af huller i data
+    return ((end_date - start_date).days + 1) * 86400 <= MAKS_DETALJE_SEKUNDER
+
+
+def tom_budprofil(værdi=0):
+    return pd.DataFrame(værdi, index=TIMER, columns=UGEDAGE)
+
+
+def budmatrix(df_saved):
+    # 24x7 budtabel -> 7x24 numpy-matrix [ugedag (0=mandag), time]; manglende celler = 0 kW
+    profil = df_saved.reindex(index=TIMER, columns=UGEDAGE).fillna(0)
+    return profil.to_numpy(dtype=np.float64).T
+
+
+def prisnavn(retning):
+    if retning == "aFRR-opregulering":
+        return "UpPriceDKK"
+    elif retning == "aFRR-nedregulering":
+        return "DownPriceDKK"
+    raise ValueError(f"Ukendt reguleringsretning: {retning!r}")
+
+
+################################################################################################################################################
+############## Scenarie & resultat ##############
+
+@dataclass(frozen=True)
+class Scenarie:
+    """Alle input til én beregning (svarer til et tryk på "Lav Berening" i appen).
+
+    marginalpris = NaN betyder at aktivet ikke har en marginalpris.
+    budprofil er 24x7 tabellen i kW med index TIMER og kolonner UGEDAGE.
+    """
+    Synkronområde: str
+    start_date: date
+    end_date: date
+    reguleringsretning: str
+    budprofil: pd.DataFrame = field(compare=False, repr=False)
+    marginalpris: float = np.nan
+    Rådighedsbetaling: float = 0
+    Aktiveringsbetaling: float = 0
+    delay: int = 30
+    ramp_up: int = 120
+    kundetype: str = "C"
+    lavlast: float = 0.0
+    højlast: float = 0.0
+    spidslast: float = 0.0
+    eltarif: float = 120.0
+
+    def __post_init__(self):
+        prisnavn(self.reguleringsretning)
+        if self.kundetype not in KUNDETYPER:
+            raise ValueError(f"Ukendt kundetype: {self.kundetype!r}")
+        if self.start_date > self.end_date:
+            raise ValueError("start_date ligger efter end_date")
+
+    @property
+    def har_marginalpris(self):
+        return self.marginalpris is not None and not np.isnan(self.marginalpris)
+
+    def nøgle(self):
+        # Alt der kræver at aktiveringsforløbene bygges igen - dvs. alt undtagen delay og ramp-up
+        return (
+            self.Synkronområde, self.start_date, self.end_date, self.reguleringsretning,
+            budmatrix(self.budprofil).tobytes(),
+            self.marginalpris if self.har_marginalpris else None,
+            self.Rådighedsbetaling, self.Aktiveringsbetaling,
+            self.kundetype, self.lavlast, self.højlast, self.spidslast, self.eltarif,
+        )
+
+
+@dataclass
+class Resultat:
+    # Rådighed
+    rådighedsindtjening: float
+    antal_dage: int
+    timer_budt: int
+    gns_rådighedsindtjening: float
+    # Aktivering
+    aktiveringsindtjening: float
+    aktiveret_MWh: float
+    aktiveringsomkostninger: float
+    antal_aktiveringer: int
+    # Tidsserier (udelades når der køres uden detaljer)
+    df_rådighed: pd.DataFrame | None = field(default=None, repr=False)
+    df_aktivering: pd.DataFrame | None = field(default=None, repr=False)
+    # Summerne pr. position i aktiveringsforløbene - giver nye aktiveringstotaler for andre delay/ramp-up uden at genberegne
+    forløb: Positionssummer | None = field(default=None, repr=False)
+    delay: int = 0
+    ramp_up: int = 0
+
+    def med_aktiveringsspecifikationer(self, delay, ramp_up):
+        # Samme scenarie med andet delay/ramp-up - tid proportional med længden af det længste aktiveringsforløb.
+        # Per-sekund tidsserien afhænger af delay/ramp-up og medtages derfor kun hvis de er uændrede.
+        if (delay, ramp_up) == (self.delay, self.ramp_up):
+            return self
+        indtjening, omkostninger, aktiveret_MWh = self.forløb.summer(delay, ramp_up)
+        return replace(self, aktiveringsindtjening=float(indtjening), aktiveringsomkostninger=float(omkostninger),
+                       aktiveret_MWh=float(aktiveret_MWh), df_aktivering=None, delay=delay, ramp_up=ramp_up)
+
+    def følsomhed(self, delays, ramp_ups):
+        # Aktiveringstotaler for hvert (delay, ramp-up) par i gitteret som lang tabel
+        gitter = self.forløb.følsomhed(delays, ramp_ups)
+        d, r = np.meshgrid(delays, ramp_ups, indexing="ij")
+        return pd.DataFrame({
+            "delay": d.ravel(),
+            "ramp_up": r.ravel(),
+            "aktiveringsindtjening": gitter[..., INDTJENING].ravel(),
+            "aktiveringsomkostninger": gitter[..., OMKOSTNINGER].ravel(),
+            "aktiveret_MWh": gitter[..., AKTIVERET_MW].ravel(),
+        })
+
+    @property
+    def årlig_rådighedsindtjening(self):
+        return (self.rådighedsindtjening*365)/self.antal_dage
+
+    @property
+    def årlig_aktiveringsindtjening(self):
+        return (self.aktiveringsindtjening*365)/self.antal_dage
+
+    def som_dict(self):
+        return {
+            "rådighedsindtjening": self.rådighedsindtjening,
+            "årlig_rådighedsindtjening": self.årlig_rådighedsindtjening,
+            "antal_dage": self.antal_dage,
+            "timer_budt": self.timer_budt,
+            "gns_rådighedsindtjening": self.gns_rådighedsindtjening,
+            "aktiveringsindtjening": self.aktiveringsindtjening,
+            "årlig_aktiveringsindtjening": self.årlig_aktiveringsindtjening,
+            "aktiveret_MWh": self.aktiveret_MWh,
+            "aktiveringsomkostninger": self.aktiveringsomkostninger,
+            "antal_aktiveringer": self.antal_aktiveringer,
+        }
+
+
+################################################################################################################################################
+############## Strømpris (spot + tarif + eltarif) ##############
+
+# Beregningerne arbejder på numpy-arrays pr. sekund (aktiveringspriser, strømpris_pr_sekund). DataFrames
+# pr. sekund (tilføj_strømpris) bygges kun til tidsserien der vises for korte perioder.
+
+def aktiveringspriser(df_filtered):
+    # (epoch-sekunder, op, ned) i DKK som numpy-arrays - et Aktiveringsudsnit bliver ikke til en DataFrame
+    if isinstance(df_filtered, Aktiveringsudsnit):
+        return df_filtered.sekunder, df_filtered.op_dkk, df_filtered.ned_dkk
+    return (epoch_sekunder(df_filtered["Tid (UTC)"]), df_filtered["aFRR-op aktiveringspris (DKK)"].to_numpy(dtype=np.float64),
+            df_filtered["aFRR-ned aktiveringspris (DKK)"].to_numpy(dtype=np.float64))
+
+
+def strømpriser(df_spot, kundetype, lavlast, højlast, spidslast, eltarif):
+    # Spotrækkerne (timer eller kvarterer) med tarif, eltarif og strømpris
+    df_spot = beregn_tarif(df_spot, kundetype, lavlast, højlast, spidslast)
+    df_spot["El-tariffer (DKK)"] = eltarif
+    df_spot["Strømpris (DKK)"] = df_spot[priskolonne(df_spot)] + df_spot["tarif"] + df_spot["El-tariffer (DKK)"]
+    return df_spot
+
+
+def strømpris_pr_sekund(sekunder, spotpris, spot_indeks, kundetype, lavlast, højlast, spidslast, eltarif):
+    # Strømpris pr. sekund (8 bytes pr. sekund) - spot_indeks er spotrækken for hvert sekund (Prisjustering.spot_pr_sekund)
+    return opslag(spotpris, spot_indeks) + tarif_pr_tidspunkt(sekunder, kundetype, lavlast, højlast, spidslast) + float(eltarif)
+
+
+def tilføj_strømpris(df_filtered, df_spot, kundetype, lavlast, højlast, spidslast, eltarif, justering=None):
+    # Strømprisen og dens dele som kolonner pr. sekund (til tidsserien)
+    df_filtered2 = df_filtered.copy()
+    sekunder = epoch_sekunder(df_filtered2["Tid (UTC)"])
+
+    # Tarif, eltarif og strømpris pr. spottime
+    df_spot = strømpriser(df_spot, kundetype, lavlast, højlast, spidslast, eltarif)
+
+    # Spotpris pr. sekund via den forudberegnede tidsjustering (ellers slås den op her)
+    if justering is None:
+        spot_indeks = Prisakse(df_spot[tidskolonne(df_spot)]).indeks(sekunder)
+    else:
+        spot_indeks = justering.spot_pr_sekund
+    df_filtered2["Spotpriser (DKK)"] = opslag(df_spot[priskolonne(df_spot)], spot_indeks)
+    df_filtered2["tarif"] = tarif_pr_tidspunkt(sekunder, kundetype, lavlast, højlast, spidslast)
+
+    df_filtered2["El-tariffer (DKK)"] = eltarif
+    df_filtered2["Strømpris (DKK)"] = df_filtered2["Spotpriser (DKK)"] + df_filtered2["tarif"] + df_filtered2["El-tariffer (DKK)"]
+
+    return df_filtered2, df_spot
+
+
+################################################################################################################################################
+############## Rådighedsberegning ##############
+
+def beregn_rådighed(scenarie, df_kapacitet, df_spot, justering=None):
+    navn_reguleringsretning = prisnavn(scenarie.reguleringsretning)
+
+    df_prices = df_kapacitet.copy()
+
+    # Træk time og ugedag ud (lokal tid)
+    tider = pd.DatetimeIndex(df_prices["TimeDK"])
+    hour = tider.hour.to_numpy()
+    weekday = tider.weekday.to_numpy()
+
+    # Interval-kode og dansk ugedag som i budtabellen (til visning)
+    df_prices["interval"] = np.asarray(TIMER, dtype=object)[hour]
+    df_prices["weekday_dk"] = np.asarray(UGEDAGE, dtype=object)[weekday]
+
+    # Hent budstørrelse direkte fra 7x24 matricen
+    df_prices["bud_kw"] = budmatrix(scenarie.budprofil)[weekday, hour]
+
+    # Strøm prisen - slået op på tid (gennemsnit over kvarterer hvis spotprisen er kvartersopløst)
+    if justering is None:
+        justering = Prisjustering(np.empty(0, dtype=np.int64), df_spot, df_kapacitet)
+    df_prices["Strømpris (DKK/MWh)"] = justering.spot_pr_kapacitet(df_spot["Strømpris (DKK)"])
+
+    A = df_prices[navn_reguleringsretning].to_numpy(dtype=np.float64)
+    B = df_prices["bud_kw"].to_numpy(dtype=np.float64)
+    C = df_prices["Strømpris (DKK/MWh)"].to_numpy(dtype=np.float64)
+    D = scenarie.marginalpris
+
+    mask = np.ones(len(A), dtype=bool)
+
+    if scenarie.har_marginalpris:
+        if scenarie.reguleringsretning == "aFRR-opregulering":
+            mask &= C < D
+        else:
+            mask &= C > D
+
+    # brug float til at kunne indsætte NaN for rækker hvor mask=False
+    price_result = np.empty_like(A, dtype=np.float64)
+    price_result.fill(np.nan)
+    np.multiply(A, B, out=price_result, where=mask)
+
+    df_prices["indtjening"] = price_result/1000  # konverter kW til MW
+
+    # Få antal unikke dage
+    df_prices["Dato"] = pd.to_datetime(df_prices["TimeDK"]).dt.date
+
+    return df_prices
+
+
+################################################################################################################################################
+############## Aktiveringsberegning ##############
+
+def aktiveringsgrundlag(retning, strøm, op, ned, marginalpris, aktiveringspris):
+    # Maske for sekunder hvor aktiveringsbuddet ville blive aktiveret, afregningsprisen (værdi)
+    # og meromkostningen ved at divergere fra den oprindelige driftsplan (forskel). Alle som numpy-arrays.
+    strøm = np.asarray(strøm, dtype=np.float64)
+    op = np.asarray(op, dtype=np.float64)
+    ned = np.asarray(ned, dtype=np.float64)
+
+    if marginalpris is None or np.isnan(marginalpris):
+
+        if retning == "aFRR-opregulering":
+            mask = aktiveringspris < op
+            værdi = op
+        elif retning == "aFRR-nedregulering":
+            mask = -aktiveringspris > ned
+            værdi = -ned
+        else:
+            raise ValueError(f"Ukendt reguleringsretning: {retning!r}")
+
+        # uden marginalpris er der ingen meromkostning ved at divergere fra driftsplanen
+        forskel = np.zeros_like(strøm)
+
+    else:
+        if retning == "aFRR-opregulering":
+            mask = (marginalpris+aktiveringspris-strøm < op) & (strøm < marginalpris)
+            værdi = op
+            forskel = np.abs(marginalpris - strøm)
+        elif retning == "aFRR-nedregulering":
+            mask = (marginalpris-aktiveringspris-strøm > ned) & (strøm > marginalpris)
+            værdi = -ned
+            forskel = np.abs(strøm - marginalpris)
+        else:
+            raise ValueError(f"Ukendt reguleringsretning: {retning!r}")
+
+    return mask, værdi, forskel
+
+
+def afrr_aktivering(retning, df, marginalpris, aktiveringspris):
+
+    mask, værdi, forskel = aktiveringsgrundlag(retning, df["Strømpris (DKK)"], df["aFRR-op aktiveringspris (DKK)"],
+                                               df["aFRR-ned aktiveringspris (DKK)"], marginalpris, aktiveringspris)
+
+    aFRR_navn = "aFRR_op" if retning == "aFRR-opregulering" else "aFRR_ned"
+
+    count = int(mask.sum())
+    df[aFRR_navn] = np.where(mask, værdi, np.nan)
+    df[aFRR_navn + "_strøm"] = np.where(mask, df["Strømpris (DKK)"], np.nan)
+    # meromkostning for at divere fra den oprindelige driftsplan:
+    df['Prisforskel i absolut værdi'] = np.where(mask, forskel, np.nan)
+
+    return(count, aFRR_navn)
+
+
+def aktiveringsgrad(aktiv_serie, delay_tid, rampup_tid):
+    # - 0 de første delay_tid sek. af en aktivering
+    # - Stiger lineært fra 0 → 1 over rampup_tid sek.
+    # - Bliver 1 (100%) derefter
+    if rampup_tid <= 0:
+        return (aktiv_serie > delay_tid).astype(np.float64)
+    return np.clip((aktiv_serie - delay_tid) / rampup_tid, 0, 1)
+
+
+def delay_function(delay_tid, rampup_tid, df, aFRR_navn):
+        # Per-sekund kolonner til visning af tidsserien - totalerne regnes på aktiveringsforløbene
+
+        # Tæl hvor mange sekunder i træk aFRR_navn har været "aktiv"
+        df["aktiv serie"] = aktiv_serie(df[aFRR_navn].notna().to_numpy())
+
+        # Beregn aktiveringsprocent
+        df["aktivering"] = aktiveringsgrad(df["aktiv serie"], delay_tid, rampup_tid)
+
+        # Beregn aktiveringsindtjening som aktiveret produkt
+        df["indtjening_aktiveringer"] = (df["bud_kw"]/1000) * df[aFRR_navn] * df["aktivering"]
+
+        # Beregn omkostninger ifm. aktiveret produkt
+        df["omkostninger_aktiveringer"] = (df["bud_kw"]/1000) * df["Prisforskel i absolut værdi"] * df["aktivering"]
+
+        # Beregn aktiveret produkt MWh
+        df["aktiveret_MW"] = (df["bud_kw"]/1000) * df["aktivering"]
+
+        return(df)
+
+
+def rådighedsbud(df_prices):
+    # Budstørrelse pr. rådighedstime - kun i de timer hvor der bydes rådighed (indtjening ikke NaN)
+    return np.where(df_prices["indtjening"].notna(), df_prices["bud_kw"].to_numpy(dtype=np.float64), np.nan)
+
+
+def bud_pr_sekund(tid_utc, df_prices, justering=None):
+    # Rådighedsbuddet for hvert sekund, slået op med heltalsindeks i rådighedstimerne
+    if justering is None:
+        indeks = Prisakse(df_prices["TimeUTC"]).indeks(epoch_sekunder(tid_utc))
+    else:
+        indeks = justering.kapacitet_pr_sekund
+    return opslag(rådighedsbud(df_prices), indeks)
+
+
+def byg_aktiveringsforløb(scenarie, strøm, op, ned, bud_kw):
+    # Summerne pr. position i aktiveringsforløbene (Positionssummer) for scenariets bud ud fra arrays pr. sekund
+    mask, værdi, forskel = aktiveringsgrundlag(scenarie.reguleringsretning, strøm, op, ned,
+                                               scenarie.marginalpris, scenarie.Aktiveringsbetaling)
+    return Positionssummer.byg(mask, bud_kw, værdi, forskel), int(mask.sum())
+
+
+def aktiveringstidsserie(scenarie, df_filtered2, df_prices, justering=None):
+    # Per-sekund tidsserie til visning (samme tal som forløbene, bare udfoldet)
+    with trin("bud_pr_sekund") as m:
+        df_aktivering = df_filtered2.copy()
+
+        # Budstørrelse pr. sekund: kun i de timer hvor der bydes rådighed (indtjening ikke NaN)
+        df_aktivering["TimeDK"] = df_aktivering["Tid (UTC)"].dt.floor("h").dt.tz_convert(TIDSZONE)  # i UTC: entydig ved skift til vintertid
+        df_aktivering["bud_kw"] = bud_pr_sekund(df_aktivering["Tid (UTC)"], df_prices, justering)
+        m.rækker = len(df_aktivering)
+
+    with trin("afrr_aktivering") as m:
+        count, aFRR_navn = afrr_aktivering(scenarie.reguleringsretning, df_aktivering, scenarie.marginalpris, scenarie.Aktiveringsbetaling)
+        m.rækker = count
+    with trin("delay_function") as m:
+        df_aktivering = delay_function(scenarie.delay, scenarie.ramp_up, df_aktivering, aFRR_navn)
+        m.rækker = len(df_aktivering)
+    return df_aktivering
+
+
+def tidsserie_pr_sekund(scenarie, df_filtered, df_spot, df_prices, justering):
+    # aktiveringstidsserie for et Aktiveringsudsnit eller en filtreret DataFrame - DataFrame'en pr. sekund bygges kun her
+    if isinstance(df_filtered, Aktiveringsudsnit):
+        df_filtered = df_filtered.som_dataframe()
+    df_filtered2, _ = tilføj_strømpris(df_filtered, df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast,
+                                       scenarie.spidslast, scenarie.eltarif, justering)
+    return aktiveringstidsserie(scenarie, df_filtered2, df_prices, justering)
+
+
+################################################################################################################################################
+############## Samlet beregning ##############
+
+def beregn(scenarie, df_data, df_spot, df_kapacitet, detaljer=True):
+    """Kør hele beregningen bag "Lav Berening" for ét scenarie uden Streamlit.
+
+    df_data er aktiveringsdata fra load_data_parquet (eller et Tidsindeks over dem),
+    df_spot og df_kapacitet er svarene fra get_spotdata og Rådighedspriser for
+    scenariets område og periode. Med detaljer=True medfølger timetabellen og - for
+    perioder op til MAKS_DETALJE_SEKUNDER - tidsserien pr. sekund.
+    """
+    if isinstance(df_data, Tidsindeks):
+        df_filtered = df_data.arrays(scenarie.Synkronområde, scenarie.start_date, scenarie.end_date)
+    else:
+        df_filtered = filtrer_data(df_data, scenarie.Synkronområde, scenarie.start_date, scenarie.end_date)
+    return beregn_filtreret(scenarie, df_filtered, df_spot, df_kapacitet, detaljer=detaljer)
+
+
+def lav_justering(df_filtered, df_spot, df_kapacitet):
+    # Tidsjusteringen for en periode - kan gemmes og genbruges af alle scenarier på samme data
+    if isinstance(df_filtered, Aktiveringsudsnit):
+        return Prisjustering(df_filtered.sekunder, df_spot, df_kapacitet)
+    return Prisjustering(epoch_sekunder(df_filtered["Tid (UTC)"]), df_spot, df_kapacitet)
+
+
+def saml_resultat(scenarie, df_prices, forløb, count, detaljer=True):
+    # Resultat ud fra rådighedstimerne og aktiveringsforløbene (totalerne for scenariets delay/ramp-up)
+    indtjening, omkostninger, aktiveret_MWh = forløb.summer(scenarie.delay, scenarie.ramp_up)
+    mean = df_prices["indtjening"].mean()
+    resultat = Resultat(
+        rådighedsindtjening=float(df_prices["indtjening"].sum()),
+        antal_dage=int(df_prices["Dato"].nunique()),
+        timer_budt=int(df_prices["indtjening"].count()),
+        gns_rådighedsindtjening=float(mean) if pd.notna(mean) else 0.0,
+        aktiveringsindtjening=float(indtjening),
+        aktiveret_MWh=float(aktiveret_MWh),
+        aktiveringsomkostninger=float(omkostninger),
+        antal_aktiveringer=count,
+        forløb=forløb,
+        delay=scenarie.delay,
+        ramp_up=scenarie.ramp_up,
+    )
+    if detaljer:
+        kolonner = ["TimeDK", "interval", "weekday_dk", prisnavn(scenarie.reguleringsretning), "bud_kw", "Strømpris (DKK/MWh)", "indtjening"]
+        resultat.df_rådighed = df_prices[kolonner]
+    return resultat
+
+
+def beregn_filtreret(scenarie, df_filtered, df_spot, df_kapacitet, detaljer=True, justering=None):
+    # Som beregn, men på aktiveringsdata der allerede er filtreret til scenariets område og periode
+    # (DataFrame eller et Aktiveringsudsnit fra Tidsindeks.arrays)
+    if justering is None:
+        with trin("tidsjustering") as m:
+            justering = lav_justering(df_filtered, df_spot, df_kapacitet)
+            m.rækker = len(df_filtered)
+    elif justering.antal_sekunder != len(df_filtered):
+        raise ValueError(f"Tidsjusteringen dækker {justering.antal_sekunder} sekunder, data har {len(df_filtered)}")
+    sekunder, op, ned = aktiveringspriser(df_filtered)
+
+    with trin("strømpris") as m:
+        df_spot2 = strømpriser(df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+        strøm = strømpris_pr_sekund(sekunder, df_spot2[priskolonne(df_spot2)], justering.spot_pr_sekund, scenarie.kundetype,
+                                    scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+        m.rækker = len(strøm)
+    with trin("rådighed") as m:
+        df_prices = beregn_rådighed(scenarie, df_kapacitet, df_spot2, justering)
+        m.rækker = len(df_prices)
+    with trin("aktiveringsforløb") as m:
+        forløb, count = byg_aktiveringsforløb(scenarie, strøm, op, ned, bud_pr_sekund(None, df_prices, justering))
+        m.rækker = count
+
+    resultat = saml_resultat(scenarie, df_prices, forløb, count, detaljer)
+    if detaljer and med_tidsserie(scenarie.start_date, scenarie.end_date):
+        with trin("tidsserie"):
+            resultat.df_aktivering = tidsserie_pr_sekund(scenarie, df_filtered, df_spot, df_prices, justering)
+
+    return resultat
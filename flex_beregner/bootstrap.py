@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field
+
+from .data import TIDSZONE
+from .tarif import dagtyper
+from .tidsindeks import epoch_sekunder
+
+# --------------------------------------------
+# Bootstrap af årlig indtjening
+#
+# Et syntetisk år sammensættes af observerede dage trukket med tilbagelægning. Trækningen er
+# stratificeret efter tarifperioderne i tarifkalenderen: sæson (april-september / oktober-marts)
+# x dagtype (hverdag / weekend eller helligdag), så hvert stratum får lige så mange dage som i et
+# rigtigt år. Alle trækninger sker på én gang som heltalsindeks i den daglige indtjeningsmatrix.
+# --------------------------------------------
+STØRRELSER = ["rådighedsindtjening", "aktiveringsindtjening", "aktiveringsomkostninger"]
+PERCENTILER = [2.5, 5, 25, 50, 75, 95, 97.5]
+TRÆK_PR_BLOK = 2000  # syntetiske år pr. blok (begrænser hukommelsen til blok x dage i stratum)
+
+
+def stratum(datoer):
+    # 0 = vinter-hverdag, 1 = vinter-fridag, 2 = sommer-hverdag, 3 = sommer-fridag - dagtypen fra tarifkalenderen,
+    # slået op kl. 12 dansk tid
+    middag = pd.DatetimeIndex(pd.to_datetime(list(datoer))).normalize() + pd.Timedelta(hours=12)
+    return dagtyper(epoch_sekunder(middag.tz_localize(TIDSZONE))).astype(np.int64)
+
+
+@dataclass
+class Bootstrapresultat:
+    år: np.ndarray  # (træk, 3) syntetiske årstotaler i rækkefølgen STØRRELSER
+    punktestimat: dict = field(default_factory=dict)  # total * 365 / dage med data
+    erstattede_strata: list = field(default_factory=list)  # strata uden observerede dage (trukket fra samme dagtype)
+
+    @property
+    def samlet(self):
+        return self.år[:, 0] + self.år[:, 1] - self.år[:, 2]
+
+    def percentiler(self, percentiler=PERCENTILER):
+        # Én række pr. størrelse: punktestimat, middel og percentiler af de syntetiske år
+        rækker = []
+        for i, navn in enumerate(STØRRELSER + ["samlet"]):
+            x = self.samlet if navn == "samlet" else self.år[:, i]
+            række = {"størrelse": navn, "punktestimat": self.punktestimat.get(navn, np.nan), "middel": x.mean()}
+            række.update({f"p{p:g}": v for p, v in zip(percentiler, np.percentile(x, percentiler))})
+            rækker.append(række)
+        return pd.DataFrame(rækker)
+
+
+def bootstrap_år(daglig, antal_træk=10_000, år=None, seed=None):
+    """Syntetiske årstotaler trukket stratificeret fra daglig_indtjening.
+
+    år bestemmer hvor mange dage af hvert stratum et syntetisk år har (standard: året for den sidste dag).
+    """
+    daglig = daglig[daglig["har_data"]]
+    if daglig.empty:
+        raise ValueError("Ingen dage med data at trække fra")
+    værdier = daglig[STØRRELSER].to_numpy(dtype=np.float64)
+    observeret = stratum(daglig.index)
+
+    år = år or pd.Timestamp(daglig.index[-1]).year
+    mål = np.bincount(stratum(pd.date_range(f"{år}-01-01", f"{år}-12-31", freq="D").date), minlength=4)
+
+    rng = np.random.default_rng(seed)
+    totaler = np.zeros((antal_træk, len(STØRRELSER)))
+    erstattede = []
+    for s in range(4):
+        kilde = np.flatnonzero(observeret == s)
+        if len(kilde) == 0:
+            # Ingen observerede dage i sæsonen - brug samme dagtype fra den anden sæson
+            kilde = np.flatnonzero(observeret % 2 == s % 2)
+            if len(kilde) == 0:
+                kilde = np.arange(len(værdier))
+            erstattede.append(s)
+        for b0 in range(0, antal_træk, TRÆK_PR_BLOK):
+            b1 = min(b0 + TRÆK_PR_BLOK, antal_træk)
+            træk = kilde[rng.integers(0, len(kilde), size=(b1 - b0, mål[s]))]
+            totaler[b0:b1] += værdier[træk].sum(axis=1)
+
+    dage = len(daglig)
+    punkt = {navn: float(værdier[:, i].sum() * 365 / dage) for i, navn in enumerate(STØRRELSER)}
+    punkt["samlet"] = punkt["rådighedsindtjening"] + punkt["aktiveringsindtjening"] - punkt["aktiveringsomkostninger"]
+    return Bootstrapresultat(år=totaler, punktestimat=punkt, erstattede_strata=erstattede)
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from zoneinfo import ZoneInfo
+
+# Kurs anvendt: 1 EUR = 7,45 DKK
+EUR_DKK = 7.45
+TIDSZONE = ZoneInfo('Europe/Copenhagen')
+
+# Kolonner i rådata fra Energinet
+RÅ_KOLONNER = ['ActivationTime', 'PriceArea', 'aFRR_DownActivatedPriceEUR', 'aFRR_UpActivatedPriceEUR']
+
+############## Hent data ##############
+def load_data_parquet(path):
+    df = pd.read_parquet(path, columns=RÅ_KOLONNER)
+    return klargør_aktiveringsdata(df)
+
+
+def klargør_aktiveringsdata(df):
+    # Rename til dine ønskede navne
+    df.columns = ['Tid (UTC)', 'Synkronområde', 'aFRR-ned aktiveringspris (EUR)', 'aFRR-op aktiveringspris (EUR)']
+
+    # Konverter EUR til DKK
+    df["aFRR-ned aktiveringspris (DKK)"] = df["aFRR-ned aktiveringspris (EUR)"] * EUR_DKK
+    df["aFRR-op aktiveringspris (DKK)"] = df["aFRR-op aktiveringspris (EUR)"] * EUR_DKK
+
+    # Tidshåndtering
+    df['Tid (UTC)'] = pd.to_datetime(df['Tid (UTC)'], utc=True)
+    df['Tid (DK)'] = df['Tid (UTC)'].dt.tz_convert(TIDSZONE)
+
+    return df
+
+# --------------------------------------------
+# Filtrering af data på synkronområde og datointerval (begge datoer inklusiv)
+# --------------------------------------------
+def filtrer_data(df_data, Synkronområde, start_date, end_date):
+    mask = (
+        (df_data['Synkronområde'] == Synkronområde) &
+        (df_data['Tid (DK)'].dt.date >= start_date) &
+        (df_data['Tid (DK)'].dt.date <= end_date)
+    )
+    return df_data.loc[mask].reset_index(drop=True)
@@ -0,0 +1,182 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from typing import Callable
+
+from .beregning import (aktiveringspriser, beregn_rådighed, bud_pr_sekund, byg_aktiveringsforløb, lav_justering, med_tidsserie,
+                        saml_resultat, strømpriser, strømpris_pr_sekund, tidsserie_pr_sekund)
+from .justering import priskolonne
+from .kube import estimér_aktivering
+from .måling import trin
+
+# --------------------------------------------
+# Beregningsgraf med afhængigheder
+#
+#   udsnit, priser -> justering -> tarif (strømpris) -> rådighed -> aktivering -> resultat
+#                                                                \-> tidsserie (pr. sekund, til visning)
+#   priser -> estimat (fra time-kuben)
+#
+# Hver knude har en nøgle: hash af de input den selv bruger (felter i Scenarie eller ekstra input som
+# lagerets version) og af nøglerne på de knuder den afhænger af. Værdien gemmes under nøglen, så en knude
+# kun regnes igen når dens egne input - eller noget opstrøms - er ændret. Ændres kun aktiveringsbuddet,
+# regnes kun aktiveringsforløbene (og resultatet) igen; ændres kun delay/ramp-up, kun resultatet.
+#
+# Knudernes funktioner får inputtet som et objekt der kun giver adgang til de erklærede felter,
+# så en knude ikke kan bruge et input der ikke indgår i nøglen.
+# --------------------------------------------
+AFLEDTE = {"har_marginalpris": "marginalpris"}  # Scenarie-egenskaber -> feltet de er afledt af
+
+
+def fingeraftryk(værdi):
+    # Bytes der identificerer værdien (til nøglerne)
+    if isinstance(værdi, (int, float, np.integer, np.floating)) and not isinstance(værdi, bool):
+        return repr(float(værdi)).encode()  # 600 og 600.0 er samme input
+    if isinstance(værdi, pd.DataFrame):
+        return (repr(list(værdi.columns)) + repr(list(værdi.index))).encode() + pd.util.hash_pandas_object(værdi).to_numpy().tobytes()
+    if isinstance(værdi, np.ndarray):
+        return repr((værdi.dtype.str, værdi.shape)).encode() + np.ascontiguousarray(værdi).tobytes()
+    return repr(værdi).encode()
+
+
+@dataclass(frozen=True)
+class Knude:
+    navn: str
+    funktion: Callable      # funktion(input, *værdier af afhængighederne)
+    afhængigheder: tuple = ()
+    input: tuple = ()       # felter i Scenarie eller ekstra input
+
+
+class _Input:
+    # Knudens input: ekstra input først, ellers scenariets felt - kun de erklærede navne. Manglende input er None
+
+    def __init__(self, knude, scenarie, ekstra):
+        self._knude, self._scenarie, self._ekstra = knude, scenarie, ekstra
+
+    def __getattr__(self, navn):
+        if navn not in self._knude.input and AFLEDTE.get(navn) not in self._knude.input:
+            raise AttributeError(f"Knuden {self._knude.navn!r} afhænger ikke af {navn!r}")
+        if navn in self._ekstra:
+            return self._ekstra[navn]
+        return getattr(self._scenarie, navn, None)
+
+
+class Beregningsgraf:
+
+    def __init__(self, knuder, cache=None, maks_poster=1):
+        self.knuder = {k.navn: k for k in knuder}
+        self.cache = {} if cache is None else cache  # navn -> [(nøgle, værdi), ...] nyeste sidst
+        self.maks_poster = maks_poster
+        self.beregnede = []  # knuder regnet ved seneste hent
+
+    def nøgle(self, navn, scenarie=None, _nøgler=None, **ekstra):
+        _nøgler = {} if _nøgler is None else _nøgler
+        if navn not in _nøgler:
+            knude = self.knuder[navn]
+            h = hashlib.blake2b(navn.encode(), digest_size=16)
+            input = _Input(knude, scenarie, ekstra)
+            for felt in knude.input:
+                h.update(felt.encode() + b"=" + fingeraftryk(getattr(input, felt)) + b";")
+            for afh in knude.afhængigheder:
+                h.update(self.nøgle(afh, scenarie, _nøgler, **ekstra).encode())
+            _nøgler[navn] = h.hexdigest()
+        return _nøgler[navn]
+
+    def _gemt(self, navn, nøgle):
+        for gemt_nøgle, værdi in self.cache.get(navn, []):
+            if gemt_nøgle == nøgle:
+                return True, værdi
+        return False, None
+
+    def ajour(self, navn, scenarie=None, **ekstra):
+        # Ligger knudens værdi for dette input allerede klar?
+        return self._gemt(navn, self.nøgle(navn, scenarie, **ekstra))[0]
+
+    def gemt(self, navn, scenarie=None, **ekstra):
+        # Den gemte værdi for dette input - eller None (der regnes ikke)
+        return self._gemt(navn, self.nøgle(navn, scenarie, **ekstra))[1]
+
+    def hent(self, navn, scenarie=None, **ekstra):
+        # Knudens værdi - regnes (med de afhængigheder der ikke er ajour) hvis den ikke ligger klar
+        self.beregnede = []
+        return self._hent(navn, scenarie, {}, ekstra)
+
+    def _hent(self, navn, scenarie, nøgler, ekstra):
+        nøgle = self.nøgle(navn, scenarie, nøgler, **ekstra)
+        fundet, værdi = self._gemt(navn, nøgle)
+        if fundet:
+            return værdi
+        knude = self.knuder[navn]
+        værdier = [self._hent(afh, scenarie, nøgler, ekstra) for afh in knude.afhængigheder]
+        with trin(navn):
+            værdi = knude.funktion(_Input(knude, scenarie, ekstra), *værdier)
+        poster = [p for p in self.cache.get(navn, []) if p[0] != nøgle] + [(nøgle, værdi)]
+        self.cache[navn] = poster[-self.maks_poster:]
+        self.beregnede.append(navn)
+        return værdi
+
+    def ryd(self, navn=None):
+        if navn is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(navn, None)
+
+
+################################################################################################################################################
+############## Knuderne i aFRR-beregningen ##############
+
+PERIODE = ("Synkronområde", "start_date", "end_date")
+TARIFFER = ("kundetype", "lavlast", "højlast", "spidslast", "eltarif")
+RÅDIGHED = ("reguleringsretning", "budprofil", "marginalpris", "Rådighedsbetaling")
+AKTIVERING = ("reguleringsretning", "marginalpris", "Aktiveringsbetaling")
+SPECIFIKATIONER = ("delay", "ramp_up")
+
+
+def _tarif(p, udsnit, priser, justering):
+    # Strømpris pr. sekund (8 bytes pr. sekund) og timepriserne med tarif og strømpris - samme regning som beregn_filtreret
+    sekunder, _, _ = aktiveringspriser(udsnit)
+    df_spot = strømpriser(priser[0], p.kundetype, p.lavlast, p.højlast, p.spidslast, p.eltarif)
+    strøm = strømpris_pr_sekund(sekunder, df_spot[priskolonne(df_spot)], justering.spot_pr_sekund,
+                                p.kundetype, p.lavlast, p.højlast, p.spidslast, p.eltarif)
+    return strøm, df_spot
+
+
+def _aktivering(p, udsnit, tarif, df_prices, justering):
+    _, op, ned = aktiveringspriser(udsnit)
+    return byg_aktiveringsforløb(p, tarif[0], op, ned, bud_pr_sekund(None, df_prices, justering))
+
+
+def _tidsserie(p, udsnit, priser, justering, df_prices):
+    # Kun for perioder op til MAKS_DETALJE_SEKUNDER (med_tidsserie) - ellers None
+    if not med_tidsserie(p.start_date, p.end_date):
+        return None
+    return tidsserie_pr_sekund(p, udsnit, priser[0], df_prices, justering)
+
+
+def aktiveringsgraf(hent_udsnit, hent_priser, cache=None, hent_kube=None):
+    """Grafen bag "Lav Berening".
+
+    hent_udsnit(Synkronområde, start_date, end_date) giver aktiveringsdata for perioden (Aktiveringsudsnit
+    eller DataFrame), hent_priser(Synkronområde, start_date, end_date) giver (df_spot, df_kapacitet).
+    Ekstra input `version` (f.eks. lagerets version) indgår i nøglen for udsnittet og estimatet.
+    hent_kube(Synkronområde) giver områdets Timekube til det hurtige estimat (knuden "estimat").
+    """
+    estimat = [] if hent_kube is None else [
+        Knude("estimat", lambda p, priser: estimér_aktivering(hent_kube(p.Synkronområde), p, *priser),
+              ("priser",), PERIODE + ("version",) + TARIFFER + RÅDIGHED + AKTIVERING),
+    ]
+    return Beregningsgraf([
+        Knude("udsnit", lambda p: hent_udsnit(p.Synkronområde, p.start_date, p.end_date), input=PERIODE + ("version",)),
+        Knude("priser", lambda p: hent_priser(p.Synkronområde, p.start_date, p.end_date), input=PERIODE),
+        Knude("justering", lambda p, udsnit, priser: lav_justering(udsnit, *priser), ("udsnit", "priser")),
+        Knude("tarif", _tarif, ("udsnit", "priser", "justering"), TARIFFER),
+        Knude("rådighed", lambda p, priser, tarif, justering: beregn_rådighed(p, priser[1], tarif[1], justering),
+              ("priser", "tarif", "justering"), RÅDIGHED),
+        Knude("aktivering", _aktivering, ("udsnit", "tarif", "rådighed", "justering"), AKTIVERING),
+        Knude("resultat", lambda p, df_prices, aktivering: saml_resultat(p, df_prices, *aktivering),
+              ("rådighed", "aktivering"), SPECIFIKATIONER + ("reguleringsretning",)),
+        Knude("tidsserie", _tidsserie, ("udsnit", "priser", "justering", "rådighed"),
+              PERIODE + TARIFFER + AKTIVERING + SPECIFIKATIONER),
+    ] + estimat, cache)
@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from .api import TIMEOUT, session
+from .data import RÅ_KOLONNER
+from .kube import opdater_timekube, timekube_ajour
+from .lager import RÆKKER_PR_RÆKKEGRUPPE, _midlertidig_fil, _til_lagerformat, flet_kompakt, kompakt_ajour, skriv_kompakt
+
+# --------------------------------------------
+# Løbende indlæsning af nye aktiveringsdata
+#
+# Nye filer (parquet eller csv med Energinets kolonner, typisk ét døgn) hentes fra en kilde og lægges
+# i det partitionerede lager som nye filer i måneds-partitionerne - de eksisterende filer røres kun,
+# hvis de indeholder sekunder som også findes i de nye data (den nye værdi vinder). Den memory-mappede
+# kompakte kopi opdateres ved fletning, så der ikke læses parquet igen, og time-kuben (kube.py)
+# genberegnes kun for de berørte timer.
+#
+# Kilder:
+#   Mappekilde("data/indbakke")           filer der droppes i en mappe
+#   HTTPKilde("http://localhost:8000")    filserver med manifest.json (liste af filnavne),
+#                                         f.eks. `python -m http.server` i en mappe skrevet med skriv_manifest
+#
+# Hvilke filer der er indlæst står i <rod>/_indlæsning.json ("_"-præfiks: ignoreres af parquet-datasættet).
+# --------------------------------------------
+LOGFIL = "_indlæsning.json"
+FILTYPER = (".parquet", ".csv")
+MANIFEST = "manifest.json"
+
+_lås = threading.Lock()
+
+
+def læs_rådata(kilde, navn):
+    # Sti eller bytes -> Arrow-tabel med RÅ_KOLONNER
+    if isinstance(kilde, bytes):
+        kilde = pa.BufferReader(kilde)
+    if navn.lower().endswith(".csv"):
+        valg = pacsv.ConvertOptions(include_columns=RÅ_KOLONNER,
+                                    column_types={"ActivationTime": pa.string(), "PriceArea": pa.string()})
+        tabel = pacsv.read_csv(kilde, convert_options=valg)
+    else:
+        tabel = pq.read_table(kilde, columns=RÅ_KOLONNER)
+    return tabel.select(RÅ_KOLONNER)
+
+
+class Mappekilde:
+
+    def __init__(self, mappe):
+        self.mappe = mappe
+
+    def liste(self):
+        # Filnavn -> signatur (størrelse og ændringstid, så en rettet fil med samme navn indlæses igen)
+        if not os.path.isdir(self.mappe):
+            return {}
+        filer = {}
+        for navn in sorted(os.listdir(self.mappe)):
+            if navn.lower().endswith(FILTYPER):
+                info = os.stat(os.path.join(self.mappe, navn))
+                filer[navn] = f"{info.st_size}-{info.st_mtime_ns}"
+        return filer
+
+    def nøgle(self, navn):
+        return os.path.join(os.path.abspath(self.mappe), navn)
+
+    def hent(self, navn):
+        return læs_rådata(os.path.join(self.mappe, navn), navn)
+
+
+class HTTPKilde:
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def liste(self):
+        svar = session().get(f"{self.url}/{MANIFEST}", timeout=TIMEOUT)
+        svar.raise_for_status()
+        return {navn: "" for navn in svar.json() if navn.lower().endswith(FILTYPER)}
+
+    def nøgle(self, navn):
+        return f"{self.url}/{navn}"
+
+    def hent(self, navn):
+        svar = session().get(f"{self.url}/{navn}", timeout=TIMEOUT)
+        svar.raise_for_status()
+        return læs_rådata(svar.content, navn)
+
+
+def skriv_manifest(mappe):
+    # manifest.json til HTTPKilde - alle datafiler i mappen
+    navne = sorted(navn for navn in os.listdir(mappe) if navn.lower().endswith(FILTYPER))
+    with open(os.path.join(mappe, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(navne, f, indent=1)
+    return navne
+
+
+################################################################################################################################################
+############## Lager ##############
+
+def _klargør(tabel):
+    # Ensartede typer, tidsstempel + måned, og én række pr. (område, sekund) - den sidste i leverancen vinder
+    tabel = tabel.select(RÅ_KOLONNER)
+    tabel = tabel.set_column(1, "PriceArea", tabel.column("PriceArea").cast(pa.string()))
+    for i in (2, 3):
+        tabel = tabel.set_column(i, RÅ_KOLONNER[i], tabel.column(i).cast(pa.float64()))
+    tabel = _til_lagerformat(tabel)
+    tabel = tabel.filter(pc.is_valid(tabel.column("ActivationTime")))
+    tabel = tabel.append_column("_nr", pa.array(np.arange(len(tabel))))
+    tabel = tabel.sort_by([("PriceArea", "ascending"), ("ActivationTime", "ascending"), ("_nr", "ascending")])
+
+    område = pc.dictionary_encode(tabel.column("PriceArea")).combine_chunks().indices.to_numpy()
+    tid = tabel.column("ActivationTime").cast(pa.int64()).to_numpy()
+    sidste = np.ones(len(tabel), dtype=bool)
+    sidste[:-1] = (tid[1:] != tid[:-1]) | (område[1:] != område[:-1])
+    return tabel.filter(pa.array(sidste)).drop_columns(["_nr"])
+
+
+def _partitionsfiler(mappe):
+    if not os.path.isdir(mappe):
+        return []
+    return [os.path.join(mappe, navn) for navn in sorted(os.listdir(mappe))
+            if navn.endswith(".parquet") and not navn.startswith((".", "_"))]
+
+
+def _min_max(sti):
+    # (min, max) af ActivationTime fra rækkegruppe-statistikken
+    metadata = pq.read_metadata(sti)
+    kolonne = metadata.schema.to_arrow_schema().get_field_index("ActivationTime")
+    grænser = [(stat.min, stat.max) for i in range(metadata.num_row_groups)
+               if (stat := metadata.row_group(i).column(kolonne).statistics) is not None and stat.has_min_max]
+    if not grænser:
+        return None
+    return pd.Timestamp(min(g[0] for g in grænser)), pd.Timestamp(max(g[1] for g in grænser))
+
+
+def _skriv_parquet(tabel, sti):
+    midlertidig = os.path.join(os.path.dirname(sti), f".{os.path.basename(sti)}.tmp")
+    pq.write_table(tabel, midlertidig, row_group_size=RÆKKER_PR_RÆKKEGRUPPE)
+    os.replace(midlertidig, sti)
+
+
+def _fjern_overlap(sti, nye_tider):
+    # Fjern sekunder der også findes i de nye data fra en eksisterende fil. Returnerer antal fjernede rækker
+    tabel = pq.ParquetFile(sti).read()  # uden partitionskolonnerne fra stien
+    behold = pc.invert(pc.is_in(tabel.column("ActivationTime"), value_set=nye_tider))
+    antal = len(tabel) - pc.sum(behold.cast(pa.int64())).as_py()
+    if antal == len(tabel):
+        os.remove(sti)
+    elif antal:
+        _skriv_parquet(tabel.filter(behold), sti)
+    return antal
+
+
+def indlæs_tabel(rod, tabel):
+    """Læg rå aktiveringsdata ind i lageret og opdatér de kompakte kopier.
+
+    Returnerer {område: {"nye": ..., "erstattede": ..., "første": ..., "sidste": ...}}.
+    """
+    tabel = _klargør(tabel)
+    resultat = {}
+    for område in pc.unique(tabel.column("PriceArea")).to_pylist():
+        del_område = tabel.filter(pc.equal(tabel.column("PriceArea"), område))
+        ajour = kompakt_ajour(rod, område)  # før parquet-filerne ændres
+        kube_ajour = ajour and timekube_ajour(rod, område)
+
+        erstattede = 0
+        for måned in pc.unique(del_område.column("month")).to_pylist():
+            del_måned = del_område.filter(pc.equal(del_område.column("month"), måned))
+            tider = del_måned.column("ActivationTime")
+            t0, t1 = pd.Timestamp(pc.min(tider).as_py()), pd.Timestamp(pc.max(tider).as_py())
+            mappe = os.path.join(rod, f"PriceArea={område}", f"month={måned}")
+            for sti in _partitionsfiler(mappe):
+                grænser = _min_max(sti)
+                if grænser is not None and grænser[0] <= t1 and grænser[1] >= t0:
+                    erstattede += _fjern_overlap(sti, tider.combine_chunks())
+            os.makedirs(mappe, exist_ok=True)
+            _skriv_parquet(del_måned.drop_columns(["PriceArea", "month"]), os.path.join(mappe, f"indlæst-{time.time_ns()}.parquet"))
+
+        if ajour:
+            sekunder = del_område.column("ActivationTime").cast(pa.timestamp("s", tz="UTC")).cast(pa.int64()).to_numpy()
+            ned, op = (pc.fill_null(del_område.column(navn).cast(pa.float32()), float("nan")).to_numpy()
+                       for navn in RÅ_KOLONNER[2:])
+            flet_kompakt(rod, område, sekunder, ned, op)
+        else:
+            skriv_kompakt(rod, område)
+
+        tider = del_område.column("ActivationTime")
+        første, sidste = (pc.min(tider).as_py(), pc.max(tider).as_py())
+        opdater_timekube(rod, område, int(pd.Timestamp(første).timestamp()), int(pd.Timestamp(sidste).timestamp()), kube_ajour)
+        resultat[område] = {"nye": len(del_område) - erstattede, "erstattede": erstattede,
+                            "første": første, "sidste": sidste}
+    return resultat
+
+
+def _læs_log(rod):
+    sti = os.path.join(rod, LOGFIL)
+    if not os.path.exists(sti):
+        return {}
+    with open(sti, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _gem_log(rod, log):
+    sti = os.path.join(rod, LOGFIL)
+    midlertidig = _midlertidig_fil(sti)
+    with open(midlertidig, "w", encoding="utf-8") as f:
+        json.dump(log, f, indent=1, ensure_ascii=False)
+    os.replace(midlertidig, sti)
+
+
+def indlæs(rod, kilde):
+    """Indlæs alle filer fra kilden som ikke allerede er indlæst. Én række pr. (fil, område) i resultatet."""
+    kolonner = ["fil", "Synkronområde", "nye", "erstattede", "første", "sidste"]
+    with _lås:
+        log = _læs_log(rod)
+        rækker = []
+        for navn, signatur in kilde.liste().items():
+            nøgle = kilde.nøgle(navn)
+            if log.get(nøgle) == signatur:
+                continue
+            for område, tal in indlæs_tabel(rod, kilde.hent(navn)).items():
+                rækker.append({"fil": navn, "Synkronområde": område, **tal})
+            log[nøgle] = signatur
+            _gem_log(rod, log)  # efter hver fil - et afbrudt forløb genoptages ved næste fil
+        return pd.DataFrame(rækker, columns=kolonner)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .lager import lager_oversigt
+
+    parser = argparse.ArgumentParser(description="Indlæs nye aktiveringsdata i det partitionerede lager")
+    parser.add_argument("rod", help="mappe med det partitionerede lager")
+    kilde = parser.add_mutually_exclusive_group(required=True)
+    kilde.add_argument("--mappe", help="mappe hvor nye filer droppes")
+    kilde.add_argument("--url", help="filserver med manifest.json")
+    kilde.add_argument("--manifest", help="skriv manifest.json for en mappe (til HTTPKilde) og afslut")
+    args = parser.parse_args()
+
+    if args.manifest:
+        print(f"{len(skriv_manifest(args.manifest))} filer i {os.path.join(args.manifest, MANIFEST)}")
+    else:
+        df = indlæs(args.rod, Mappekilde(args.mappe) if args.mappe else HTTPKilde(args.url))
+        print(df.to_string(index=False) if len(df) else "Ingen nye filer")
+        for område, (lav, høj) in sorted(lager_oversigt(args.rod).items()):
+            print(f"{område}: {lav} - {høj}")
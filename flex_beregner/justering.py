@@ -0,0 +1,107 @@
+import numpy as np
+
+from .tidsindeks import epoch_sekunder
+
+# --------------------------------------------
+# Tidsjustering mellem aktiveringssekunder, spotpriser og rådighedspriser
+#
+# Hver prisserie (time- eller kvartersopløst) beskrives ved sorterede starttider og en varighed pr. række.
+# For hvert aktiveringssekund findes én gang rækken i hver serie der dækker sekundet (-1 hvis ingen),
+# og for hver rådighedstime de spotrækker der ligger i timen. Alle beregninger slår herefter op med
+# heltalsindeks i stedet for at joine på tid - og rækker der mangler i én af serierne giver NaN
+# frem for at forskyde resten.
+# --------------------------------------------
+MAKS_VARIGHED = 3600  # ingen prisrække dækker mere end en time
+
+
+def tidskolonne(df):
+    # Spotpriser (Elspotprices) har HourUTC, rådigheds- og kvarterpriser (DayAheadPrices) har TimeUTC
+    return "HourUTC" if "HourUTC" in df.columns else "TimeUTC"
+
+
+def priskolonne(df):
+    # Spotprisen i DKK: SpotPriceDKK i timepriserne (Elspotprices), DayAheadPriceDKK i kvarterpriserne (DayAheadPrices)
+    return "SpotPriceDKK" if "SpotPriceDKK" in df.columns else "DayAheadPriceDKK"
+
+
+class Prisakse:
+
+    def __init__(self, tid_utc):
+        start = np.asarray(epoch_sekunder(tid_utc), dtype=np.int64)
+        self.rækkefølge = np.argsort(start, kind="stable")
+        self.start = start[self.rækkefølge]
+
+        # Varighed = afstand til næste start, højst en time (sidste række: afstanden fra forrige). Så dækker
+        # en kvarterpris kun sit kvarter, en timepris hele sin time - også lige efter et skift fra kvarterer
+        # til timer - og et hul i serien bliver højst fyldt med en time af forrige pris
+        afstand = np.diff(self.start)
+        self.varighed = np.full(len(self.start), MAKS_VARIGHED, dtype=np.int64)
+        self.varighed[:-1] = np.minimum(afstand, MAKS_VARIGHED)
+        if len(afstand):
+            self.varighed[-1] = min(afstand[-1], MAKS_VARIGHED)
+        self.varighed[self.varighed <= 0] = MAKS_VARIGHED  # dubletter
+
+    def __len__(self):
+        return len(self.start)
+
+    def indeks(self, sekunder):
+        # Række (i den oprindelige rækkefølge) der dækker hvert tidspunkt, -1 hvis ingen
+        sekunder = np.asarray(sekunder, dtype=np.int64)
+        if len(self) == 0:
+            return np.full(len(sekunder), -1, dtype=np.int64)
+        pos = np.searchsorted(self.start, sekunder, side="right") - 1
+        sikker = np.maximum(pos, 0)
+        dækket = (pos >= 0) & (sekunder < self.start[sikker] + self.varighed[sikker])
+        return np.where(dækket, self.rækkefølge[sikker], -1)
+
+    def rækker_i(self, start, varighed):
+        # Sorterede positioner [lav, høj) for rækker der starter i hvert interval [start, start + varighed)
+        return np.searchsorted(self.start, start, side="left"), np.searchsorted(self.start, start + varighed, side="left")
+
+
+def opslag(værdier, indeks):
+    # værdier[indeks] med NaN hvor indeks er -1
+    værdier = np.asarray(værdier, dtype=np.float64)
+    if len(værdier) == 0:
+        return np.full(len(indeks), np.nan)
+    return np.where(indeks >= 0, værdier[np.maximum(indeks, 0)], np.nan)
+
+
+class Prisjustering:
+    """Indeks fra hvert aktiveringssekund ind i spot- og rådighedspriserne for én periode.
+
+    Bygges én gang pr. periode (afhænger kun af tidsstemplerne) og genbruges af alle scenarier.
+    """
+
+    def __init__(self, sekunder, df_spot, df_kapacitet):
+        self.antal_sekunder = len(sekunder)
+        self.spot = Prisakse(df_spot[tidskolonne(df_spot)])
+        self.kapacitet = Prisakse(df_kapacitet["TimeUTC"])
+
+        self.spot_pr_sekund = self.spot.indeks(sekunder)
+        self.kapacitet_pr_sekund = self.kapacitet.indeks(sekunder)
+
+        # Spotrækker inden for hver rådighedsrække (i rådighedsrækkernes oprindelige rækkefølge)
+        lav, høj = self.spot.rækker_i(self.kapacitet.start, self.kapacitet.varighed)
+        tilbage = np.argsort(self.kapacitet.rækkefølge)
+        self._spot_lav, self._spot_høj = lav[tilbage], høj[tilbage]
+        self._spot_dækker = self.spot.indeks(self.kapacitet.start[tilbage])
+
+    def spot_pr_kapacitet(self, værdier):
+        # En spotværdi pr. rådighedsrække: gennemsnittet af spotrækkerne i rådighedstimen
+        # (én ved timepriser, fire ved kvarterpriser) - ellers spotrækken der dækker rådighedsrækkens start
+        sorteret = np.asarray(værdier, dtype=np.float64)[self.spot.rækkefølge]
+        gyldig = ~np.isnan(sorteret)
+        sum_ = np.concatenate([[0.0], np.cumsum(np.where(gyldig, sorteret, 0.0))])
+        antal = np.concatenate([[0], np.cumsum(gyldig)])
+
+        n = antal[self._spot_høj] - antal[self._spot_lav]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            gennemsnit = (sum_[self._spot_høj] - sum_[self._spot_lav]) / n
+        return np.where(self._spot_høj > self._spot_lav, gennemsnit, opslag(værdier, self._spot_dækker))
+
+    def spot_sekund(self, værdier):
+        return opslag(værdier, self.spot_pr_sekund)
+
+    def kapacitet_sekund(self, værdier):
+        return opslag(værdier, self.kapacitet_pr_sekund)
@@ -0,0 +1,312 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from dataclasses import dataclass, fields, replace
+
+from .beregning import beregn_rådighed, rådighedsbud, strømpriser
+from .data import EUR_DKK, TIDSZONE
+from .justering import Prisakse, opslag
+from .lager import KOMPAKT_MAPPE, _kompakt_sti, _midlertidig_fil, _ét_chunk, kortlæg_tidsindeks
+from .tidsindeks import dag_grænser
+
+# --------------------------------------------
+# Time-kube: aktiveringspriserne opsummeret pr. område x UTC-time
+#
+# Pr. time og retning (op/ned) gemmes antal sekunder med pris, summen af priserne, sorterede kvantiler
+# og et histogram (antal + sum pr. prisinterval, grænser i GRÆNSER_EUR). Antal sekunder og prissum over
+# (op) eller under (ned) en vilkårlig tærskel fås fra histogrammets hale - eksakt når tærsklen ligger på
+# en grænse, ellers interpoleret inden for intervallet. Et år fylder ~8 MB pr. område mod ~500 MB sekunddata.
+#
+#   <rod>/_kompakt/DK1.kube.arrow
+#
+# Kuben bygges ud fra den kompakte kopi og opdateres for de berørte timer ved hver indlæsning.
+# --------------------------------------------
+GRÆNSER_EUR = np.concatenate([[-5000, -2000, -1000, -500, -300, -250], np.arange(-200, 201, 10),
+                              [250, 300, 500, 1000, 2000, 5000]]).astype(np.float64)  # 10 EUR-trin hvor de fleste bud ligger
+KVANTILER = np.array([0, 0.05, 0.25, 0.5, 0.75, 0.95, 1])
+ANTAL_INTERVALLER = len(GRÆNSER_EUR) + 1  # inkl. de to åbne ender
+
+
+@dataclass
+class Timekube:
+    Synkronområde: str
+    timer: np.ndarray          # int64 epoch-sekunder for timens start (UTC)
+    antal: np.ndarray          # int32 sekunder med data i timen
+    op_antal: np.ndarray       # int32 sekunder med op-pris
+    ned_antal: np.ndarray
+    op_sum: np.ndarray         # float64 EUR
+    ned_sum: np.ndarray
+    op_kvantiler: np.ndarray   # (timer, len(KVANTILER)) float32 EUR
+    ned_kvantiler: np.ndarray
+    op_hist_antal: np.ndarray  # (timer, ANTAL_INTERVALLER) int32
+    ned_hist_antal: np.ndarray
+    op_hist_sum: np.ndarray    # (timer, ANTAL_INTERVALLER) float32 EUR
+    ned_hist_sum: np.ndarray
+
+    def __len__(self):
+        return len(self.timer)
+
+    def _skiver(self, i0, i1):
+        return replace(self, **{f.name: getattr(self, f.name)[i0:i1] for f in fields(self) if f.name != "Synkronområde"})
+
+    def udsnit(self, start_date, end_date):
+        # Timer med dansk dato i [start_date, end_date] (begge inklusiv) - views, ingen kopi
+        grænser = dag_grænser(start_date, end_date)
+        return self._skiver(np.searchsorted(self.timer, grænser[0]), np.searchsorted(self.timer, grænser[-1]))
+
+    @property
+    def tid_utc(self):
+        return pd.DatetimeIndex(self.timer.astype("datetime64[s]")).tz_localize("UTC")
+
+    def antal_over(self, tærskel_eur):
+        # (antal, prissum EUR) pr. time for op-priser > tærskel (skalar eller én pr. time)
+        return _hale(self.op_hist_antal, self.op_hist_sum, tærskel_eur, over=True)
+
+    def antal_under(self, tærskel_eur):
+        # (antal, prissum EUR) pr. time for ned-priser < tærskel
+        return _hale(self.ned_hist_antal, self.ned_hist_sum, tærskel_eur, over=False)
+
+    def som_dataframe(self):
+        # Én række pr. time i DKK (til visning)
+        df = pd.DataFrame({
+            "TimeUTC": self.tid_utc,
+            "TimeDK": self.tid_utc.tz_convert(TIDSZONE),
+            "sekunder": self.antal,
+            "sekunder op": self.op_antal,
+            "sekunder ned": self.ned_antal,
+            "op middel (DKK)": self.op_sum / np.maximum(self.op_antal, 1) * EUR_DKK,
+            "ned middel (DKK)": self.ned_sum / np.maximum(self.ned_antal, 1) * EUR_DKK,
+        })
+        for j, q in enumerate(KVANTILER):
+            df[f"op p{q * 100:g} (DKK)"] = self.op_kvantiler[:, j] * EUR_DKK
+        for j, q in enumerate(KVANTILER):
+            df[f"ned p{q * 100:g} (DKK)"] = self.ned_kvantiler[:, j] * EUR_DKK
+        return df
+
+    def dagligt(self, tærskel_op_dkk=0.0, tærskel_ned_dkk=0.0):
+        # Én række pr. dansk kalenderdag: sekunder, middelpriser, min/max og sekunder over/under tærsklerne
+        dato = self.tid_utc.tz_convert(TIDSZONE).date
+        op_over, _ = self.antal_over(tærskel_op_dkk / EUR_DKK)
+        ned_under, _ = self.antal_under(tærskel_ned_dkk / EUR_DKK)
+        df = pd.DataFrame({
+            "Dato": dato,
+            "sekunder": self.antal,
+            "sekunder op": self.op_antal,
+            "sekunder ned": self.ned_antal,
+            "op_sum": self.op_sum,
+            "ned_sum": self.ned_sum,
+            "op min (DKK)": self.op_kvantiler[:, 0] * EUR_DKK,
+            "op max (DKK)": self.op_kvantiler[:, -1] * EUR_DKK,
+            "ned min (DKK)": self.ned_kvantiler[:, 0] * EUR_DKK,
+            "ned max (DKK)": self.ned_kvantiler[:, -1] * EUR_DKK,
+            f"sekunder op > {tærskel_op_dkk:g} DKK": op_over,
+            f"sekunder ned < {tærskel_ned_dkk:g} DKK": ned_under,
+        }).groupby("Dato").agg({
+            "sekunder": "sum", "sekunder op": "sum", "sekunder ned": "sum", "op_sum": "sum", "ned_sum": "sum",
+            "op min (DKK)": "min", "op max (DKK)": "max", "ned min (DKK)": "min", "ned max (DKK)": "max",
+            f"sekunder op > {tærskel_op_dkk:g} DKK": "sum", f"sekunder ned < {tærskel_ned_dkk:g} DKK": "sum",
+        })
+        df.insert(3, "op middel (DKK)", df.pop("op_sum") / df["sekunder op"].replace(0, np.nan) * EUR_DKK)
+        df.insert(4, "ned middel (DKK)", df.pop("ned_sum") / df["sekunder ned"].replace(0, np.nan) * EUR_DKK)
+        return df
+
+
+def _hale(hist_antal, hist_sum, tærskel, over):
+    # Antal og sum i histogrammets hale over/under tærsklen. Den del af intervallet med tærsklen der ligger
+    # over tærsklen regnes jævnt fordelt (de åbne ender: med eller ej efter intervallets middelværdi)
+    H = len(hist_antal)
+    tærskel = np.broadcast_to(np.asarray(tærskel, dtype=np.float64), (H,))
+    antal = hist_antal.astype(np.float64)
+    summer = hist_sum.astype(np.float64)
+    if not over:
+        # Spejl: værdier < t svarer til -værdier > -t
+        antal, summer = antal[:, ::-1], -summer[:, ::-1]
+        grænser, tærskel = -GRÆNSER_EUR[::-1], -tærskel
+    else:
+        grænser = GRÆNSER_EUR
+
+    hale_antal = np.concatenate([np.cumsum(antal[:, ::-1], axis=1)[:, ::-1], np.zeros((H, 1))], axis=1)
+    hale_sum = np.concatenate([np.cumsum(summer[:, ::-1], axis=1)[:, ::-1], np.zeros((H, 1))], axis=1)
+
+    k = np.searchsorted(grænser, tærskel, side="right")  # intervallet tærsklen ligger i (0 og len: åbne ender)
+    rækker = np.arange(H)
+    n_k, s_k = antal[rækker, k], summer[rækker, k]
+    lukket = (k > 0) & (k < len(grænser))
+    lav = grænser[np.clip(k - 1, 0, len(grænser) - 1)]
+    høj = grænser[np.clip(k, 0, len(grænser) - 1)]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        andel = np.where(lukket, (høj - tærskel) / (høj - lav), (s_k / n_k) > tærskel)
+        andel = np.nan_to_num(np.clip(andel, 0.0, 1.0))
+        del_sum = andel * s_k + np.where(lukket, n_k * andel * (1 - andel) * (høj - lav) / 2, 0.0)
+
+    ud_antal = hale_antal[rækker, k + 1] + andel * n_k
+    ud_sum = hale_sum[rækker, k + 1] + del_sum
+    return ud_antal, (ud_sum if over else -ud_sum)
+
+
+def _opsummer(priser, time_idx, H):
+    # Antal, sum, kvantiler og histogram pr. time for én prisserie
+    gyldig = ~np.isnan(priser)
+    p = priser[gyldig].astype(np.float64)
+    t = time_idx[gyldig]
+    antal = np.bincount(t, minlength=H)
+    summer = np.bincount(t, weights=p, minlength=H)
+
+    interval = np.searchsorted(GRÆNSER_EUR, p, side="right")
+    celle = t * ANTAL_INTERVALLER + interval
+    hist_antal = np.bincount(celle, minlength=H * ANTAL_INTERVALLER).reshape(H, ANTAL_INTERVALLER)
+    hist_sum = np.bincount(celle, weights=p, minlength=H * ANTAL_INTERVALLER).reshape(H, ANTAL_INTERVALLER)
+
+    # Kvantiler (lineær interpolation som np.quantile) ud fra priserne sorteret inden for hver time
+    sorteret = p[np.lexsort((p, t))]
+    start = np.cumsum(antal) - antal
+    pos = start[:, None] + KVANTILER[None, :] * np.maximum(antal - 1, 0)[:, None]
+    lav = np.floor(pos).astype(np.int64)
+    høj = np.minimum(lav + 1, start[:, None] + np.maximum(antal - 1, 0)[:, None])
+    kvantiler = np.full((H, len(KVANTILER)), np.nan, dtype=np.float32)
+    har = antal > 0
+    if har.any():
+        v_lav, v_høj = sorteret[lav[har]], sorteret[høj[har]]
+        kvantiler[har] = v_lav + (pos[har] - lav[har]) * (v_høj - v_lav)
+    return antal.astype(np.int32), summer, kvantiler, hist_antal.astype(np.int32), hist_sum.astype(np.float32)
+
+
+def byg_timekube(område, sekunder, ned_eur, op_eur):
+    # Kube for sorterede sekunddata (som i Tidsindeks)
+    time = sekunder // 3600
+    ny_time = np.ones(len(time), dtype=bool)
+    ny_time[1:] = time[1:] != time[:-1]
+    timer = time[ny_time]
+    time_idx = np.cumsum(ny_time) - 1
+    H = len(timer)
+
+    op = _opsummer(op_eur, time_idx, H)
+    ned = _opsummer(ned_eur, time_idx, H)
+    return Timekube(
+        Synkronområde=område,
+        timer=timer.astype(np.int64) * 3600,
+        antal=np.bincount(time_idx, minlength=H).astype(np.int32),
+        op_antal=op[0], ned_antal=ned[0],
+        op_sum=op[1], ned_sum=ned[1],
+        op_kvantiler=op[2], ned_kvantiler=ned[2],
+        op_hist_antal=op[3], ned_hist_antal=ned[3],
+        op_hist_sum=op[4], ned_hist_sum=ned[4],
+    )
+
+
+################################################################################################################################################
+############## Lager ##############
+
+def _kube_sti(rod, område):
+    return os.path.join(rod, KOMPAKT_MAPPE, f"{område}.kube.arrow")
+
+
+def _som_kolonne(værdier):
+    if værdier.ndim == 1:
+        return pa.array(værdier)
+    return pa.FixedSizeListArray.from_arrays(pa.array(værdier.reshape(-1)), værdier.shape[1])
+
+
+def skriv_timekube(rod, kube):
+    tabel = pa.table({f.name: _som_kolonne(getattr(kube, f.name)) for f in fields(kube) if f.name != "Synkronområde"})
+    sti = _kube_sti(rod, kube.Synkronområde)
+    os.makedirs(os.path.dirname(sti), exist_ok=True)
+    midlertidig = _midlertidig_fil(sti)
+    with pa.OSFile(midlertidig, "wb") as fil, pa.ipc.new_file(fil, tabel.schema) as skriver:
+        skriver.write_table(tabel)
+    os.replace(midlertidig, sti)
+    return sti
+
+
+def _læs_timekube(sti, område):
+    tabel = pa.ipc.open_file(pa.memory_map(sti, "r")).read_all()
+    værdier = {}
+    for navn in tabel.column_names:
+        kolonne = _ét_chunk(tabel.column(navn))
+        if pa.types.is_fixed_size_list(kolonne.type):
+            værdier[navn] = kolonne.values.to_numpy(zero_copy_only=True).reshape(len(kolonne), kolonne.type.list_size)
+        else:
+            værdier[navn] = kolonne.to_numpy(zero_copy_only=True)
+    return Timekube(Synkronområde=område, **værdier)
+
+
+def timekube_ajour(rod, område):
+    sti, kompakt = _kube_sti(rod, område), _kompakt_sti(rod, område)
+    return os.path.exists(sti) and os.path.exists(kompakt) and os.path.getmtime(sti) >= os.path.getmtime(kompakt)
+
+
+def kortlæg_timekube(rod, område):
+    # Memory-mappet kube for området - bygges fra den kompakte kopi hvis den mangler eller er forældet
+    indeks = kortlæg_tidsindeks(rod, område)
+    sti = _kube_sti(rod, område)
+    if not timekube_ajour(rod, område):
+        skriv_timekube(rod, byg_timekube(område, indeks.sekunder[område], indeks.ned_eur[område], indeks.op_eur[område]))
+    return _læs_timekube(sti, område)
+
+
+def opdater_timekube(rod, område, første, sidste, ajour=True):
+    # Genberegn timerne [første, sidste] (epoch-sekunder) efter en indlæsning og flet dem ind i kuben.
+    # ajour: kuben var opdateret før indlæsningen (ellers bygges den helt forfra)
+    indeks = kortlæg_tidsindeks(rod, område)
+    if not ajour or not os.path.exists(_kube_sti(rod, område)):
+        return skriv_timekube(rod, byg_timekube(område, indeks.sekunder[område], indeks.ned_eur[område], indeks.op_eur[område]))
+
+    t0, t1 = første // 3600 * 3600, (sidste // 3600 + 1) * 3600
+    sek = indeks.sekunder[område]
+    i0, i1 = np.searchsorted(sek, t0), np.searchsorted(sek, t1)
+    ny = byg_timekube(område, sek[i0:i1], indeks.ned_eur[område][i0:i1], indeks.op_eur[område][i0:i1])
+
+    gammel = _læs_timekube(_kube_sti(rod, område), område)
+    j0, j1 = np.searchsorted(gammel.timer, t0), np.searchsorted(gammel.timer, t1)
+    samlet = Timekube(Synkronområde=område, **{
+        f.name: np.concatenate([getattr(gammel, f.name)[:j0], getattr(ny, f.name), getattr(gammel, f.name)[j1:]])
+        for f in fields(gammel) if f.name != "Synkronområde"
+    })
+    return skriv_timekube(rod, samlet)
+
+
+################################################################################################################################################
+############## Hurtigt estimat ##############
+
+def estimér_aktivering(kube, scenarie, df_spot, df_kapacitet):
+    """Aktiveringsindtjening, -omkostninger og MWh estimeret fra time-kuben (uden delay og ramp-up).
+
+    Strømprisen regnes konstant inden for timen (middel over kvarterer), så tærsklen for aktivering
+    er én værdi pr. time. Giver en tilnærmelse til den fulde sekundberegning uden at røre sekunddata - den kan
+    ligge både over og under, fordi tærsklen pr. time flytter sekunder ind og ud af aktiveringsmasken.
+    """
+    kube = kube.udsnit(scenarie.start_date, scenarie.end_date)
+    df_spot = strømpriser(df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+    df_prices = beregn_rådighed(scenarie, df_kapacitet, df_spot)
+
+    indeks = Prisakse(df_prices["TimeUTC"]).indeks(kube.timer)
+    bud = np.nan_to_num(opslag(rådighedsbud(df_prices), indeks)) / 1000  # MW
+    strøm = opslag(df_prices["Strømpris (DKK/MWh)"], indeks)
+
+    ab, mp = scenarie.Aktiveringsbetaling, scenarie.marginalpris
+    op = scenarie.reguleringsretning == "aFRR-opregulering"
+    if scenarie.har_marginalpris:
+        basis = (strøm < mp) if op else (strøm > mp)
+        tærskel = (ab + mp - strøm) if op else (mp - ab - strøm)
+        forskel = np.abs(mp - strøm)
+    else:
+        basis = np.ones(len(kube), dtype=bool)
+        tærskel = np.full(len(kube), ab if op else -ab, dtype=np.float64)
+        forskel = np.zeros(len(kube))
+
+    if op:
+        antal, summer = kube.antal_over(tærskel / EUR_DKK)
+        værdi = summer * EUR_DKK
+    else:
+        antal, summer = kube.antal_under(tærskel / EUR_DKK)
+        værdi = -summer * EUR_DKK
+    vægt = np.where(basis, bud, 0.0) / 3600
+    return {
+        "aktiveringsindtjening": float(np.nansum(vægt * værdi)),
+        "aktiveringsomkostninger": float(np.nansum(vægt * antal * forskel)),
+        "aktiveret_MWh": float(np.nansum(vægt * antal)),
+        "antal_aktiveringer": float(np.nansum(np.where(basis, antal, 0.0))),
+    }
@@ -0,0 +1,223 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from datetime import timedelta
+
+from .data import RÅ_KOLONNER, TIDSZONE, klargør_aktiveringsdata
+from .tidsindeks import Tidsindeks
+
+# --------------------------------------------
+# Partitioneret lager for aktiveringsdata
+#
+#   <rod>/PriceArea=DK1/month=2025-03/part-0.parquet
+#
+# Hver fil er sorteret på ActivationTime (UTC) og skrevet med én rækkegruppe pr. døgn,
+# så min/max-statistikken pr. rækkegruppe kan bruges til at springe irrelevante dage over.
+# --------------------------------------------
+RÆKKER_PR_RÆKKEGRUPPE = 86400  # ét døgn med sekunddata
+TIDSTYPE = pa.timestamp("us", tz="UTC")
+PARTITIONERING = ds.partitioning(pa.schema([("PriceArea", pa.string()), ("month", pa.string())]), flavor="hive")
+
+
+def _til_lagerformat(tabel):
+    # ActivationTime gemmes som rigtig tidsstempel (ikke tekst), så der kan filtreres på statistikken
+    tid = tabel.column("ActivationTime")
+    if not pa.types.is_timestamp(tid.type):
+        tid = pc.strptime(tid, format="%Y-%m-%d %H:%M:%S", unit="us", error_is_null=False)
+    tid = tid.cast(TIDSTYPE)
+    måned = pc.strftime(tid, format="%Y-%m")
+    tabel = tabel.set_column(tabel.schema.get_field_index("ActivationTime"), "ActivationTime", tid)
+    return tabel.append_column("month", måned)
+
+
+def skriv_partitioneret(kilde, rod):
+    # Konverter en samlet parquet-fil (som data/aFRR_aktiveringsdata_kopi.parquet) til det partitionerede lager
+    tabel = pq.read_table(kilde, columns=RÅ_KOLONNER)
+    tabel = _til_lagerformat(tabel)
+    tabel = tabel.sort_by([("PriceArea", "ascending"), ("ActivationTime", "ascending")])
+
+    ds.write_dataset(
+        tabel,
+        rod,
+        format="parquet",
+        partitioning=PARTITIONERING,
+        basename_template="part-{i}.parquet",
+        existing_data_behavior="delete_matching",
+        min_rows_per_group=RÆKKER_PR_RÆKKEGRUPPE,
+        max_rows_per_group=RÆKKER_PR_RÆKKEGRUPPE,
+        use_threads=False,  # bevar sorteringen inden for hver fil
+    )
+
+
+def _dataset(rod):
+    return ds.dataset(rod, format="parquet", partitioning=PARTITIONERING)
+
+
+def utc_grænser(start_date, end_date):
+    # Danske kalenderdage [start_date, end_date] som halvåbent UTC-interval
+    t0 = pd.Timestamp(start_date).tz_localize(TIDSZONE).tz_convert("UTC")
+    t1 = pd.Timestamp(end_date + timedelta(days=1)).tz_localize(TIDSZONE).tz_convert("UTC")
+    return t0, t1
+
+
+def _læs_tabel(rod, Synkronområde, start_date, end_date, kolonner):
+    # Læs kun de partitioner og rækkegrupper der overlapper område og periode (uden periode: hele området)
+    filter = ds.field("PriceArea") == Synkronområde
+    if start_date is not None and end_date is not None:
+        t0, t1 = utc_grænser(start_date, end_date)
+        filter &= (
+            (ds.field("month") >= t0.strftime("%Y-%m")) &
+            (ds.field("month") <= (t1 - pd.Timedelta(microseconds=1)).strftime("%Y-%m")) &
+            (ds.field("ActivationTime") >= pa.scalar(t0, type=TIDSTYPE)) &
+            (ds.field("ActivationTime") < pa.scalar(t1, type=TIDSTYPE))
+        )
+    tabel = _dataset(rod).to_table(columns=kolonner, filter=filter)
+    return tabel.sort_by("ActivationTime")
+
+
+def læs_partitioneret(rod, Synkronområde, start_date=None, end_date=None):
+    tabel = _læs_tabel(rod, Synkronområde, start_date, end_date, RÅ_KOLONNER)
+    return klargør_aktiveringsdata(tabel.to_pandas())
+
+
+def _kompakte_kolonner(rod, område, start_date=None, end_date=None):
+    # (sekunder int64, ned float32 EUR, op float32 EUR) som Arrow-arrays uden nulls
+    tabel = _læs_tabel(rod, område, start_date, end_date, RÅ_KOLONNER[:1] + RÅ_KOLONNER[2:])
+    sekunder = tabel.column("ActivationTime").cast(pa.timestamp("s", tz="UTC")).cast(pa.int64())
+    ned = pc.fill_null(tabel.column("aFRR_DownActivatedPriceEUR").cast(pa.float32()), float("nan"))
+    op = pc.fill_null(tabel.column("aFRR_UpActivatedPriceEUR").cast(pa.float32()), float("nan"))
+    return [kolonne.combine_chunks() for kolonne in (sekunder, ned, op)]
+
+
+def læs_tidsindeks(rod, områder, start_date=None, end_date=None):
+    # Kompakt tidsindeks direkte fra Arrow: int64 sekunder og float32 EUR-priser, uden mellemliggende DataFrame
+    arrays = {}
+    for område in ([områder] if isinstance(områder, str) else områder):
+        arrays[område] = tuple(kolonne.to_numpy() for kolonne in _kompakte_kolonner(rod, område, start_date, end_date))
+    return Tidsindeks.fra_arrays(arrays)
+
+
+# --------------------------------------------
+# Memory-mappet kopi til deling mellem processer
+#
+#   <rod>/_kompakt/DK1.arrow   (ukomprimeret Arrow IPC: sekunder, ned_eur, op_eur)
+#
+# Filen mappes direkte ind i hukommelsen, så arrays i tidsindekset er skrivebeskyttede views på
+# operativsystemets sidecache: alle Streamlit-sessioner og alle processer (f.eks. batchkørsler)
+# på samme maskine deler én fysisk kopi. Den genskrives når områdets parquet-filer er nyere.
+# --------------------------------------------
+KOMPAKT_MAPPE = "_kompakt"  # "_"-præfiks: ignoreres af parquet-datasættet
+
+
+def _kompakt_sti(rod, område):
+    return os.path.join(rod, KOMPAKT_MAPPE, f"{område}.arrow")
+
+
+def _senest_ændret(rod, område):
+    mappe = os.path.join(rod, f"PriceArea={område}")
+    return max((os.path.getmtime(os.path.join(sti, navn)) for sti, _, filer in os.walk(mappe) for navn in filer), default=0.0)
+
+
+def _midlertidig_fil(sti):
+    # Unik midlertidig fil ved siden af sti (til atomisk os.replace) - også når flere tråde i samme proces skriver
+    fd, midlertidig = tempfile.mkstemp(prefix=os.path.basename(sti) + ".", suffix=".tmp", dir=os.path.dirname(sti))
+    os.close(fd)
+    return midlertidig
+
+
+def _ét_chunk(kolonne):
+    # Kolonnen som ét Arrow-array - uden kopi når filen har én bid. En tom fil har ingen bidder
+    return kolonne.chunk(0) if kolonne.num_chunks == 1 else kolonne.combine_chunks()
+
+
+def _skriv_kompakt_tabel(sti, sekunder, ned, op):
+    tabel = pa.table({"sekunder": sekunder, "ned_eur": ned, "op_eur": op})
+    os.makedirs(os.path.dirname(sti), exist_ok=True)
+    # Skriv til midlertidig fil og erstat atomisk - processer der allerede har den gamle fil mappet beholder den
+    midlertidig = _midlertidig_fil(sti)
+    with pa.OSFile(midlertidig, "wb") as fil, pa.ipc.new_file(fil, tabel.schema) as skriver:
+        skriver.write_table(tabel)
+    os.replace(midlertidig, sti)
+    return sti
+
+
+def skriv_kompakt(rod, område):
+    return _skriv_kompakt_tabel(_kompakt_sti(rod, område), *_kompakte_kolonner(rod, område))
+
+
+def kompakt_ajour(rod, område):
+    sti = _kompakt_sti(rod, område)
+    return os.path.exists(sti) and os.path.getmtime(sti) >= _senest_ændret(rod, område)
+
+
+def flet_kompakt(rod, område, sekunder, ned_eur, op_eur):
+    # Flet nye sekunder ind i den kompakte kopi uden at læse parquet-filerne igen (nye værdier vinder ved overlap).
+    # Nye døgn efter de eksisterende er en ren sammenkædning.
+    sti = _kompakt_sti(rod, område)
+    gammel = pa.ipc.open_file(pa.memory_map(sti, "r")).read_all()
+    sek, ned, op = (gammel.column(navn).to_numpy() for navn in ("sekunder", "ned_eur", "op_eur"))
+    i0 = np.searchsorted(sek, sekunder.min(), side="left")
+    i1 = np.searchsorted(sek, sekunder.max(), side="right")
+
+    behold = ~np.isin(sek[i0:i1], sekunder)
+    midt_sek = np.concatenate([sek[i0:i1][behold], sekunder])
+    rækkefølge = np.argsort(midt_sek, kind="stable")
+    dele = [(s[:i0], np.concatenate([s[i0:i1][behold], ny])[rækkefølge], s[i1:])
+            for s, ny in ((sek, sekunder), (ned, ned_eur), (op, op_eur))]
+    return _skriv_kompakt_tabel(sti, *(np.concatenate(del_) for del_ in dele))
+
+
+def kortlæg_tidsindeks(rod, områder):
+    # Tidsindeks hvis arrays er memory-mappede (og dermed skrivebeskyttede) views på <rod>/_kompakt
+    arrays = {}
+    for område in ([områder] if isinstance(områder, str) else områder):
+        sti = _kompakt_sti(rod, område)
+        if not os.path.exists(sti) or os.path.getmtime(sti) < _senest_ændret(rod, område):
+            skriv_kompakt(rod, område)
+        tabel = pa.ipc.open_file(pa.memory_map(sti, "r")).read_all()
+        arrays[område] = tuple(_ét_chunk(tabel.column(navn)).to_numpy(zero_copy_only=True)
+                               for navn in ("sekunder", "ned_eur", "op_eur"))
+    return Tidsindeks.fra_arrays(arrays)
+
+
+def lager_version(rod):
+    # Tidspunktet for den senest ændrede fil i lageret - bruges som cache-nøgle, så nye data slår igennem uden genstart
+    return max((os.path.getmtime(os.path.join(sti, navn)) for sti, _, filer in os.walk(rod) for navn in filer), default=0.0)
+
+
+def lager_oversigt(rod):
+    # Område -> (første, sidste) tidsstempel i UTC, læst alene fra parquet-metadata
+    oversigt = {}
+    for fragment in _dataset(rod).get_fragments():
+        område = ds.get_partition_keys(fragment.partition_expression)["PriceArea"]
+        metadata = fragment.metadata
+        kolonne = metadata.schema.to_arrow_schema().get_field_index("ActivationTime")
+        for i in range(metadata.num_row_groups):
+            stat = metadata.row_group(i).column(kolonne).statistics
+            if stat is None or not stat.has_min_max:
+                continue
+            lav, høj = pd.Timestamp(stat.min), pd.Timestamp(stat.max)
+            if område in oversigt:
+                lav, høj = min(lav, oversigt[område][0]), max(høj, oversigt[område][1])
+            oversigt[område] = (lav, høj)
+    return oversigt
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Skriv aktiveringsdata til partitioneret lager (PriceArea/month)")
+    parser.add_argument("kilde", help="samlet parquet-fil med rå aktiveringsdata")
+    parser.add_argument("rod", help="mappe til det partitionerede lager")
+    args = parser.parse_args()
+
+    skriv_partitioneret(args.kilde, args.rod)
+    for område, (lav, høj) in sorted(lager_oversigt(args.rod).items()):
+        print(f"{område}: {lav} - {høj}")
@@ -0,0 +1,351 @@
+import json
+import os
+import socket
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from .aktivering import aktiv_serie
+from .beregning import aktiveringsgrad, aktiveringsgrundlag, beregn_rådighed, rådighedsbud, strømpriser, strømpris_pr_sekund
+from .data import EUR_DKK, RÅ_KOLONNER, TIDSZONE
+from .indlæsning import læs_rådata
+from .justering import Prisakse, opslag, priskolonne, tidskolonne
+from .lager import _til_lagerformat
+from .tidsindeks import dag_grænser
+
+# --------------------------------------------
+# Live: "hvad ville vi have tjent" mens nye aktiveringssekunder kommer ind
+#
+# Poster med Energinets kolonner (RÅ_KOLONNER) læses i bidder fra en kilde:
+#   Filhale("data/live/aktiveringer.csv")   nye linjer i en csv-fil der skrives til løbende
+#   Socketkilde("localhost", 9000)          JSON-linjer over TCP (stand-in for et live feed)
+#   Afspilning(tabel, pr_bid=60)            historiske data afspillet i bidder (test og demo)
+#
+# Livberegning holder kun den løbende tilstand: sekunder i træk i det igangværende forløb (og dermed
+# ramp-niveauet), totalerne, summer pr. time og priserne for de dage der er i gang. En bid regnes
+# vektoriseret og koster det samme pr. post uanset hvor lang historikken er - den regnes aldrig igen.
+# Reglerne er de samme som i den historiske beregning (aktiveringsgrundlag, aktiveringsgrad, beregn_rådighed),
+# og som dér tæller forløb i rækker: et manglende sekund bryder ikke et forløb.
+# Rådighedsindtjeningen for en time tælles med, når timens første sekund kommer ind.
+# Poster skal komme i tidsorden - poster der ikke er nyere end den seneste regnede kasseres.
+# --------------------------------------------
+LIVE_STI = "./data/live/aktiveringer.csv"
+
+
+def tom_tabel():
+    return pa.table({"ActivationTime": pa.array([], pa.string()), "PriceArea": pa.array([], pa.string()),
+                     "aFRR_DownActivatedPriceEUR": pa.array([], pa.float64()), "aFRR_UpActivatedPriceEUR": pa.array([], pa.float64())})
+
+
+class Filhale:
+
+    def __init__(self, sti):
+        self.sti = sti
+        self.position = 0
+        self._overskrift = b""
+
+    def læs(self):
+        # Hele linjer skrevet siden sidst - en halvt skrevet linje venter til næste gang
+        if not os.path.exists(self.sti):
+            return tom_tabel()
+        if os.path.getsize(self.sti) < self.position:  # filen er startet forfra
+            self.position, self._overskrift = 0, b""
+        with open(self.sti, "rb") as f:
+            f.seek(self.position)
+            data = f.read()
+        slut = data.rfind(b"\n") + 1
+        if slut == 0:
+            return tom_tabel()
+        self.position += slut
+        linjer = data[:slut]
+        if not self._overskrift:
+            ny = linjer.find(b"\n") + 1
+            self._overskrift, linjer = linjer[:ny], linjer[ny:]
+        if not linjer.strip():
+            return tom_tabel()
+        return læs_rådata(self._overskrift + linjer, os.path.basename(self.sti))
+
+    def luk(self):
+        pass
+
+
+class Socketkilde:
+
+    def __init__(self, vært, port, timeout=5):
+        self.adresse = (vært, int(port))
+        self.timeout = timeout
+        self._sokkel = None
+        self._rest = b""
+
+    def læs(self):
+        # Alt modtaget siden sidst (uden at vente), én JSON-post pr. linje
+        if self._sokkel is None:
+            self._sokkel = socket.create_connection(self.adresse, timeout=self.timeout)
+            self._sokkel.setblocking(False)
+        data = [self._rest]
+        while True:
+            try:
+                bid = self._sokkel.recv(1 << 16)
+            except BlockingIOError:
+                break
+            if not bid:  # forbindelsen er lukket - næste læs forbinder igen
+                self.luk()
+                break
+            data.append(bid)
+        data = b"".join(data)
+        slut = data.rfind(b"\n") + 1
+        self._rest = data[slut:]
+        poster = [json.loads(linje) for linje in data[:slut].splitlines() if linje.strip()]
+        if not poster:
+            return tom_tabel()
+        return pa.Table.from_pylist([{k: post.get(k) for k in RÅ_KOLONNER} for post in poster])
+
+    def luk(self):
+        if self._sokkel is not None:
+            self._sokkel.close()
+            self._sokkel = None
+        self._rest = b""
+
+
+class Afspilning:
+
+    def __init__(self, tabel, pr_bid=60):
+        self.tabel = tabel.select(RÅ_KOLONNER)
+        self.pr_bid = pr_bid
+        self.position = 0
+
+    def læs(self):
+        bid = self.tabel.slice(self.position, self.pr_bid)
+        self.position += len(bid)
+        return bid
+
+    def luk(self):
+        pass
+
+
+def åbn_kilde(tekst):
+    # "vært:port" -> Socketkilde, ellers en sti -> Filhale
+    vært, _, port = tekst.strip().rpartition(":")
+    if vært and port.isdigit() and not os.path.exists(tekst):
+        return Socketkilde(vært, int(port))
+    return Filhale(tekst.strip())
+
+
+def poster(tabel, område):
+    # Rå poster -> (epoch-sekunder, op, ned) i DKK for området, sorteret og uden dubletter (den sidste vinder)
+    tabel = tabel.select(RÅ_KOLONNER)
+    tabel = tabel.filter(pc.equal(tabel.column("PriceArea").cast(pa.string()), område))
+    if len(tabel) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+    tid = _til_lagerformat(tabel).column("ActivationTime")
+    sekunder = pc.fill_null(tid.cast(pa.timestamp("s", tz="UTC")).cast(pa.int64()), -1).to_numpy()
+    ned, op = (pc.fill_null(tabel.column(navn).cast(pa.float64()), float("nan")).to_numpy() * EUR_DKK
+               for navn in RÅ_KOLONNER[2:])
+
+    rækkefølge = np.argsort(sekunder, kind="stable")
+    sekunder, op, ned = sekunder[rækkefølge], op[rækkefølge], ned[rækkefølge]
+    sidste = np.ones(len(sekunder), dtype=bool)
+    sidste[:-1] = sekunder[1:] != sekunder[:-1]
+    sidste &= sekunder >= 0
+    return sekunder[sidste], op[sidste], ned[sidste]
+
+
+def _dato(sekund):
+    return pd.Timestamp(int(sekund), unit="s", tz="UTC").tz_convert(TIDSZONE).date()
+
+
+class Livberegning:
+    """Løbende indtjening for ét scenarie (delay og ramp-up som i scenariet).
+
+    hent_priser(Synkronområde, start_date, end_date) giver (df_spot, df_kapacitet) som hent_prisdata.
+    Scenariets periode bruges ikke - priserne hentes for de dage posterne falder i.
+    """
+
+    def __init__(self, scenarie, hent_priser):
+        self.scenarie = scenarie
+        self.hent_priser = hent_priser
+        # Løbende tilstand
+        self.serie = 0          # sekunder i træk i det igangværende forløb (0 = ingen aktivering)
+        self.sidste = None      # seneste regnede sekund (epoch)
+        self.sidste_time = None # starten af seneste rådighedstime der er talt med (epoch)
+        # Totaler
+        self.poster = 0
+        self.kasserede = 0
+        self.antal_aktiveringer = 0
+        self.aktiveringsindtjening = 0.0
+        self.aktiveringsomkostninger = 0.0
+        self.aktiveret_MWh = 0.0
+        self.rådighedsindtjening = 0.0
+        self.timer_budt = 0
+        self.pr_time = {}       # timestart (epoch) -> [rådighed, aktivering, omkostninger, MWh]
+        # Priser for de dage der er i gang
+        self._dage = []
+        self._spot = self._priser = None
+        self._seneste_dag = (0, 0)  # [start, slut) i epoch-sekunder for den seneste hentede dag
+
+    @property
+    def niveau(self):
+        # Aktiveringsgraden (ramp-niveauet) i det seneste sekund
+        return float(aktiveringsgrad(np.array([self.serie]), self.scenarie.delay, self.scenarie.ramp_up)[0])
+
+    def _sørg_for_priser(self, første, sidste):
+        # Hent priserne for dage der ikke er hentet endnu, og glem dagene før den første post
+        if self._seneste_dag[0] <= første and sidste < self._seneste_dag[1]:
+            return
+        d0, d1 = _dato(første), _dato(sidste)
+        mangler = [d for d in pd.date_range(d0, d1, freq="D").date if d not in self._dage]
+        behold = [d for d in self._dage if d >= d0]
+        if not mangler and len(behold) == len(self._dage):
+            return
+        s = self.scenarie
+        spot, kapacitet = [], []
+        if behold:
+            spot.append(self._spot[self._spot["_dag"].isin(behold)])
+            kapacitet.append(self._priser[self._priser["_dag"].isin(behold)])
+        if mangler:
+            df_spot, df_kapacitet = self.hent_priser(s.Synkronområde, min(mangler), max(mangler))
+            df_spot = strømpriser(df_spot, s.kundetype, s.lavlast, s.højlast, s.spidslast, s.eltarif)
+            df_prices = beregn_rådighed(s, df_kapacitet, df_spot)
+            df_spot["_dag"] = pd.to_datetime(df_spot[tidskolonne(df_spot)], utc=True).dt.tz_convert(TIDSZONE).dt.date
+            df_prices["_dag"] = df_prices["Dato"]
+            spot.append(df_spot)
+            kapacitet.append(df_prices)
+        self._spot = pd.concat(spot, ignore_index=True)
+        self._priser = pd.concat(kapacitet, ignore_index=True)
+        self._dage = sorted(set(behold) | set(mangler))
+        self._seneste_dag = tuple(int(g) for g in dag_grænser(self._dage[-1], self._dage[-1]))
+        self._spotakse = Prisakse(self._spot[tidskolonne(self._spot)])
+        self._kapakse = Prisakse(self._priser["TimeUTC"])
+        self._spotpris = self._spot[priskolonne(self._spot)].to_numpy(dtype=np.float64)
+        self._bud_mw = np.nan_to_num(rådighedsbud(self._priser)) / 1000
+        self._rådighed = self._priser["indtjening"].to_numpy(dtype=np.float64)
+
+    def opdater(self, tabel):
+        # Regn en bid rå poster ind i tilstanden. Returnerer antal nye sekunder
+        sekunder, op, ned = poster(tabel, self.scenarie.Synkronområde)
+        if self.sidste is not None:
+            nye = sekunder > self.sidste
+            self.kasserede += int(len(sekunder) - nye.sum())
+            sekunder, op, ned = sekunder[nye], op[nye], ned[nye]
+        if len(sekunder) == 0:
+            return 0
+        self._sørg_for_priser(sekunder[0], sekunder[-1])
+        s = self.scenarie
+
+        # Strømpris og rådighedsbud pr. sekund (som beregn_filtreret og bud_pr_sekund)
+        strøm = strømpris_pr_sekund(sekunder, self._spotpris, self._spotakse.indeks(sekunder),
+                                    s.kundetype, s.lavlast, s.højlast, s.spidslast, s.eltarif)
+        kap = self._kapakse.indeks(sekunder)
+        bud_mw = np.nan_to_num(opslag(self._bud_mw, kap))
+
+        # Forløbet fortsætter hen over bidgrænsen: det første forløb i bidden tæller videre fra self.serie
+        mask, værdi, forskel = aktiveringsgrundlag(s.reguleringsretning, strøm, op, ned, s.marginalpris, s.Aktiveringsbetaling)
+        serie = aktiv_serie(mask)
+        if self.serie and mask[0]:
+            første_forløb = len(mask) if mask.all() else int(np.argmin(mask))
+            serie[:første_forløb] += self.serie
+        self.serie = int(serie[-1])
+
+        w = np.where(mask, bud_mw * aktiveringsgrad(serie, s.delay, s.ramp_up), 0.0) / 3600
+        indtjening = w * np.where(mask, værdi, 0.0)
+        omkostninger = w * np.where(mask, forskel, 0.0)
+
+        # Summer pr. time - og rådighedsindtjeningen for timer der ikke er talt med før
+        timer, start = np.unique(sekunder // 3600 * 3600, return_index=True)
+        pr_time = np.stack([np.add.reduceat(x, start) for x in (indtjening, omkostninger, w)])
+        rådighed = np.zeros(len(timer))
+        kap_timer = kap[start]
+        for i, (time_, række) in enumerate(zip(timer, kap_timer)):
+            if række < 0 or (self.sidste_time is not None and time_ <= self.sidste_time):
+                continue
+            værdi_time = self._rådighed[række]
+            if not np.isnan(værdi_time):
+                rådighed[i] = værdi_time
+                self.timer_budt += 1
+        self.sidste_time = int(timer[-1])
+        for i, time_ in enumerate(timer.tolist()):
+            summer = self.pr_time.setdefault(time_, [0.0, 0.0, 0.0, 0.0])
+            summer[0] += rådighed[i]
+            summer[1] += pr_time[0, i]
+            summer[2] += pr_time[1, i]
+            summer[3] += pr_time[2, i]
+
+        self.poster += len(sekunder)
+        self.antal_aktiveringer += int(mask.sum())
+        self.aktiveringsindtjening += float(indtjening.sum())
+        self.aktiveringsomkostninger += float(omkostninger.sum())
+        self.aktiveret_MWh += float(w.sum())
+        self.rådighedsindtjening += float(rådighed.sum())
+        self.sidste = int(sekunder[-1])
+        return len(sekunder)
+
+    def kør(self, kilde, pause=1.0, stop=None):
+        # Læs fra kilden til stop() er sand (eller for evigt) - giver tilstanden efter hver bid med nye sekunder
+        while stop is None or not stop():
+            if self.opdater(kilde.læs()):
+                yield self
+            else:
+                time.sleep(pause)
+
+    def som_dict(self):
+        return {
+            "sidste": None if self.sidste is None else pd.Timestamp(self.sidste, unit="s", tz="UTC").tz_convert(TIDSZONE),
+            "poster": self.poster,
+            "kasserede": self.kasserede,
+            "rådighedsindtjening": self.rådighedsindtjening,
+            "timer_budt": self.timer_budt,
+            "aktiveringsindtjening": self.aktiveringsindtjening,
+            "aktiveringsomkostninger": self.aktiveringsomkostninger,
+            "aktiveret_MWh": self.aktiveret_MWh,
+            "antal_aktiveringer": self.antal_aktiveringer,
+            "serie": self.serie,
+            "niveau": self.niveau,
+        }
+
+    def timetabel(self):
+        # Én række pr. time med data (dansk tid)
+        df = pd.DataFrame.from_dict(self.pr_time, orient="index",
+                                    columns=["rådighedsindtjening", "aktiveringsindtjening", "aktiveringsomkostninger", "aktiveret_MWh"])
+        df.index = pd.to_datetime(df.index, unit="s", utc=True).tz_convert(TIDSZONE)
+        df.index.name = "TimeDK"
+        return df.sort_index()
+
+
+################################################################################################################################################
+############## Afspilning til en fil (stand-in for et live feed) ##############
+
+def afspil(tabel, sti=LIVE_STI, hastighed=1.0, pr_bid=60):
+    # Skriv historiske poster til en csv-fil i deres egen takt (hastighed gange hurtigere) - til Filhale
+    tabel = tabel.select(RÅ_KOLONNER).sort_by("ActivationTime")
+    os.makedirs(os.path.dirname(sti) or ".", exist_ok=True)
+    with open(sti, "w", encoding="utf-8", newline="\n") as f:
+        f.write(",".join(RÅ_KOLONNER) + "\n")
+        f.flush()
+        for i in range(0, len(tabel), pr_bid):
+            bid = tabel.slice(i, pr_bid).to_pandas()
+            bid["ActivationTime"] = pd.to_datetime(bid["ActivationTime"]).dt.strftime("%Y-%m-%d %H:%M:%S")
+            f.write(bid.to_csv(index=False, header=False, lineterminator="\n"))
+            f.flush()
+            time.sleep(len(bid) / hastighed)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from .lager import _læs_tabel
+
+    parser = argparse.ArgumentParser(description="Afspil historiske aktiveringsdata til en csv-fil, som live-visningen følger")
+    parser.add_argument("--lager", default="./data/aktiveringsdata", help="partitioneret lager med aktiveringsdata")
+    parser.add_argument("--område", default="DK1")
+    parser.add_argument("--fra", required=True, help="første dato (YYYY-MM-DD)")
+    parser.add_argument("--til", required=True, help="sidste dato (YYYY-MM-DD)")
+    parser.add_argument("--ud", default=LIVE_STI, help="csv-fil der skrives til")
+    parser.add_argument("--hastighed", type=float, default=60.0, help="gange hurtigere end realtid")
+    args = parser.parse_args()
+
+    tabel = _læs_tabel(args.lager, args.område, pd.Timestamp(args.fra).date(), pd.Timestamp(args.til).date(), RÅ_KOLONNER)
+    print(f"Afspiller {len(tabel):,} sekunder til {args.ud} ({args.hastighed:g}x realtid)")
+    afspil(tabel, args.ud, args.hastighed)
@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+# --------------------------------------------
+# Tid, rækker og hukommelse pr. trin i beregningen
+#
+# Trinnene markeres med
+#
+#   with trin("rådighed") as m:
+#       ...
+#       m.rækker = len(df)
+#
+# Uden en aktiv Målelog er trin() blot ét opslag i en ContextVar (ingen tidtagning, ingen tracemalloc),
+# så markeringerne kan blive i koden. Med en aktiv Målelog (sæt_målelog) gemmes vægurstid, rækker og - med
+# hukommelse=True - den største mængde hukommelse allokeret undervejs i trinnet (tracemalloc: Python- og
+# numpy-allokeringer). Trin kan indlejres: navnet får forælderens navn som præfiks ("tidsserie/delay_function").
+#
+# tracemalloc er fælles for hele processen: den kører så længe mindst én Målelog med hukommelse er i gang.
+# Loggen eksporteres som JSON-linjer (én pr. trin) til driftsovervågning.
+# --------------------------------------------
+_aktiv = ContextVar("målelog", default=None)
+_lås = threading.Lock()
+_sporende = 0  # Målelogs med hukommelse=True der er i gang
+
+
+@dataclass
+class Trinmåling:
+    trin: str
+    niveau: int = 0
+    sekunder: float = 0.0
+    rækker: int | None = None
+    hukommelse_MB: float | None = None
+    fejl: str | None = None
+
+
+class _Ingen:
+    # Gives til with-blokken når der ikke måles - tildelinger ignoreres
+    __slots__ = ()
+
+    def __setattr__(self, navn, værdi):
+        pass
+
+
+_INGEN = _Ingen()
+
+
+@dataclass
+class Målelog:
+    kørsel: int = 0
+    hukommelse: bool = True
+    tidspunkt: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat(timespec="milliseconds"))
+    målinger: list = field(default_factory=list)  # Trinmåling i startrækkefølge
+    sekunder: float | None = None  # hele kørslen (sættes af afslut)
+    _start: float = field(default_factory=time.perf_counter, repr=False)
+    _stak: list = field(default_factory=list, repr=False)  # [måling, hukommelse ved start, højeste hukommelse]
+    _sporer: bool = field(default=False, repr=False)
+
+    def start(self):
+        global _sporende
+        if self.hukommelse and not self._sporer:
+            with _lås:
+                if _sporende == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                _sporende += 1
+            self._sporer = True
+        return self
+
+    def afslut(self):
+        # Kan kaldes flere gange (f.eks. igen ved næste rerun hvis scriptet blev stoppet undervejs)
+        global _sporende
+        if self.sekunder is None:
+            self.sekunder = time.perf_counter() - self._start
+        if self._sporer:
+            with _lås:
+                _sporende -= 1
+                if _sporende == 0 and tracemalloc.is_tracing():
+                    tracemalloc.stop()
+            self._sporer = False
+        return self
+
+    def som_dataframe(self):
+        df = pd.DataFrame([asdict(m) for m in self.målinger], columns=list(Trinmåling.__dataclass_fields__))
+        return df.astype({"rækker": "Int64"})
+
+    def poster(self):
+        # Én post pr. trin med kørslens id og tidspunkt - klar til json.dumps
+        fælles = {"kørsel": self.kørsel, "tidspunkt": self.tidspunkt}
+        poster = [{**fælles, **asdict(m)} for m in self.målinger]
+        if self.sekunder is not None:
+            poster.append({**fælles, **asdict(Trinmåling("kørsel i alt", sekunder=self.sekunder))})
+        return poster
+
+    def json_linjer(self):
+        return "".join(json.dumps(post, ensure_ascii=False) + "\n" for post in self.poster())
+
+    def gem(self, sti):
+        # Tilføj kørslen til en JSON-linjer-fil
+        with _lås, open(sti, "a", encoding="utf-8") as f:
+            f.write(self.json_linjer())
+
+
+def sæt_målelog(log):
+    # Aktivér loggen for den aktuelle tråd/kontekst (None slår målingen fra)
+    _aktiv.set(log.start() if log is not None else None)
+    return log
+
+
+def målelog():
+    return _aktiv.get()
+
+
+@contextmanager
+def trin(navn):
+    log = _aktiv.get()
+    if log is None:
+        yield _INGEN
+        return
+
+    forælder = log._stak[-1] if log._stak else None
+    måling = Trinmåling(f"{forælder[0].trin}/{navn}" if forælder else navn, niveau=len(log._stak))
+    log.målinger.append(måling)
+    hukommelse = log._sporer and tracemalloc.is_tracing()
+    ramme = [måling, 0, 0]
+    if hukommelse:
+        nu, top = tracemalloc.get_traced_memory()
+        if forælder:
+            forælder[2] = max(forælder[2], top)
+        tracemalloc.reset_peak()
+        ramme[1] = ramme[2] = nu
+    log._stak.append(ramme)
+
+    t0 = time.perf_counter()
+    try:
+        yield måling
+    except BaseException as fejl:
+        måling.fejl = type(fejl).__name__
+        raise
+    finally:
+        måling.sekunder = time.perf_counter() - t0
+        log._stak.pop()
+        if hukommelse and tracemalloc.is_tracing():
+            top = max(ramme[2], tracemalloc.get_traced_memory()[1])
+            måling.hukommelse_MB = (top - ramme[1]) / 1e6
+            if log._stak:
+                log._stak[-1][2] = max(log._stak[-1][2], top)
+            tracemalloc.reset_peak()
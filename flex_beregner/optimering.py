@@ -0,0 +1,219 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field
+
+from .aktivering import INDTJENING, OMKOSTNINGER, AKTIVERET_MW
+from .beregning import aktiveringspriser, budmatrix, lav_justering, prisnavn, strømpriser, strømpris_pr_sekund
+from .justering import priskolonne
+
+# --------------------------------------------
+# Budoptimering: hele gitteret marginalpris x rådighedsbud x aktiveringsbud i ét gennemløb
+#
+# For en given marginalpris D er et sekund aktiveret når  aktiveringsbud < tærskel  (og en basisbetingelse):
+#   opregulering:  tærskel = op + strøm - D    (basis: strøm < D)     uden marginalpris: tærskel = op
+#   nedregulering: tærskel = D - strøm - ned   (basis: strøm > D)     uden marginalpris: tærskel = -ned
+# Med aktiveringsbuddene sorteret er sekundet derfor aktivt for de første g = antal(bud < tærskel) niveauer,
+# og aktiveringsforløbene for alle niveauer er indlejrede i hinanden. Pr. marginalpris regnes:
+#   - fuld aktivering pr. (rådighedstime, niveau) med én bincount over g
+#   - tabet fra delay/ramp-up i starten af hvert forløb: kun sekunder hvor g stiger kan starte et forløb,
+#     og et løbende minimum af g over de første delay + ramp-up sekunder giver hvilke niveauer positionen
+#     gælder for
+# Rådighedsbuddet virker kun pr. time (pris >= bud), så når timerne er sorteret efter rådighedspris er
+# alle rådighedsbud blot opslag i en kumulativ sum.
+#
+# Rådighedsbuddet som accepttærskel findes kun her: beregn_filtreret (og dermed "Lav Beregning") byder
+# i alle timer med en rådighedspris uanset Rådighedsbetaling. Med rådighedsbud 0 giver sweepet derfor
+# præcis beregn_filtreret; med et højere bud svarer det til beregn_filtreret på rådighedspriser hvor
+# timerne under buddet er fjernet.
+# --------------------------------------------
+MAKS_VINDUE_ELEMENTER = 4_000_000  # elementer pr. blok ved det løbende minimum
+
+
+@dataclass
+class Budsweep:
+    marginalpriser: np.ndarray      # (D,)  NaN = ingen marginalpris
+    rådighedsbud: np.ndarray        # (R,)  DKK/MW/h
+    aktiveringsbud: np.ndarray      # (A,)  DKK/MWh
+    rådighedsindtjening: np.ndarray     # (D, R, A) DKK
+    aktiveringsindtjening: np.ndarray   # (D, R, A) DKK
+    aktiveringsomkostninger: np.ndarray # (D, R, A) DKK
+    aktiveret_MWh: np.ndarray           # (D, R, A)
+    delay: int = 0
+    ramp_up: int = 0
+    antal_dage: int = field(default=0)
+
+    @property
+    def samlet(self):
+        # Nettoindtjening: rådighed + aktivering - meromkostninger ved at afvige fra driftsplanen
+        return self.rådighedsindtjening + self.aktiveringsindtjening - self.aktiveringsomkostninger
+
+    def optimum(self):
+        # Det bedste punkt i gitteret som dict
+        i, j, k = np.unravel_index(np.nanargmax(self.samlet), self.samlet.shape)
+        return {
+            "marginalpris": float(self.marginalpriser[i]),
+            "Rådighedsbetaling": float(self.rådighedsbud[j]),
+            "Aktiveringsbetaling": float(self.aktiveringsbud[k]),
+            "samlet": float(self.samlet[i, j, k]),
+            "rådighedsindtjening": float(self.rådighedsindtjening[i, j, k]),
+            "aktiveringsindtjening": float(self.aktiveringsindtjening[i, j, k]),
+            "aktiveringsomkostninger": float(self.aktiveringsomkostninger[i, j, k]),
+            "aktiveret_MWh": float(self.aktiveret_MWh[i, j, k]),
+        }
+
+    def som_dataframe(self):
+        # Lang tabel med én række pr. gitterpunkt
+        d, r, a = np.meshgrid(self.marginalpriser, self.rådighedsbud, self.aktiveringsbud, indexing="ij")
+        return pd.DataFrame({
+            "marginalpris": d.ravel(),
+            "Rådighedsbetaling": r.ravel(),
+            "Aktiveringsbetaling": a.ravel(),
+            "rådighedsindtjening": self.rådighedsindtjening.ravel(),
+            "aktiveringsindtjening": self.aktiveringsindtjening.ravel(),
+            "aktiveringsomkostninger": self.aktiveringsomkostninger.ravel(),
+            "aktiveret_MWh": self.aktiveret_MWh.ravel(),
+            "samlet": self.samlet.ravel(),
+        })
+
+
+def _aktiveringsgrad(k, delay_tid, rampup_tid):
+    if rampup_tid <= 0:
+        return (k > delay_tid).astype(np.float64)
+    return np.clip((k - delay_tid) / rampup_tid, 0, 1)
+
+
+def _tærskel(retning, strøm, op, ned, marginalpris):
+    # (basis, tærskel, værdi, forskel) - sekundet aktiveres når basis og aktiveringsbud < tærskel
+    prisnavn(retning)
+    if marginalpris is None or np.isnan(marginalpris):
+        basis = np.ones(len(strøm), dtype=bool)
+        forskel = np.zeros_like(strøm)
+        if retning == "aFRR-opregulering":
+            return basis, op, op, forskel
+        return basis, -ned, -ned, forskel
+
+    if retning == "aFRR-opregulering":
+        return strøm < marginalpris, op + strøm - marginalpris, op, np.abs(marginalpris - strøm)
+    return strøm > marginalpris, marginalpris - strøm - ned, -ned, np.abs(strøm - marginalpris)
+
+
+def _niveauer_pr_time(g, time_nr, w, antal_timer, antal_niveauer, delay_tid, rampup_tid):
+    # (3, timer, niveauer): aktiveringssummer [DKK, DKK, MWh] pr. rådighedstime for hvert aktiveringsbud-niveau
+    bredde = antal_niveauer + 1
+    gyldig = (g > 0) & (time_nr >= 0)
+    celle = time_nr[gyldig] * bredde
+    ud = np.empty((3, antal_timer, antal_niveauer), dtype=np.float64)
+
+    diff = np.zeros((3, antal_timer * bredde), dtype=np.float64)
+    for q in range(3):
+        # Fuld aktivering: +w fra niveau 0, -w fra niveau g
+        diff[q] += np.bincount(celle, weights=w[q, gyldig], minlength=antal_timer * bredde)
+        diff[q] -= np.bincount(celle + g[gyldig], weights=w[q, gyldig], minlength=antal_timer * bredde)
+
+    m = delay_tid + max(rampup_tid - 1, 0)  # positioner i et forløb med aktivering < 1
+    if m > 0:
+        forrige = np.concatenate([[0], g[:-1]])
+        kanter = np.flatnonzero(g > forrige)
+        k = np.arange(1, m + 1)
+        tab = 1 - _aktiveringsgrad(k, delay_tid, rampup_tid)
+        n = len(g)
+        blok = max(1, MAKS_VINDUE_ELEMENTER // m)
+        for b0 in range(0, len(kanter), blok):
+            s = kanter[b0:b0 + blok]
+            u = s[:, None] + k[None, :] - 1
+            inde = u < n
+            u = np.minimum(u, n - 1)
+            høj = np.minimum.accumulate(np.where(inde, g[u], 0), axis=1)  # niveauer hvor positionen er k
+            lav = np.broadcast_to(forrige[s][:, None], høj.shape)
+            t = time_nr[u]
+            brug = (høj > lav) & (t >= 0)
+            if not brug.any():
+                continue
+            t, lav, høj, u = t[brug], lav[brug], høj[brug], u[brug]
+            faktor = np.broadcast_to(tab, brug.shape)[brug]
+            for q in range(3):
+                v = w[q, u] * faktor
+                diff[q] -= np.bincount(t * bredde + lav, weights=v, minlength=antal_timer * bredde)
+                diff[q] += np.bincount(t * bredde + høj, weights=v, minlength=antal_timer * bredde)
+
+    for q in range(3):
+        ud[q] = np.cumsum(diff[q].reshape(antal_timer, bredde), axis=1)[:, :antal_niveauer]
+    return ud / 3600
+
+
+def sweep_bud(scenarie, df_filtered, df_spot, df_kapacitet, marginalpriser, rådighedsbud, aktiveringsbud, justering=None):
+    """Indtjening for alle kombinationer af marginalpris, rådighedsbud og aktiveringsbud.
+
+    Øvrige input (område, periode, retning, budprofil, tariffer, delay og ramp-up) tages fra scenarie.
+    Et rådighedsbud accepteres kun i timer hvor rådighedsprisen mindst er buddet - i de øvrige timer
+    bydes hverken rådighed eller aktivering. Ved rådighedsbud 0 er tallene de samme som beregn_filtreret.
+    """
+    marginalpriser = np.asarray(marginalpriser, dtype=np.float64)
+    rådighedsbud = np.sort(np.asarray(rådighedsbud, dtype=np.float64))
+    aktiveringsbud = np.sort(np.asarray(aktiveringsbud, dtype=np.float64))
+
+    if justering is None:
+        justering = lav_justering(df_filtered, df_spot, df_kapacitet)
+    df_spot = strømpriser(df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+
+    # Pr. rådighedstime: pris, bud [MW] og strømpris
+    tider = pd.DatetimeIndex(df_kapacitet["TimeDK"])
+    pris_time = df_kapacitet[prisnavn(scenarie.reguleringsretning)].to_numpy(dtype=np.float64)
+    bud_time = budmatrix(scenarie.budprofil)[tider.weekday.to_numpy(), tider.hour.to_numpy()] / 1000
+    strøm_time = justering.spot_pr_kapacitet(df_spot["Strømpris (DKK)"])
+    antal_timer = len(pris_time)
+    antal_dage = int(pd.Series(tider.date).nunique())
+
+    # Timerne sorteret efter rådighedspris (faldende) - antal timer med pris >= bud for hvert rådighedsbud
+    sorteret_pris = np.where(np.isnan(pris_time), -np.inf, pris_time)
+    orden = np.argsort(-sorteret_pris, kind="stable")
+    antal_med = np.searchsorted(-sorteret_pris[orden], -rådighedsbud, side="right")
+
+    # Pr. sekund
+    sekunder, op, ned = aktiveringspriser(df_filtered)
+    strøm = strømpris_pr_sekund(sekunder, df_spot[priskolonne(df_spot)], justering.spot_pr_sekund, scenarie.kundetype,
+                                scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+    time_nr = justering.kapacitet_pr_sekund
+    bud_sekund = np.where(time_nr >= 0, np.nan_to_num(bud_time)[np.maximum(time_nr, 0)], 0.0)
+
+    form = (len(marginalpriser), len(rådighedsbud), len(aktiveringsbud))
+    rådighed = np.empty(form)
+    aktivering = np.empty((3,) + form)
+
+    for i, D in enumerate(marginalpriser):
+        basis, tærskel, værdi, forskel = _tærskel(scenarie.reguleringsretning, strøm, op, ned, D)
+        g = np.searchsorted(aktiveringsbud, tærskel, side="left")
+        g[~basis | np.isnan(tærskel)] = 0
+
+        w = np.empty((3, len(strøm)))
+        w[INDTJENING] = bud_sekund * np.nan_to_num(værdi)
+        w[OMKOSTNINGER] = bud_sekund * np.nan_to_num(forskel)
+        w[AKTIVERET_MW] = bud_sekund
+
+        pr_time = _niveauer_pr_time(g, time_nr, w, antal_timer, len(aktiveringsbud), scenarie.delay, scenarie.ramp_up)
+
+        # Timer der ikke opfylder marginalprisbetingelsen bydes slet ikke
+        if np.isnan(D):
+            time_ok = np.ones(antal_timer, dtype=bool)
+        elif scenarie.reguleringsretning == "aFRR-opregulering":
+            time_ok = strøm_time < D
+        else:
+            time_ok = strøm_time > D
+
+        rådighed_time = np.where(time_ok, np.nan_to_num(pris_time * bud_time), 0.0)
+        kum = np.concatenate([[0.0], np.cumsum(rådighed_time[orden])])
+        rådighed[i] = kum[antal_med][:, None]
+
+        pr_time = np.where(time_ok[None, :, None], pr_time, 0.0)[:, orden]
+        kum = np.concatenate([np.zeros((3, 1, len(aktiveringsbud))), np.cumsum(pr_time, axis=1)], axis=1)
+        aktivering[:, i] = kum[:, antal_med]
+
+    return Budsweep(
+        marginalpriser=marginalpriser, rådighedsbud=rådighedsbud, aktiveringsbud=aktiveringsbud,
+        rådighedsindtjening=rådighed,
+        aktiveringsindtjening=aktivering[INDTJENING],
+        aktiveringsomkostninger=aktivering[OMKOSTNINGER],
+        aktiveret_MWh=aktivering[AKTIVERET_MW],
+        delay=scenarie.delay, ramp_up=scenarie.ramp_up, antal_dage=antal_dage,
+    )
@@ -0,0 +1,175 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass, field
+
+from .aktivering import INDTJENING, OMKOSTNINGER, AKTIVERET_MW, aktiv_serie
+from .beregning import (budmatrix, prisnavn, lav_justering, aktiveringsgrundlag, aktiveringsgrad, aktiveringspriser,
+                        strømpriser, strømpris_pr_sekund)
+from .justering import priskolonne
+
+# --------------------------------------------
+# Porteføljeberegning: mange aktiver mod samme pristidslinje
+#
+# Hvert aktiv er et Scenarie med egen budprofil, marginalpris, rådigheds-/aktiveringsbud, delay og ramp-up.
+# Område, periode, retning og tariffer er fælles. Aktiver med samme marginalpris og aktiveringsbud har
+# samme aktiveringsmaske, så de deler ét gennemløb af sekunderne:
+#   - pr. rådighedstime summeres pris, meromkostning og 1 [MW] over de aktive sekunder (fuld aktivering)
+#   - for hvert (delay, ramp-up) i gruppen trækkes tabet i forløbenes første sekunder fra
+#   - hvert aktivs total er så prikproduktet mellem dets bud pr. time og enhedssummerne
+# Sekunderne behandles i blokke (forløbstælleren føres videre mellem blokkene), så hukommelsen er
+# begrænset af blokstørrelsen og ikke af antal aktiver x antal sekunder.
+# --------------------------------------------
+BLOK_SEKUNDER = 7 * 86400
+BLOK_TIMER = 31 * 24
+
+FÆLLES_FELTER = ("Synkronområde", "start_date", "end_date", "reguleringsretning",
+                 "kundetype", "lavlast", "højlast", "spidslast", "eltarif")
+
+
+@dataclass
+class Porteføljeresultat:
+    aktiver: pd.DataFrame  # én række pr. aktiv
+    antal_dage: int = field(default=0)
+    # Med pr_time=True: tallene fordelt på rådighedstimerne (TimeDK)
+    tider: pd.DatetimeIndex | None = field(default=None, repr=False)
+    rådighed_pr_time: np.ndarray | None = field(default=None, repr=False)    # (N, timer)
+    aktivering_pr_time: np.ndarray | None = field(default=None, repr=False)  # (3, N, timer): indtjening, omkostninger, MWh
+
+    def total(self):
+        # Porteføljens samlede tal
+        summer = self.aktiver.drop(columns=["navn"]).sum()
+        return {navn: float(værdi) for navn, værdi in summer.items()}
+
+    @property
+    def årlig_rådighedsindtjening(self):
+        return (self.aktiver["rådighedsindtjening"].sum()*365)/self.antal_dage
+
+    @property
+    def årlig_aktiveringsindtjening(self):
+        return (self.aktiver["aktiveringsindtjening"].sum()*365)/self.antal_dage
+
+
+def _tjek_fælles(scenarier):
+    første = scenarier[0]
+    for scenarie in scenarier[1:]:
+        for felt in FÆLLES_FELTER:
+            if getattr(scenarie, felt) != getattr(første, felt):
+                raise ValueError(f"Alle aktiver i en portefølje skal have samme {felt}")
+    return første
+
+
+def _gruppenøgle(scenarie):
+    return (scenarie.marginalpris if scenarie.har_marginalpris else None, scenarie.Aktiveringsbetaling)
+
+
+def beregn_portefølje(scenarier, df_filtered, df_spot, df_kapacitet, navne=None, justering=None, blok_sekunder=BLOK_SEKUNDER,
+                      pr_time=False):
+    """Rådigheds- og aktiveringstal pr. aktiv og samlet for en liste af scenarier (ét pr. aktiv).
+
+    Tallene pr. aktiv er de samme som beregn_filtreret giver for det enkelte scenarie.
+    Med pr_time=True gemmes tallene også pr. aktiv og rådighedstime (N x timer - kun til få aktiver).
+    """
+    scenarier = list(scenarier)
+    fælles = _tjek_fælles(scenarier)
+    navne = list(navne) if navne is not None else [f"Aktiv {i + 1}" for i in range(len(scenarier))]
+
+    if justering is None:
+        justering = lav_justering(df_filtered, df_spot, df_kapacitet)
+    df_spot = strømpriser(df_spot, fælles.kundetype, fælles.lavlast, fælles.højlast, fælles.spidslast, fælles.eltarif)
+
+    # Pr. rådighedstime
+    tider = pd.DatetimeIndex(df_kapacitet["TimeDK"])
+    ugedag, time = tider.weekday.to_numpy(), tider.hour.to_numpy()
+    pris_time = df_kapacitet[prisnavn(fælles.reguleringsretning)].to_numpy(dtype=np.float64)
+    strøm_time = justering.spot_pr_kapacitet(df_spot["Strømpris (DKK)"])
+    antal_timer = len(pris_time)
+
+    # Pr. aktiv
+    profiler = np.stack([budmatrix(s.budprofil) for s in scenarier]) / 1000  # (N, 7, 24) MW
+    marginalpris = np.array([s.marginalpris if s.har_marginalpris else np.nan for s in scenarier], dtype=np.float64)
+    op = fælles.reguleringsretning == "aFRR-opregulering"
+
+    def bud_pr_time(aktiver, lo, hi):
+        # (aktiver, timer lo:hi) bud i MW - 0 i timer hvor aktivet ikke byder rådighed
+        bud = profiler[aktiver][:, ugedag[lo:hi], time[lo:hi]]
+        ok = np.broadcast_to(~np.isnan(pris_time[None, lo:hi]), (len(aktiver), hi - lo)).copy()
+        mp = marginalpris[aktiver, None]
+        strøm = strøm_time[None, lo:hi]
+        ok &= np.isnan(mp) | ((strøm < mp) if op else (strøm > mp))
+        return np.where(ok, bud, 0.0), ok
+
+    n = len(scenarier)
+    rådighed = np.zeros(n)
+    timer_budt = np.zeros(n, dtype=np.int64)
+    rådighed_time = np.zeros((n, antal_timer)) if pr_time else None
+    aktivering_time = np.zeros((3, n, antal_timer)) if pr_time else None
+    for lo in range(0, antal_timer, BLOK_TIMER):
+        hi = min(lo + BLOK_TIMER, antal_timer)
+        bud, ok = bud_pr_time(np.arange(n), lo, hi)
+        rådighed += bud @ np.nan_to_num(pris_time[lo:hi])
+        timer_budt += ok.sum(axis=1)
+        if pr_time:
+            rådighed_time[:, lo:hi] = bud * np.nan_to_num(pris_time[lo:hi])
+
+    # Aktivering - én gruppe pr. (marginalpris, aktiveringsbud), på arrays pr. sekund (24 bytes pr. sekund)
+    sekunder, op_s, ned_s = aktiveringspriser(df_filtered)
+    strøm_s = strømpris_pr_sekund(sekunder, df_spot[priskolonne(df_spot)], justering.spot_pr_sekund, fælles.kundetype,
+                                  fælles.lavlast, fælles.højlast, fælles.spidslast, fælles.eltarif)
+    time_nr = justering.kapacitet_pr_sekund
+    antal_sekunder = len(strøm_s)
+
+    grupper = {}
+    for i, scenarie in enumerate(scenarier):
+        grupper.setdefault(_gruppenøgle(scenarie), {}).setdefault((scenarie.delay, scenarie.ramp_up), []).append(i)
+
+    aktivering = np.zeros((3, n))
+    antal_aktiveringer = np.zeros(n, dtype=np.int64)
+    for (mp, aktiveringsbud), pr_forsinkelse in grupper.items():
+        medlemmer = [i for aktiver in pr_forsinkelse.values() for i in aktiver]
+        m_maks = max(d + max(r - 1, 0) for d, r in pr_forsinkelse)
+        fortsat = 0  # længden af et forløb der fortsætter fra forrige blok
+
+        for s0 in range(0, antal_sekunder, blok_sekunder):
+            sl = slice(s0, min(s0 + blok_sekunder, antal_sekunder))
+            mask, værdi, forskel = aktiveringsgrundlag(fælles.reguleringsretning, strøm_s[sl], op_s[sl], ned_s[sl],
+                                                       np.nan if mp is None else mp, aktiveringsbud)
+            antal_aktiveringer[medlemmer] += int(mask.sum())
+
+            k = aktiv_serie(mask)
+            if fortsat and len(mask) and mask[0]:
+                første_slut = np.argmin(mask) if not mask.all() else len(mask)
+                k[:første_slut] += fortsat
+            fortsat = int(k[-1]) if len(k) and mask[-1] else 0
+
+            t = time_nr[sl]
+            aktiv = mask & (t >= 0)
+            if not aktiv.any():
+                continue
+            lo, hi = int(t[aktiv].min()), int(t[aktiv].max()) + 1
+            celle = t[aktiv] - lo
+            w = np.stack([np.nan_to_num(værdi[aktiv]), np.nan_to_num(forskel[aktiv]), np.ones(int(aktiv.sum()))])
+            fuld = np.stack([np.bincount(celle, weights=w[q], minlength=hi - lo) for q in range(3)])
+
+            kort = k[aktiv] <= m_maks  # kun de første sekunder i et forløb kan have aktivering < 1
+            k_kort, celle_kort, w_kort = k[aktiv][kort], celle[kort], w[:, kort]
+
+            for (delay_tid, rampup_tid), aktiver in pr_forsinkelse.items():
+                tab = 1 - aktiveringsgrad(k_kort, delay_tid, rampup_tid)
+                enhed = fuld - np.stack([np.bincount(celle_kort, weights=w_kort[q] * tab, minlength=hi - lo) for q in range(3)])
+                bud, _ = bud_pr_time(aktiver, lo, hi)
+                aktivering[:, aktiver] += (bud @ enhed.T).T / 3600
+                if pr_time:
+                    aktivering_time[:, aktiver, lo:hi] += bud[None] * enhed[:, None, :] / 3600
+
+    df = pd.DataFrame({
+        "navn": navne,
+        "rådighedsindtjening": rådighed,
+        "timer_budt": timer_budt,
+        "aktiveringsindtjening": aktivering[INDTJENING],
+        "aktiveringsomkostninger": aktivering[OMKOSTNINGER],
+        "aktiveret_MWh": aktivering[AKTIVERET_MW],
+        "antal_aktiveringer": antal_aktiveringer,
+    })
+    return Porteføljeresultat(aktiver=df, antal_dage=int(pd.Series(tider.date).nunique()), tider=tider if pr_time else None,
+                              rådighed_pr_time=rådighed_time, aktivering_pr_time=aktivering_time)
@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+
+import pandas as pd
+
+from datetime import date, datetime, timedelta
+
+from .api import DATASÆT, hent_records, hent_prisdata, klargør_records, saml_spotpriser, spotdatasæt, tom_ramme
+from .data import TIDSZONE
+
+# --------------------------------------------
+# Lokalt cache af svar fra Energi Data Service
+#
+#   <rod>/<datasæt>/<område>.parquet        alle hentede timer (én række pr. time)
+#   <rod>/<datasæt>/<område>.dækning.json   hvilke danske kalenderdage der er hentet
+#
+# Kun de dage i en forespørgsel der ikke allerede er dækket hentes fra API'et. Dage fra i dag
+# og frem registreres aldrig som dækket (priserne kan blive opdateret), så de hentes igen - og
+# det samme gælder dage hvor API'et ikke har leveret nogen records endnu (sent publicerede priser).
+# --------------------------------------------
+
+
+def _dage(start_date, end_date):
+    return [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+
+
+def _som_intervaller(dage):
+    # Sorterede dage -> liste af sammenhængende (fra, til) intervaller (begge inklusiv)
+    intervaller = []
+    for dag in dage:
+        if intervaller and dag == intervaller[-1][1] + timedelta(days=1):
+            intervaller[-1][1] = dag
+        else:
+            intervaller.append([dag, dag])
+    return [tuple(i) for i in intervaller]
+
+
+class Prislager:
+
+    def __init__(self, rod, hent=hent_records):
+        self.rod = rod
+        self.hent = hent  # (dataset, område, start_date, end_date) -> DataFrame med rå records
+        self._lås = threading.Lock()
+        self._låse = {}  # (datasæt, område) -> lås, så forskellige datasæt kan hentes samtidigt
+
+    def _lås_for(self, dataset, område):
+        with self._lås:
+            return self._låse.setdefault((dataset, område), threading.Lock())
+
+    def _sti(self, dataset, område, endelse):
+        return os.path.join(self.rod, dataset, f"{område}{endelse}")
+
+    def _læs_dækning(self, dataset, område):
+        sti = self._sti(dataset, område, ".dækning.json")
+        if not os.path.exists(sti):
+            return set()
+        with open(sti) as f:
+            intervaller = json.load(f)
+        return {dag for fra, til in intervaller for dag in _dage(date.fromisoformat(fra), date.fromisoformat(til))}
+
+    def _gem(self, dataset, område, df, dækning):
+        os.makedirs(os.path.join(self.rod, dataset), exist_ok=True)
+        # Skriv til midlertidige filer og erstat atomisk, så samtidige læsere aldrig ser en halv fil
+        sti = self._sti(dataset, område, ".parquet")
+        df.to_parquet(sti + ".tmp", index=False)
+        os.replace(sti + ".tmp", sti)
+
+        sti = self._sti(dataset, område, ".dækning.json")
+        with open(sti + ".tmp", "w") as f:
+            json.dump([[fra.isoformat(), til.isoformat()] for fra, til in _som_intervaller(sorted(dækning))], f)
+        os.replace(sti + ".tmp", sti)
+
+    def _læs(self, dataset, område):
+        sti = self._sti(dataset, område, ".parquet")
+        if not os.path.exists(sti):
+            return None
+        return pd.read_parquet(sti)
+
+    def manglende_intervaller(self, dataset, område, start_date, end_date):
+        dækning = self._læs_dækning(dataset, område)
+        return _som_intervaller([dag for dag in _dage(start_date, end_date) if dag not in dækning])
+
+    def hent_data(self, dataset, område, start_date, end_date):
+        # Samme format som get_spotdata/Rådighedspriser: stigende tid, tidszone-bevidste tidskolonner
+        utc, dk = DATASÆT[dataset]
+
+        with self._lås_for(dataset, område):
+            huller = self.manglende_intervaller(dataset, område, start_date, end_date)
+            df = self._læs(dataset, område)
+
+            if huller:
+                nye = [self.hent(dataset, område, fra, til) for fra, til in huller]
+                nye = [klargør_records(dataset, n) for n in nye if len(n)]
+                hentede_dage = set(pd.concat([n[dk] for n in nye]).dt.tz_convert(TIDSZONE).dt.date) if nye else set()
+                if nye:
+                    df = pd.concat(([df] if df is not None else []) + nye, ignore_index=True)
+                    # Én række pr. time - nyeste hentning vinder
+                    df = df.drop_duplicates(subset=utc, keep="last").sort_values(utc).reset_index(drop=True)
+
+                i_dag = datetime.now(TIDSZONE).date()
+                dækning = self._læs_dækning(dataset, område)
+                dækning |= {dag for fra, til in huller for dag in _dage(fra, til) if dag < i_dag and dag in hentede_dage}
+                if df is not None:
+                    self._gem(dataset, område, df, dækning)
+
+        if df is None:
+            return tom_ramme(dataset)
+
+        datoer = df[dk].dt.tz_convert(TIDSZONE).dt.date
+        return df[(datoer >= start_date) & (datoer <= end_date)].reset_index(drop=True)
+
+    def get_spotdata(self, Synkronområde, start_date, end_date):
+        return saml_spotpriser([self.hent_data(dataset, Synkronområde, fra, til) for dataset, fra, til in spotdatasæt(start_date, end_date)])
+
+    def Rådighedspriser(self, Synkronområde, start_date, end_date):
+        return self.hent_data("AfrrReservesNordic", Synkronområde, start_date, end_date)
+
+    def hent_prisdata(self, Synkronområde, start_date, end_date):
+        # (df_spot, df_kapacitet) - de to datasæt hentes samtidigt
+        return hent_prisdata(Synkronområde, start_date, end_date, get_spotdata=self.get_spotdata, Rådighedspriser=self.Rådighedspriser)
@@ -0,0 +1,257 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from .aktivering import INDTJENING, OMKOSTNINGER, AKTIVERET_MW, Positionssummer
+from .beregning import Resultat, aktiveringsgrad, beregn_rådighed, med_tidsserie, prisnavn, rådighedsbud, strømpriser
+from .data import EUR_DKK, TIDSZONE
+from .justering import Prisakse, tidskolonne
+from .lager import utc_grænser
+from .måling import trin
+
+# --------------------------------------------
+# Valgfri DuckDB-motor (pip install duckdb)
+#
+# Hele kæden filter -> strømpris (spot + tarif + eltarif) -> rådighedsbud -> aktiveringsmaske ->
+# forløbsposition -> summer køres som én SQL-plan direkte over det partitionerede parquet-lager.
+# DuckDB streamer filerne (kun de relevante måneds-partitioner og rækkegrupper) og kører planen
+# parallelt på alle kerner. Timepriserne (få tusinde rækker) klargøres i pandas og joines på med
+# ASOF JOIN. Kun summerne pr. position i forløbene - og evt. tidsserien pr. sekund - kommer tilbage.
+#
+# Forløbene nummereres pr. UTC-døgn (vinduesfunktioner med PARTITION BY dag, så døgnene sorteres og
+# tælles parallelt). Et forløb der går over midnat føres videre via en lille tabel med én række pr. døgn:
+# længden af det forløb døgnet slutter med lægges til positionerne i næste døgns første forløb.
+# Parquet-filerne læses én gang: for korte perioder hentes tidsserien pr. sekund, og summerne regnes
+# på den i hukommelsen. Scenariets tal indsættes som bundne parametre, ikke som SQL-tekst.
+#
+# Resultatet er det samme som beregn_filtreret (priserne rundes til float32 EUR som i tidsindekset).
+# Summerne pr. position (Positionssummer) giver nye totaler for andre delay/ramp-up uden ny forespørgsel,
+# så længe delay + ramp-up ligger inden for MAKS_POSITION sekunder.
+# --------------------------------------------
+MAKS_POSITION = 3600
+
+
+def duckdb_tilgængelig():
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _duckdb():
+    try:
+        import duckdb
+    except ImportError as fejl:
+        raise ImportError("DuckDB-motoren kræver duckdb (pip install duckdb)") from fejl
+    return duckdb
+
+
+def _intervaller(tid_utc, værdier):
+    # Arrow-tabel (start, slut, værdi) sorteret på start - ved dubletter gælder den sidste række som i Prisakse.indeks.
+    # NaN bliver til NULL, da DuckDB ordner NaN over alle tal
+    akse = Prisakse(tid_utc)
+    værdier = np.asarray(værdier, dtype=np.float64)[akse.rækkefølge]
+    sidste = np.ones(len(akse), dtype=bool)
+    sidste[:-1] = akse.start[1:] != akse.start[:-1]
+    return pa.table({
+        "start": akse.start[sidste],
+        "slut": (akse.start + akse.varighed)[sidste],
+        "værdi": pa.array(værdier[sidste], from_pandas=True),  # NaN -> NULL
+    })
+
+
+def _betingelse(scenarie):
+    # (aktiv, værdi, forskel) som SQL-udtryk med parametrene $mp og $ab - samme regler som aktiveringsgrundlag
+    op = scenarie.reguleringsretning == "aFRR-opregulering"
+    if not scenarie.har_marginalpris:
+        parametre = {"ab": float(scenarie.Aktiveringsbetaling)}
+        if op:
+            return "$ab < op", "op", "0.0", parametre
+        return "-$ab > ned", "-ned", "0.0", parametre
+    parametre = {"mp": float(scenarie.marginalpris), "ab": float(scenarie.Aktiveringsbetaling)}
+    if op:
+        return "($mp + $ab - strøm < op) AND (strøm < $mp)", "op", "abs($mp - strøm)", parametre
+    return "($mp - $ab - strøm > ned) AND (strøm > $mp)", "-ned", "abs(strøm - $mp)", parametre
+
+
+def _ren(kolonne):
+    # NaN -> NULL (DuckDB ordner NaN over alle tal), og float32-afrunding som i det kompakte tidsindeks
+    return f"CASE WHEN isnan({kolonne}) THEN NULL ELSE CAST(CAST({kolonne} AS FLOAT) AS DOUBLE) * {EUR_DKK!r} END"
+
+
+def _plan(rod, scenarie, K, tidsserie=False):
+    # (SQL, parametre) for CTE'erne frem til "overført" - forespørgslen afsluttes med en SELECT.
+    # tidsserie=True: dagserie bruges både af summerne og af tidsserien og gemmes, så parquet kun læses én gang
+    filer = os.path.join(rod, f"PriceArea={scenarie.Synkronområde}", "*", "*.parquet").replace("'", "''")
+    t0, t1 = utc_grænser(scenarie.start_date, scenarie.end_date)
+    aktiv, værdi, forskel, parametre = _betingelse(scenarie)
+    parametre.update(m0=t0.strftime("%Y-%m"), m1=(t1 - pd.Timedelta(microseconds=1)).strftime("%Y-%m"),
+                     t0=t0.isoformat(), t1=t1.isoformat())
+    return f"""
+    WITH sek AS (
+        SELECT CAST(epoch(ActivationTime) AS BIGINT) AS s,
+               {_ren("aFRR_UpActivatedPriceEUR")} AS op,
+               {_ren("aFRR_DownActivatedPriceEUR")} AS ned
+        FROM read_parquet('{filer}', hive_partitioning = true)
+        WHERE month BETWEEN $m0 AND $m1
+          AND ActivationTime >= CAST($t0 AS TIMESTAMPTZ) AND ActivationTime < CAST($t1 AS TIMESTAMPTZ)
+    ),
+    priser AS (
+        SELECT sek.*,
+               CASE WHEN sek.s < spot.slut THEN spot.værdi END AS strøm,
+               CASE WHEN sek.s < kap.slut THEN kap.værdi END AS bud_mw
+        FROM sek
+        ASOF LEFT JOIN spot ON sek.s >= spot.start
+        ASOF LEFT JOIN kap ON sek.s >= kap.start
+    ),
+    maske AS (
+        SELECT *, s // 86400 AS dag, COALESCE({aktiv}, false) AS aktiv, {værdi} AS værdi, {forskel} AS forskel FROM priser
+    ),
+    grupper AS (
+        -- Et nyt forløb starter efter hvert inaktivt sekund (gruppe 0: døgnets første forløb, hvis døgnet starter aktivt)
+        SELECT *, SUM(CASE WHEN aktiv THEN 0 ELSE 1 END) OVER (PARTITION BY dag ORDER BY s ROWS UNBOUNDED PRECEDING) AS gruppe
+        FROM maske
+    ),
+    serie AS (
+        SELECT *, CASE WHEN aktiv THEN ROW_NUMBER() OVER (PARTITION BY dag, gruppe ORDER BY s) - CASE WHEN gruppe > 0 THEN 1 ELSE 0 END
+                       ELSE 0 END AS k,
+               aktiv AND gruppe = 0 AS ledende
+        FROM grupper
+    ),
+    dagserie AS {"MATERIALIZED " if tidsserie else ""}(
+        -- hale: længden af det forløb døgnet slutter med (= antal rækker hvis hele døgnet er aktivt)
+        SELECT *, arg_max(k, s) OVER (PARTITION BY dag) AS hale FROM serie
+    ),
+    dele AS MATERIALIZED (
+        SELECT dag, ledende, LEAST(k, {K + 1}) AS position,
+               SUM(COALESCE(bud_mw, 0) * værdi) AS indtjening,
+               SUM(COALESCE(bud_mw, 0) * forskel) AS omkostninger,
+               SUM(COALESCE(bud_mw, 0)) AS aktiveret_mw,
+               COUNT(*) AS antal, ANY_VALUE(hale) AS hale
+        FROM dagserie GROUP BY ALL
+    ),
+    dage AS (
+        SELECT dag, SUM(antal) AS n, ANY_VALUE(hale) AS hale FROM dele GROUP BY dag
+    ),
+    blokke AS (
+        -- En blok er et døgn der ikke er aktivt hele vejen plus de helt aktive døgn efter det
+        SELECT *, SUM(CASE WHEN hale = n THEN 0 ELSE 1 END) OVER (ORDER BY dag ROWS UNBOUNDED PRECEDING) AS blok FROM dage
+    ),
+    overført AS (
+        -- Længden af det forløb der er i gang ved døgnets start
+        SELECT dag, LAG(ud, 1, 0) OVER (ORDER BY dag) AS overført
+        FROM (SELECT dag, SUM(hale) OVER (PARTITION BY blok ORDER BY dag ROWS UNBOUNDED PRECEDING) AS ud FROM blokke)
+    )
+    """, parametre
+
+
+def beregn_duckdb(scenarie, rod, df_spot, df_kapacitet, detaljer=True, tråde=None):
+    """Som beregn_filtreret, men med aktiveringsdelen kørt af DuckDB direkte på parquet-lageret i rod."""
+    duckdb = _duckdb()
+
+    # Timepriser og rådighed (få rækker) i pandas
+    df_spot = strømpriser(df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+    df_prices = beregn_rådighed(scenarie, df_kapacitet, df_spot)
+
+    K = max(MAKS_POSITION, scenarie.delay + max(scenarie.ramp_up - 1, 0))
+    con = duckdb.connect()
+    try:
+        if tråde:
+            con.execute(f"SET threads = {int(tråde)}")
+        con.register("spot", _intervaller(df_spot[tidskolonne(df_spot)], df_spot["Strømpris (DKK)"]))
+        con.register("kap", _intervaller(df_prices["TimeUTC"], rådighedsbud(df_prices) / 1000))
+        plan, parametre = _plan(rod, scenarie, K)
+        detalje = _plan(rod, scenarie, K, tidsserie=True)[0] + """
+            SELECT s, ned, op, strøm, bud_mw, bud_mw * 1000 AS bud_kw, aktiv, værdi, forskel,
+                   k + CASE WHEN ledende THEN overført ELSE 0 END AS k
+            FROM dagserie JOIN overført USING (dag) ORDER BY s
+        """
+
+        df_aktivering = None
+        if detaljer and med_tidsserie(scenarie.start_date, scenarie.end_date):
+            # Højst ét aktiveringssekund pr. sekund - tidsserien hentes, og summerne regnes på den
+            with trin("duckdb_tidsserie") as m:
+                df_aktivering = con.execute(detalje, parametre).df()
+                m.rækker = len(df_aktivering)
+            con.register("tidsserie", df_aktivering)
+            with trin("duckdb_summer") as m:
+                summer = con.execute(f"""
+                    SELECT LEAST(k, {K + 1}) AS position,
+                           SUM(COALESCE(bud_mw, 0) * værdi) AS indtjening,
+                           SUM(COALESCE(bud_mw, 0) * forskel) AS omkostninger,
+                           SUM(COALESCE(bud_mw, 0)) AS aktiveret_mw,
+                           COUNT(*) AS antal
+                    FROM tidsserie GROUP BY position ORDER BY position
+                """).fetchnumpy()
+                m.rækker = len(df_aktivering)
+        else:
+            with trin("duckdb_summer") as m:
+                summer = con.execute(plan + f"""
+                    SELECT CASE WHEN ledende THEN LEAST(position + overført, {K + 1}) ELSE position END AS position,
+                           SUM(indtjening) AS indtjening, SUM(omkostninger) AS omkostninger,
+                           SUM(aktiveret_mw) AS aktiveret_mw, SUM(antal) AS antal
+                    FROM dele JOIN overført USING (dag) GROUP BY 1 ORDER BY 1
+                """, parametre).fetchnumpy()
+                m.rækker = int(np.sum(summer["antal"]))
+    finally:
+        con.close()
+
+    # Position 0 er de inaktive sekunder - de tæller kun med i antal rækker
+    aktiv = np.asarray(summer["position"], dtype=np.int64) > 0
+    summer = {navn: np.asarray(værdier)[aktiv] for navn, værdier in summer.items()}
+    W = np.zeros((3, K + 2))
+    position = summer["position"].astype(np.int64)
+    for q, kolonne in ((INDTJENING, "indtjening"), (OMKOSTNINGER, "omkostninger"), (AKTIVERET_MW, "aktiveret_mw")):
+        W[q, position] = np.asarray(summer[kolonne], dtype=np.float64)
+    antal = np.asarray(summer["antal"], dtype=np.int64)
+    forløb = Positionssummer(W=W, antal=int(antal[position == 1].sum()))
+    indtjening, omkostninger, aktiveret_MWh = forløb.summer(scenarie.delay, scenarie.ramp_up)
+
+    mean = df_prices["indtjening"].mean()
+    resultat = Resultat(
+        rådighedsindtjening=float(df_prices["indtjening"].sum()),
+        antal_dage=int(df_prices["Dato"].nunique()),
+        timer_budt=int(df_prices["indtjening"].count()),
+        gns_rådighedsindtjening=float(mean) if pd.notna(mean) else 0.0,
+        aktiveringsindtjening=float(indtjening),
+        aktiveret_MWh=float(aktiveret_MWh),
+        aktiveringsomkostninger=float(omkostninger),
+        antal_aktiveringer=int(antal.sum()),
+        forløb=forløb,
+        delay=scenarie.delay,
+        ramp_up=scenarie.ramp_up,
+    )
+
+    if detaljer:
+        kolonner = ["TimeDK", "interval", "weekday_dk", prisnavn(scenarie.reguleringsretning), "bud_kw", "Strømpris (DKK/MWh)", "indtjening"]
+        resultat.df_rådighed = df_prices[kolonner]
+        if df_aktivering is not None:
+            resultat.df_aktivering = _tidsserie(df_aktivering, scenarie)
+    return resultat
+
+
+def _tidsserie(df, scenarie):
+    # Tidsserien pr. sekund med samme kolonnenavne som aktiveringstidsserie (de vigtigste af dem)
+    tid_utc = pd.DatetimeIndex(df["s"].to_numpy().astype("datetime64[s]")).tz_localize("UTC")
+    aFRR_navn = "aFRR_op" if scenarie.reguleringsretning == "aFRR-opregulering" else "aFRR_ned"
+    aktiv = df["aktiv"].to_numpy()
+    aktivering = aktiveringsgrad(df["k"].to_numpy(), scenarie.delay, scenarie.ramp_up)
+    bud_mw = df["bud_kw"].to_numpy(dtype=np.float64) / 1000
+    return pd.DataFrame({
+        "Tid (UTC)": tid_utc,
+        "Tid (DK)": tid_utc.tz_convert(TIDSZONE),
+        "aFRR-ned aktiveringspris (DKK)": df["ned"],
+        "aFRR-op aktiveringspris (DKK)": df["op"],
+        "Strømpris (DKK)": df["strøm"],
+        "bud_kw": df["bud_kw"],
+        aFRR_navn: np.where(aktiv, df["værdi"], np.nan),
+        "Prisforskel i absolut værdi": np.where(aktiv, df["forskel"], np.nan),
+        "aktiv serie": df["k"],
+        "aktivering": aktivering,
+        "indtjening_aktiveringer": bud_mw * np.where(aktiv, df["værdi"], np.nan) * aktivering,
+        "omkostninger_aktiveringer": bud_mw * np.where(aktiv, df["forskel"], np.nan) * aktivering,
+        "aktiveret_MW": bud_mw * aktivering,
+    })
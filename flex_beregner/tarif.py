@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+import holidays
+
+from functools import lru_cache
+
+from .data import TIDSZONE
+from .justering import tidskolonne
+
+# --------------------------------------------
+# Tarifkalender
+#
+# For hvert år og hver kundetype bygges én gang et array med tarifperioden (lavlast, højlast,
+# spidslast) for hver UTC-time i året. Dansk klokkeslæt, sommer-/vintertid og helligdage er
+# dermed afgjort på forhånd, og tariffen for et vilkårligt sæt tidspunkter (timer eller sekunder)
+# er blot ét opslag: satser[kalender[(t - årets start) // 3600]].
+# Sæson og dagtype (dagkalender) ligger i sin egen kalender, som også bootstrap stratificerer efter.
+# --------------------------------------------
+LAVLAST, HØJLAST, SPIDSLAST = 0, 1, 2
+FRIDAG, SOMMER = 1, 2  # dagtype = SOMMER * sommer + FRIDAG * (weekend eller helligdag)
+
+# Tarifperiode for hver time på døgnet (dansk tid)
+_C = np.array([LAVLAST]*6 + [HØJLAST]*11 + [SPIDSLAST]*4 + [HØJLAST]*3, dtype=np.int8)
+_VINTER_HVERDAG = np.array([LAVLAST]*6 + [SPIDSLAST]*15 + [HØJLAST]*3, dtype=np.int8)
+_HØJLAST_DAG = np.array([LAVLAST]*6 + [HØJLAST]*18, dtype=np.int8)
+_LAVLAST_DAG = np.array([LAVLAST]*24, dtype=np.int8)
+
+
+@lru_cache(maxsize=None)
+def _år_start(år):
+    # Epoch-sekunder for 1. januar 00:00 UTC
+    return int(pd.Timestamp(år, 1, 1, tz="UTC").value // 10**9)
+
+
+def _timer(år):
+    # Årets UTC-timer i dansk tid
+    return pd.date_range(pd.Timestamp(år, 1, 1, tz="UTC"), pd.Timestamp(år + 1, 1, 1, tz="UTC"),
+                         freq="h", inclusive="left").tz_convert(TIDSZONE)
+
+
+@lru_cache(maxsize=None)
+def dagkalender(år):
+    # int8 array med dagtypen (dansk dato) pr. UTC-time i året: sommer = april-september,
+    # fridag = weekend eller helligdag (skrivebeskyttet, deles af alle kald)
+    timer = _timer(år)
+    # Helligdage for begge kalenderår der kan optræde i dansk tid (nytårsnat)
+    helligdage = np.array(sorted(holidays.Denmark(years=[år, år + 1])), dtype="datetime64[D]")
+    dato = timer.tz_localize(None).to_numpy().astype("datetime64[D]")
+    fridag = (timer.weekday.to_numpy() >= 5) | np.isin(dato, helligdage)
+    sommer = (timer.month.to_numpy() >= 4) & (timer.month.to_numpy() <= 9)
+
+    kalender = (SOMMER * sommer + FRIDAG * fridag).astype(np.int8)
+    kalender.flags.writeable = False
+    return kalender
+
+
+@lru_cache(maxsize=None)
+def tarifkalender(år, kundetype):
+    # int8 array med én tarifperiode pr. UTC-time i året (skrivebeskyttet, deles af alle kald)
+    hour = _timer(år).hour.to_numpy()
+
+    if kundetype == "C":
+        kalender = _C[hour]
+    else:
+        dagtype = dagkalender(år)
+        sommer, fridag = (dagtype & SOMMER) > 0, (dagtype & FRIDAG) > 0
+        kalender = np.where(sommer & fridag, _LAVLAST_DAG[hour],
+                   np.where(~sommer & ~fridag, _VINTER_HVERDAG[hour], _HØJLAST_DAG[hour]))
+
+    kalender = kalender.astype(np.int8)
+    kalender.flags.writeable = False
+    return kalender
+
+
+def _slå_op(sekunder, kalender):
+    # kalender(år)[time] for hvert tidspunkt (int64 epoch-sekunder UTC) - virker både for timer og sekunder
+    sekunder = np.asarray(sekunder, dtype=np.int64)
+    if len(sekunder) == 0:
+        return np.empty(0, dtype=np.int8)
+    første = int(pd.Timestamp(sekunder.min(), unit="s").year)
+    sidste = int(pd.Timestamp(sekunder.max(), unit="s").year)
+    tabel = kalender(første)
+    if sidste > første:
+        tabel = np.concatenate([kalender(år) for år in range(første, sidste + 1)])
+    return tabel[(sekunder - _år_start(første)) // 3600]
+
+
+def tarifperioder(sekunder, kundetype):
+    # Tarifperiode for hvert tidspunkt
+    return _slå_op(sekunder, lambda år: tarifkalender(år, kundetype))
+
+
+def dagtyper(sekunder):
+    # Dagtype (FRIDAG/SOMMER) for hvert tidspunkt
+    return _slå_op(sekunder, dagkalender)
+
+
+def tarif_pr_tidspunkt(sekunder, kundetype, lavlast, højlast, spidslast):
+    # Tarif [DKK/MWh] for hvert tidspunkt
+    satser = np.array([lavlast, højlast, spidslast], dtype=np.float64)
+    return satser[tarifperioder(sekunder, kundetype)]
+
+
+def beregn_tarif(df, kundetype, lavlast, højlast, spidslast):
+    # Tarif pr. spotrække (kolonnen 'tarif'), slået op i tarifkalenderen - time- eller kvarterpriser
+    df = df.copy()
+    sekunder = pd.DatetimeIndex(pd.to_datetime(df[tidskolonne(df)], utc=True)).as_unit("s").asi8
+    df['tarif'] = tarif_pr_tidspunkt(sekunder, kundetype, lavlast, højlast, spidslast)
+    return df
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+
+from dataclasses import dataclass
+from datetime import timedelta
+
+from .data import EUR_DKK, TIDSZONE
+
+
+def epoch_sekunder(tid):
+    # Tidszone-bevidste tidsstempler -> int64 sekunder siden 1970-01-01 UTC
+    return pd.DatetimeIndex(tid).as_unit("s").asi8
+
+
+def dag_grænser(start_date, end_date):
+    # Epoch-sekunder for dansk midnat fra start_date til og med dagen efter end_date (DST-korrekt)
+    dage = pd.date_range(start_date, end_date + timedelta(days=1), freq="D", tz=TIDSZONE)
+    return epoch_sekunder(dage)
+
+
+@dataclass
+class Aktiveringsudsnit:
+    # Zero-copy udsnit af ét områdes kompakte arrays. DKK-priser og dansk tid regnes først når de bruges
+    Synkronområde: str
+    sekunder: np.ndarray  # int64 epoch-sekunder (UTC)
+    ned_eur: np.ndarray   # float32
+    op_eur: np.ndarray    # float32
+
+    def __len__(self):
+        return len(self.sekunder)
+
+    @property
+    def ned_dkk(self):
+        return self.ned_eur.astype(np.float64) * EUR_DKK
+
+    @property
+    def op_dkk(self):
+        return self.op_eur.astype(np.float64) * EUR_DKK
+
+    @property
+    def tid_utc(self):
+        return pd.DatetimeIndex(self.sekunder.astype("datetime64[s]")).tz_localize("UTC")
+
+    @property
+    def tid_dk(self):
+        return self.tid_utc.tz_convert(TIDSZONE)
+
+    def som_dataframe(self):
+        # Samme kolonner som load_data_parquet - bygges kun for udsnittet
+        tid_utc = self.tid_utc
+        return pd.DataFrame({
+            'Tid (UTC)': tid_utc,
+            'Synkronområde': pd.Categorical.from_codes(np.zeros(len(self), dtype=np.int8), categories=[self.Synkronområde]),
+            'aFRR-ned aktiveringspris (EUR)': self.ned_eur,
+            'aFRR-op aktiveringspris (EUR)': self.op_eur,
+            'aFRR-ned aktiveringspris (DKK)': self.ned_dkk,
+            'aFRR-op aktiveringspris (DKK)': self.op_dkk,
+            'Tid (DK)': tid_utc.tz_convert(TIDSZONE),
+        })
+
+
+# --------------------------------------------
+# Sorteret, kompakt tidsindeks pr. synkronområde
+#
+# Pr. område gemmes kun tre arrays sorteret på tid:
+#   sekunder  int64    epoch-sekunder (UTC)
+#   ned/op    float32  aktiveringspriser i EUR (DKK = EUR * 7,45 regnes først ved brug)
+# Området er selve nøglen, så der er ingen tekstkolonne pr. række, og dansk tid udledes efter behov.
+# Et datointerval findes med to binære søgninger og returneres som et udsnit uden kopi.
+# --------------------------------------------
+class Tidsindeks:
+
+    def __init__(self, df_data):
+        self.sekunder = {}
+        self.ned_eur = {}
+        self.op_eur = {}
+        for område, df in df_data.groupby('Synkronområde', sort=True, observed=True):
+            self.tilføj(område, epoch_sekunder(df['Tid (UTC)']),
+                        df['aFRR-ned aktiveringspris (EUR)'].to_numpy(), df['aFRR-op aktiveringspris (EUR)'].to_numpy())
+
+    @classmethod
+    def fra_arrays(cls, områder):
+        # {område: (sekunder, ned_eur, op_eur)}
+        indeks = cls.__new__(cls)
+        indeks.sekunder, indeks.ned_eur, indeks.op_eur = {}, {}, {}
+        for område, (sekunder, ned, op) in sorted(områder.items()):
+            indeks.tilføj(område, sekunder, ned, op)
+        return indeks
+
+    def tilføj(self, område, sekunder, ned_eur, op_eur):
+        sekunder = np.asarray(sekunder, dtype=np.int64)
+        ned_eur = np.asarray(ned_eur, dtype=np.float32)
+        op_eur = np.asarray(op_eur, dtype=np.float32)
+        if len(sekunder) and not np.all(sekunder[1:] >= sekunder[:-1]):
+            rækkefølge = np.argsort(sekunder, kind="stable")
+            sekunder, ned_eur, op_eur = sekunder[rækkefølge], ned_eur[rækkefølge], op_eur[rækkefølge]
+        self.sekunder[område] = sekunder
+        self.ned_eur[område] = ned_eur
+        self.op_eur[område] = op_eur
+
+    @property
+    def områder(self):
+        return list(self.sekunder)
+
+    def første_tid(self, område):
+        return pd.Timestamp(self.sekunder[område][0], unit="s", tz="UTC")
+
+    def sidste_tid(self, område):
+        return pd.Timestamp(self.sekunder[område][-1], unit="s", tz="UTC")
+
+    def _grænser(self, område, start_date, end_date):
+        if område not in self.sekunder:
+            raise KeyError(f"Ukendt synkronområde: {område!r}")
+        grænser = dag_grænser(start_date, end_date)
+        sek = self.sekunder[område]
+        return np.searchsorted(sek, grænser[0], side="left"), np.searchsorted(sek, grænser[-1], side="left")
+
+    def arrays(self, område, start_date, end_date):
+        # Alle sekunder med dansk dato i [start_date, end_date] (begge inklusiv) som views på de kompakte arrays
+        i0, i1 = self._grænser(område, start_date, end_date)
+        return Aktiveringsudsnit(område, self.sekunder[område][i0:i1], self.ned_eur[område][i0:i1], self.op_eur[område][i0:i1])
+
+    def udsnit(self, område, start_date, end_date):
+        # Som arrays(), men som DataFrame med de sædvanlige kolonner
+        return self.arrays(område, start_date, end_date).som_dataframe()
+
+    def antal_dage(self, område, start_date, end_date):
+        # Antal danske kalenderdage i intervallet hvor der findes data
+        if område not in self.sekunder:
+            raise KeyError(f"Ukendt synkronområde: {område!r}")
+        idx = np.searchsorted(self.sekunder[område], dag_grænser(start_date, end_date), side="left")
+        return int(np.count_nonzero(np.diff(idx)))
+
+    def hukommelse(self):
+        # Bytes pr. område og i alt
+        forbrug = {område: self.sekunder[område].nbytes + self.ned_eur[område].nbytes + self.op_eur[område].nbytes
+                   for område in self.sekunder}
+        forbrug["I alt"] = sum(forbrug.values())
+        return forbrug
@@ -0,0 +1,144 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pcsv
+import pyarrow.parquet as pq
+
+from .data import TIDSZONE
+
+# --------------------------------------------
+# Resultatviser: tabeller og grafer uden at sende hele tidsserien til browseren
+#
+# Tidsserien pr. sekund har op til MAKS_DETALJE_SEKUNDER rækker med ~20 kolonner. Browseren får kun
+#   - én side ad gangen (side), eller tabellen aggregeret pr. time/dag/måned (aggreger) - regnet på serveren
+#   - grafer med højst MAKS_PUNKTER punkter pr. serie (decimer: min/max pr. spand eller LTTB)
+# Den fulde detalje hentes som fil (til_fil), skrevet bid for bid så kun én bid ad gangen omdannes.
+# --------------------------------------------
+MAKS_PUNKTER = 2000
+SIDESTØRRELSE = 1000
+FREKVENSER = {"Time": "h", "Dag": "D", "Måned": "M"}
+SUMMER = ["indtjening"]  # timeværdier i DKK - summeres
+SEKUNDSATSER = {"indtjening_aktiveringer": "indtjening_aktiveringer", "omkostninger_aktiveringer": "omkostninger_aktiveringer",
+                "aktiveret_MW": "aktiveret_MWh"}  # satser pr. time givet pr. sekund - summeres / 3600 (DKK og MWh)
+AKTIVERINGSPRIS = {"aFRR-opregulering": "aFRR-op aktiveringspris (DKK)", "aFRR-nedregulering": "aFRR-ned aktiveringspris (DKK)"}
+FILTYPER = {"parquet": "application/vnd.apache.parquet", "csv": "text/csv"}
+
+
+def tidsakse(df):
+    # Tidsserien pr. sekund har "Tid (DK)", rådighedstabellen "TimeDK"
+    return "Tid (DK)" if "Tid (DK)" in df.columns else "TimeDK"
+
+
+def antal_sider(df, størrelse=SIDESTØRRELSE):
+    return max(-(-len(df) // størrelse), 1)
+
+
+def side(df, nummer, størrelse=SIDESTØRRELSE):
+    # Side nummer (fra 1) - uden for intervallet gives første/sidste side
+    nummer = min(max(int(nummer), 1), antal_sider(df, størrelse))
+    return df.iloc[(nummer - 1) * størrelse:nummer * størrelse]
+
+
+def _periode(tid, frekvens):
+    # Starten af perioden i dansk tid. Timer tages i UTC, så begge timer ved skift fra sommertid bevares
+    tid = pd.to_datetime(tid)
+    if tid.dt.tz is None:
+        tid = tid.dt.tz_localize(TIDSZONE, ambiguous="NaT", nonexistent="NaT")
+    if frekvens == "h":
+        return tid.dt.tz_convert("UTC").dt.floor("h").dt.tz_convert(TIDSZONE)
+    lokal = tid.dt.tz_convert(TIDSZONE).dt.tz_localize(None)
+    return lokal.dt.floor("D") if frekvens == "D" else lokal.dt.to_period("M").dt.start_time
+
+
+def aggreger(df, frekvens="D"):
+    # Én række pr. time ("h"), dag ("D") eller måned ("M"): indtjening og omkostninger summeres til DKK, aktiveret_MW
+    # til MWh, øvrige talkolonner midles. "rækker" er antal rækker (sekunder/timer) i perioden
+    tid = tidsakse(df)
+    tal = df.select_dtypes("number")
+    nøgle = _periode(df[tid], frekvens).rename(tid)
+    grupper = tal.groupby(nøgle)
+
+    summer = [k for k in SUMMER if k in tal.columns]
+    satser = [k for k in SEKUNDSATSER if k in tal.columns]
+    ud = grupper[[k for k in tal.columns if k not in summer + satser + ["aktiv serie"]]].mean()
+    if summer:
+        ud[summer] = grupper[summer].sum(min_count=1)
+    for k in satser:
+        ud[SEKUNDSATSER[k]] = grupper[k].sum() / 3600
+    if "aktiv serie" in tal.columns:
+        ud["aktive sekunder"] = (tal["aktiv serie"] > 0).groupby(nøgle).sum()
+    ud["rækker"] = grupper.size()
+    return ud
+
+
+def minmax_indeks(y, maks_punkter=MAKS_PUNKTER):
+    # Første, mindste, største og sidste punkt i hver spand - toppe og dale bevares (NaN giver huller som før)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= maks_punkter:
+        return np.arange(n)
+    spande = max(maks_punkter // 4, 1)
+    bredde = -(-n // spande)
+    polstret = np.full(spande * bredde, np.nan)
+    polstret[:n] = y
+    polstret = polstret.reshape(spande, bredde)
+    start = np.arange(spande) * bredde
+    mindst = start + np.argmin(np.where(np.isnan(polstret), np.inf, polstret), axis=1)
+    størst = start + np.argmax(np.where(np.isnan(polstret), -np.inf, polstret), axis=1)
+    sidst = np.minimum(start + bredde - 1, n - 1)
+    indeks = np.unique(np.concatenate([start, mindst, størst, sidst]))
+    return indeks[indeks < n]
+
+
+def lttb_indeks(x, y, maks_punkter=MAKS_PUNKTER):
+    # Largest-Triangle-Three-Buckets: ét punkt pr. spand - det der giver den største trekant med det forrige
+    # valgte punkt og middelpunktet af næste spand. NaN regnes som 0 i arealet
+    x = np.asarray(x, dtype=np.float64)
+    y = np.nan_to_num(np.asarray(y, dtype=np.float64))
+    n = len(y)
+    if n <= maks_punkter or maks_punkter < 3:
+        return np.arange(n)
+    kanter = np.linspace(1, n - 1, maks_punkter - 1).astype(np.int64)
+    indeks = np.empty(maks_punkter, dtype=np.int64)
+    indeks[0], indeks[-1] = 0, n - 1
+    a = 0
+    for i in range(maks_punkter - 2):
+        fra, til = kanter[i], kanter[i + 1]
+        if i + 2 < len(kanter):
+            nx, ny = x[til:kanter[i + 2]].mean(), y[til:kanter[i + 2]].mean()
+        else:
+            nx, ny = x[-1], y[-1]
+        areal = np.abs((x[a] - nx) * (y[fra:til] - y[a]) - (x[a] - x[fra:til]) * (ny - y[a]))
+        a = fra + int(np.argmax(areal))
+        indeks[i + 1] = a
+    return indeks
+
+
+def decimer(df, kolonne, maks_punkter=MAKS_PUNKTER, metode="minmax"):
+    # Én serie til st.line_chart: højst maks_punkter punkter, indekseret med dansk tid (vægur)
+    tid = pd.to_datetime(df[tidsakse(df)])
+    if tid.dt.tz is not None:
+        tid = tid.dt.tz_convert(TIDSZONE).dt.tz_localize(None)
+    y = df[kolonne].to_numpy(dtype=np.float64, na_value=np.nan)
+    if metode == "lttb":
+        indeks = lttb_indeks((tid - tid.min()).dt.total_seconds().to_numpy(), y, maks_punkter)
+    else:
+        indeks = minmax_indeks(y, maks_punkter)
+    return pd.DataFrame({kolonne: y[indeks]}, index=pd.Index(tid.to_numpy()[indeks], name=tidsakse(df)))
+
+
+def til_fil(df, filtype="parquet", rækker_pr_bid=100_000):
+    # Hele tabellen som fil (åben, læst fra starten). Skrives bid for bid - i hukommelsen op til 32 MB, derover på disk
+    # (Arrows CSV-skriver - pandas' to_csv er ~10 gange langsommere på tidszonekolonnerne)
+    skrivere = {"parquet": pq.ParquetWriter, "csv": pcsv.CSVWriter}
+    if filtype not in skrivere:
+        raise ValueError(f"Ukendt filtype {filtype!r} - vælg {' eller '.join(FILTYPER)}")
+    fil = tempfile.SpooledTemporaryFile(max_size=32 * 2**20)
+    skema = pa.Schema.from_pandas(df.iloc[:0], preserve_index=False)
+    with skrivere[filtype](fil, skema) as skriver:
+        for i in range(0, len(df), rækker_pr_bid):
+            skriver.write_table(pa.Table.from_pandas(df.iloc[i:i + rækker_pr_bid], schema=skema, preserve_index=False))
+    fil.seek(0)
+    return fil
@@ -0,0 +1,59 @@
+import sys
+
+import numpy as np
+import pytest
+
+from flex_beregner.batch import læs_scenarier
+
+CSV = """navn,Synkronområde,start_date,end_date,reguleringsretning,budprofil,marginalpris,Aktiveringsbetaling,delay
+Grund,DK1,2025-03-29,2025-03-31,aFRR-opregulering,1000,,50,30
+Profil,DK2,2025-06-01,2025-06-07,aFRR-nedregulering,profil.csv,250,-100,0
+"""
+
+YAML = """scenarier:
+  - navn: Grund
+    Synkronområde: DK1
+    start_date: 2025-03-29
+    end_date: 2025-03-31
+    reguleringsretning: aFRR-opregulering
+    budprofil: 1000
+    Aktiveringsbetaling: 50
+    delay: 30
+  - navn: Profil
+    Synkronområde: DK2
+    start_date: 2025-06-01
+    end_date: 2025-06-07
+    reguleringsretning: aFRR-nedregulering
+    budprofil: profil.csv
+    marginalpris: 250
+    Aktiveringsbetaling: -100
+    delay: 0
+"""
+
+
+@pytest.fixture
+def mappe(tmp_path):
+    profil = "," + ",".join(["Mandag", "Tirsdag", "Onsdag", "Torsdag", "Fredag", "Lørdag", "Søndag"]) + "\n"
+    profil += "".join(f"{h:02d}-{(h + 1) % 24:02d}," + ",".join([str(100 * h)] * 7) + "\n" for h in range(24))
+    (tmp_path / "profil.csv").write_text(profil, encoding="utf-8")
+    (tmp_path / "scenarier.csv").write_text(CSV, encoding="utf-8")
+    (tmp_path / "scenarier.yaml").write_text(YAML, encoding="utf-8")
+    return tmp_path
+
+
+def test_yaml_som_csv(mappe):
+    pytest.importorskip("yaml")
+    navne_csv, csv = læs_scenarier(str(mappe / "scenarier.csv"))
+    navne_yaml, yaml = læs_scenarier(str(mappe / "scenarier.yaml"))
+    assert navne_csv == navne_yaml == ["Grund", "Profil"]
+    for a, b in zip(csv, yaml):
+        assert a.nøgle() == b.nøgle() and a.delay == b.delay
+        assert a.budprofil.equals(b.budprofil)
+    assert np.isnan(csv[0].marginalpris) and csv[1].marginalpris == 250.0
+    assert csv[1].budprofil.loc["05-06", "Søndag"] == 500
+
+
+def test_yaml_uden_pyyaml(mappe, monkeypatch):
+    monkeypatch.setitem(sys.modules, "yaml", None)
+    with pytest.raises(ImportError, match="pip install pyyaml"):
+        læs_scenarier(str(mappe / "scenarier.yaml"))
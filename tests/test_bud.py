@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datetime import date
+
+import flex_beregner as fb
+from flex_beregner.benchmark import syntetiske_aktiveringer, syntetiske_priser
+
+
+def _rådighed(profil, fra, til, marginalpris=np.nan):
+    df_spot, df_kapacitet = syntetiske_priser("DK1", fra, til)
+    scenarie = fb.Scenarie("DK1", fra, til, "aFRR-opregulering", profil, marginalpris=marginalpris)
+    df_spot = fb.strømpriser(df_spot, scenarie.kundetype, scenarie.lavlast, scenarie.højlast, scenarie.spidslast, scenarie.eltarif)
+    return fb.beregn_rådighed(scenarie, df_kapacitet, df_spot)
+
+
+def _profil():
+    # Forskellige bud i hver celle, så en forkert time eller ugedag altid giver et andet tal
+    return pd.DataFrame(np.arange(24 * 7, dtype=float).reshape(24, 7) * 10 + 5, index=fb.TIMER, columns=fb.UGEDAGE)
+
+
+@pytest.mark.parametrize("fra, til, skiftedag, timer", [(date(2025, 3, 29), date(2025, 3, 31), date(2025, 3, 30), 23),
+                                                       (date(2025, 10, 25), date(2025, 10, 27), date(2025, 10, 26), 25)])
+def test_bud_slås_op_på_dansk_time_og_ugedag(fra, til, skiftedag, timer):
+    profil = _profil()
+    df_prices = _rådighed(profil, fra, til)
+
+    # Som den oprindelige opslag række for række: budtabellen[interval, dansk ugedag] på den danske tid
+    tider = df_prices["TimeDK"].dt.tz_convert(fb.TIDSZONE)
+    forventet = [profil.loc[f"{t.hour:02d}-{(t.hour + 1) % 24:02d}", fb.UGEDAGE[t.weekday()]] for t in tider]
+    np.testing.assert_array_equal(df_prices["bud_kw"], forventet)
+    assert list(df_prices["interval"]) == [f"{t.hour:02d}-{(t.hour + 1) % 24:02d}" for t in tider]
+
+    # Skiftedøgnet har 23 eller 25 timer; timen kl. 2 mangler eller forekommer to gange med samme bud
+    assert (tider.dt.date == skiftedag).sum() == timer
+    klokken_to = df_prices.loc[(tider.dt.date == skiftedag) & (tider.dt.hour == 2), "bud_kw"]
+    assert len(klokken_to) == timer - 23 and klokken_to.nunique() <= 1
+
+
+def test_manglende_celler_er_nul():
+    profil = _profil().drop(index="03-04", columns="Søndag")
+    df_prices = _rådighed(profil, date(2025, 3, 29), date(2025, 3, 31))
+    tider = df_prices["TimeDK"].dt.tz_convert(fb.TIDSZONE)
+    mangler = (tider.dt.hour == 3) | (tider.dt.weekday == 6)
+    assert (df_prices.loc[mangler, "bud_kw"] == 0).all()
+    assert (df_prices.loc[~mangler, "bud_kw"] > 0).all()
+
+
+def test_bud_pr_sekund_som_sammenfletning():
+    df_prices = _rådighed(_profil(), date(2025, 10, 25), date(2025, 10, 27), marginalpris=700.0)
+    sekunder = pd.date_range("2025-10-25 20:00", "2025-10-26 04:00", freq="37s", tz="UTC")
+
+    # Den oprindelige merge: hvert sekunds time mod de timer hvor der bydes (indtjening ikke NaN). Timen
+    # rundes ned i UTC, da floor på dansk tid ikke kan afgøre den dobbelte time ved skift til vintertid
+    gyldige = df_prices.loc[df_prices["indtjening"].notna(), ["TimeDK", "bud_kw"]]
+    sekund = pd.DataFrame({"TimeDK": sekunder.floor("h").tz_convert(fb.TIDSZONE)})
+    forventet = sekund.merge(gyldige, on="TimeDK", how="left")["bud_kw"].to_numpy(dtype=float)
+
+    fik = fb.bud_pr_sekund(pd.Series(sekunder), df_prices)
+    np.testing.assert_array_equal(np.isnan(fik), np.isnan(forventet))
+    np.testing.assert_array_equal(fik[~np.isnan(fik)], forventet[~np.isnan(forventet)])
+    assert np.isnan(fik).any() and not np.isnan(fik).all()
+
+
+def test_tidsserie_hen_over_skift_til_vintertid():
+    fra = til = date(2025, 10, 26)
+    df = fb.klargør_aktiveringsdata(pd.concat([t.to_pandas() for t in syntetiske_aktiveringer(fra, til, områder=["DK1"])], ignore_index=True))
+    df_spot, df_kapacitet = syntetiske_priser("DK1", fra, til)
+    r = fb.beregn_filtreret(fb.Scenarie("DK1", fra, til, "aFRR-opregulering", _profil()), df, df_spot, df_kapacitet, detaljer=True)
+    assert len(r.df_aktivering) == 25 * 3600
+    assert r.df_aktivering["TimeDK"].nunique() == 25
+    np.testing.assert_allclose(np.nansum(r.df_aktivering["indtjening_aktiveringer"]) / 3600, r.aktiveringsindtjening)
@@ -0,0 +1,228 @@
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datetime import date
+
+import flex_beregner as fb
+from flex_beregner import live
+from flex_beregner.benchmark import skriv_syntetiske_data, syntetiske_priser
+from flex_beregner.lager import _læs_tabel, kortlæg_tidsindeks, skriv_partitioneret
+
+# --------------------------------------------
+# Sweep, portefølje, DuckDB-motoren og live-genafspilning skal give de samme tal som beregn_filtreret.
+# Syntetiske data for tre døgn i DK1 hen over skiftet til sommertid
+# --------------------------------------------
+OMRÅDE = "DK1"
+FRA, TIL = date(2025, 3, 29), date(2025, 3, 31)
+FELTER = ["rådighedsindtjening", "timer_budt", "aktiveringsindtjening", "aktiveringsomkostninger", "aktiveret_MWh", "antal_aktiveringer"]
+
+
+@pytest.fixture(scope="module")
+def rod(tmp_path_factory):
+    mappe = tmp_path_factory.mktemp("aktiveringsdata")
+    kilde = skriv_syntetiske_data(str(mappe / "rå.parquet"), FRA, TIL, områder=[OMRÅDE])
+    skriv_partitioneret(kilde, str(mappe / "lager"))
+    return str(mappe / "lager")
+
+
+@pytest.fixture(scope="module")
+def udsnit(rod):
+    return kortlæg_tidsindeks(rod, OMRÅDE).arrays(OMRÅDE, FRA, TIL)
+
+
+@pytest.fixture(scope="module")
+def priser():
+    return syntetiske_priser(OMRÅDE, FRA, TIL)
+
+
+def _scenarier(df_spot):
+    profil = fb.tom_budprofil(1000.0)
+    profil.iloc[3:6, :] = 0
+    profil.iloc[18:21, :5] = 400.0
+    median = float(np.median(df_spot["SpotPriceDKK"]))
+    return [
+        fb.Scenarie(OMRÅDE, FRA, TIL, "aFRR-opregulering", profil, Rådighedsbetaling=40, delay=30, ramp_up=120),
+        fb.Scenarie(OMRÅDE, FRA, TIL, "aFRR-opregulering", profil, marginalpris=median + 100, Aktiveringsbetaling=150,
+                    delay=0, ramp_up=0, kundetype="B-høj", lavlast=50.0, højlast=150.0, spidslast=300.0),
+        fb.Scenarie(OMRÅDE, FRA, TIL, "aFRR-nedregulering", profil, marginalpris=median - 100, Rådighedsbetaling=20,
+                    Aktiveringsbetaling=-200, delay=10, ramp_up=3),
+    ]
+
+
+def _tal(resultat):
+    return [getattr(resultat, felt) for felt in FELTER]
+
+
+def test_sweep_som_beregn_filtreret(udsnit, priser):
+    df_spot, df_kapacitet = priser
+    justering = fb.lav_justering(udsnit, df_spot, df_kapacitet)
+    median = float(np.median(df_spot["SpotPriceDKK"]))
+    marginalpriser, rådighedsbud, aktiveringsbud = [np.nan, median, median + 300], [0.0, 60.0, 1e9], [-500.0, 0.0, 400.0]
+
+    for scenarie in _scenarier(df_spot):
+        sweep = fb.sweep_bud(scenarie, udsnit, df_spot, df_kapacitet, marginalpriser, rådighedsbud, aktiveringsbud, justering=justering)
+        pris = df_kapacitet[fb.prisnavn(scenarie.reguleringsretning)]
+        for j, rb in enumerate(rådighedsbud):
+            # Sweepets rådighedsbud er en accepttærskel - som beregn_filtreret uden timerne under buddet
+            accepteret = df_kapacitet.assign(**{pris.name: pris.where(pris >= rb)})
+            for i, mp in enumerate(marginalpriser):
+                for k, ab in enumerate(aktiveringsbud):
+                    r = fb.beregn_filtreret(dataclasses.replace(scenarie, marginalpris=mp, Aktiveringsbetaling=ab),
+                                            udsnit, df_spot, accepteret, detaljer=False, justering=justering)
+                    fik = [sweep.rådighedsindtjening[i, j, k], sweep.aktiveringsindtjening[i, j, k],
+                           sweep.aktiveringsomkostninger[i, j, k], sweep.aktiveret_MWh[i, j, k]]
+                    forventet = [r.rådighedsindtjening, r.aktiveringsindtjening, r.aktiveringsomkostninger, r.aktiveret_MWh]
+                    np.testing.assert_allclose(fik, forventet, rtol=1e-9, atol=1e-6)
+
+
+def test_rådighedsbud_ændrer_ikke_hovedberegningen(udsnit, priser):
+    # Rådighedsbetaling er kun en tærskel i sweepet - beregn_filtreret byder i alle timer med en pris
+    df_spot, df_kapacitet = priser
+    scenarie = _scenarier(df_spot)[0]
+    uden = fb.beregn_filtreret(dataclasses.replace(scenarie, Rådighedsbetaling=0), udsnit, df_spot, df_kapacitet, detaljer=False)
+    med = fb.beregn_filtreret(dataclasses.replace(scenarie, Rådighedsbetaling=1e9), udsnit, df_spot, df_kapacitet, detaljer=False)
+    assert _tal(med) == _tal(uden)
+
+    sweep = fb.sweep_bud(scenarie, udsnit, df_spot, df_kapacitet, [np.nan], [0.0, 1e9], [scenarie.Aktiveringsbetaling])
+    assert sweep.rådighedsindtjening[0, 0, 0] == pytest.approx(uden.rådighedsindtjening)
+    assert sweep.rådighedsindtjening[0, 1, 0] == 0 and sweep.aktiveringsindtjening[0, 1, 0] == 0
+
+
+@pytest.mark.parametrize("blok_sekunder", [fb.portefølje.BLOK_SEKUNDER, 3601])
+def test_portefølje_som_beregn_filtreret(udsnit, priser, blok_sekunder):
+    df_spot, df_kapacitet = priser
+    # Alle aktiver i en portefølje har samme retning, tariffer, delay og ramp-up - kun bud og budprofil varierer
+    grund = _scenarier(df_spot)[0]
+    scenarier = [grund,
+                 dataclasses.replace(grund, marginalpris=float(np.median(df_spot["SpotPriceDKK"])), Rådighedsbetaling=0),
+                 dataclasses.replace(grund, Aktiveringsbetaling=300),
+                 dataclasses.replace(grund, budprofil=fb.tom_budprofil(250.0), Rådighedsbetaling=1e9)]
+
+    portefølje = fb.beregn_portefølje(scenarier, udsnit, df_spot, df_kapacitet, blok_sekunder=blok_sekunder)
+    for i, scenarie in enumerate(scenarier):
+        r = fb.beregn_filtreret(scenarie, udsnit, df_spot, df_kapacitet, detaljer=False)
+        række = portefølje.aktiver.iloc[i]
+        np.testing.assert_allclose([række[felt] for felt in FELTER], _tal(r), rtol=1e-9, atol=1e-6)
+
+
+@pytest.mark.parametrize("detaljer", [True, False])
+def test_duckdb_som_beregn_filtreret(rod, udsnit, priser, detaljer):
+    pytest.importorskip("duckdb")
+    df_spot, df_kapacitet = priser
+    for scenarie in _scenarier(df_spot):
+        r1 = fb.beregn_filtreret(scenarie, udsnit, df_spot, df_kapacitet, detaljer=detaljer)
+        r2 = fb.beregn_duckdb(scenarie, rod, df_spot, df_kapacitet, detaljer=detaljer)
+        np.testing.assert_allclose(_tal(r2), _tal(r1), rtol=1e-9, atol=1e-6)
+
+        følsomhed1 = r1.følsomhed([0, 30, 120], [0, 60, 300])
+        følsomhed2 = r2.følsomhed([0, 30, 120], [0, 60, 300])
+        np.testing.assert_allclose(følsomhed2.iloc[:, 2:].to_numpy(float), følsomhed1.iloc[:, 2:].to_numpy(float), rtol=1e-9, atol=1e-6)
+
+
+def _kvarterpriser(df_spot, spredning=0.0):
+    # Timepriserne som DayAheadPrices: fire kvarterer pr. time med TimeUTC/TimeDK/DayAheadPriceDKK
+    kvarter = np.tile(np.arange(4), len(df_spot))
+    tid_utc = pd.DatetimeIndex(df_spot["HourUTC"].repeat(4)) + pd.to_timedelta(15 * kvarter, unit="min")
+    pris = df_spot["SpotPriceDKK"].repeat(4).to_numpy() + spredning * (kvarter - 1.5)
+    return pd.DataFrame({"TimeUTC": tid_utc, "TimeDK": tid_utc.tz_convert(fb.TIDSZONE), "PriceArea": OMRÅDE, "DayAheadPriceDKK": pris})
+
+
+def test_kvarterpriser_med_timeprisen_giver_timeresultatet(rod, udsnit, priser):
+    df_spot, df_kapacitet = priser
+    kvarter = _kvarterpriser(df_spot)
+    for scenarie in _scenarier(df_spot):
+        time = fb.beregn_filtreret(scenarie, udsnit, df_spot, df_kapacitet, detaljer=False)
+        np.testing.assert_allclose(_tal(fb.beregn_filtreret(scenarie, udsnit, kvarter, df_kapacitet, detaljer=False)), _tal(time), rtol=1e-9)
+        if fb.duckdb_tilgængelig():
+            np.testing.assert_allclose(_tal(fb.beregn_duckdb(scenarie, rod, kvarter, df_kapacitet, detaljer=False)), _tal(time), rtol=1e-9)
+
+
+def test_kvarterpriser_slår_igennem_pr_sekund(rod, udsnit, priser):
+    # Strømprisen pr. sekund følger kvarteret - og alle motorer regner på den samme strømpris
+    df_spot, df_kapacitet = priser
+    kvarter = _kvarterpriser(df_spot, spredning=200.0)
+    scenarie = _scenarier(df_spot)[1]
+    r = fb.beregn_filtreret(scenarie, udsnit, kvarter, df_kapacitet, detaljer=True)
+    tidsserie = r.df_aktivering
+    indeks = np.searchsorted(kvarter["TimeUTC"].to_numpy(), tidsserie["Tid (UTC)"].to_numpy(), side="right") - 1
+    np.testing.assert_allclose(tidsserie["Spotpriser (DKK)"].to_numpy(float), kvarter["DayAheadPriceDKK"].to_numpy()[indeks])
+    assert tidsserie["Spotpriser (DKK)"].iloc[:3600].nunique() == 4
+    assert _tal(r) != pytest.approx(_tal(fb.beregn_filtreret(scenarie, udsnit, df_spot, df_kapacitet, detaljer=False)))
+
+    sweep = fb.sweep_bud(scenarie, udsnit, kvarter, df_kapacitet, [scenarie.marginalpris], [0.0], [scenarie.Aktiveringsbetaling])
+    assert sweep.aktiveringsindtjening[0, 0, 0] == pytest.approx(r.aktiveringsindtjening)
+    portefølje = fb.beregn_portefølje([scenarie], udsnit, kvarter, df_kapacitet)
+    np.testing.assert_allclose([portefølje.aktiver.iloc[0][felt] for felt in FELTER], _tal(r), rtol=1e-9)
+    if fb.duckdb_tilgængelig():
+        np.testing.assert_allclose(_tal(fb.beregn_duckdb(scenarie, rod, kvarter, df_kapacitet, detaljer=False)), _tal(r), rtol=1e-9)
+
+    beregning = live.Livberegning(scenarie, _hent_priser((kvarter, df_kapacitet)))
+    beregning.opdater(_læs_tabel(rod, OMRÅDE, FRA, TIL, fb.RÅ_KOLONNER))
+    fik = beregning.som_dict()
+    np.testing.assert_allclose([fik[felt] for felt in FELTER], _tal(r), rtol=1e-9, atol=1e-6)
+
+
+def _hent_priser(priser):
+    df_spot, df_kapacitet = priser
+
+    def hent(Synkronområde, start_date, end_date):
+        dage_spot = df_spot[fb.tidskolonne(df_spot)].dt.tz_convert(fb.TIDSZONE).dt.date
+        dage_kapacitet = df_kapacitet["TimeDK"].dt.date
+        return (df_spot[(dage_spot >= start_date) & (dage_spot <= end_date)].reset_index(drop=True),
+                df_kapacitet[(dage_kapacitet >= start_date) & (dage_kapacitet <= end_date)].reset_index(drop=True))
+    return hent
+
+
+@pytest.mark.parametrize("pr_bid", [61, 997, 86400])
+def test_live_genafspilning_som_beregn_filtreret(rod, udsnit, priser, pr_bid):
+    df_spot, df_kapacitet = priser
+    tabel = _læs_tabel(rod, OMRÅDE, FRA, TIL, fb.RÅ_KOLONNER)
+
+    for scenarie in _scenarier(df_spot):
+        beregning = live.Livberegning(scenarie, _hent_priser(priser))
+        kilde = live.Afspilning(tabel, pr_bid=pr_bid)
+        while len(bid := kilde.læs()):
+            beregning.opdater(bid)
+        assert beregning.poster == len(tabel) and beregning.kasserede == 0
+
+        r = fb.beregn_filtreret(scenarie, udsnit, df_spot, df_kapacitet, detaljer=False)
+        fik = beregning.som_dict()
+        np.testing.assert_allclose([fik[felt] for felt in FELTER], _tal(r), rtol=1e-9, atol=1e-6)
+
+
+def test_afspil_til_fil(tmp_path, rod, priser):
+    # Genafspilning via csv-fil og Filhale giver det samme som at føde tabellen direkte
+    tabel = _læs_tabel(rod, OMRÅDE, FRA, FRA, fb.RÅ_KOLONNER).slice(0, 20000)
+    sti = str(tmp_path / "live.csv")
+    live.afspil(tabel, sti, hastighed=1e9, pr_bid=997)
+
+    scenarie = _scenarier(priser[0])[0]
+    fra_fil = live.Livberegning(scenarie, _hent_priser(priser))
+    hale = live.Filhale(sti)
+    fra_fil.opdater(hale.læs())
+    hale.luk()
+    direkte = live.Livberegning(scenarie, _hent_priser(priser))
+    direkte.opdater(tabel)
+    assert fra_fil.poster == direkte.poster == len(tabel)
+    assert _tal(fra_fil) == pytest.approx(_tal(direkte))
+
+
+@pytest.mark.parametrize("fra, med", [(date(2025, 3, 24), False), (date(2025, 3, 25), True)])
+def test_tidsserie_efter_periodens_længde(rod, priser, fra, med):
+    # Samme regel i alle motorer: 8 dage er for lang en periode - også når der kun er data for tre af dagene -
+    # mens 7 dage med skiftet til sommertid er med
+    df_spot, df_kapacitet = priser
+    scenarie = dataclasses.replace(_scenarier(df_spot)[0], start_date=fra)
+    indeks = kortlæg_tidsindeks(rod, OMRÅDE)
+    graf = fb.aktiveringsgraf(indeks.arrays, _hent_priser(priser))
+    tidsserier = [fb.beregn_filtreret(scenarie, indeks.arrays(OMRÅDE, fra, TIL), df_spot, df_kapacitet).df_aktivering,
+                  graf.hent("tidsserie", scenarie, version=1)]
+    if fb.duckdb_tilgængelig():
+        tidsserier.append(fb.beregn_duckdb(scenarie, rod, df_spot, df_kapacitet).df_aktivering)
+    assert fb.med_tidsserie(fra, TIL) == med
+    assert all((t is not None) == med for t in tidsserier)
+    if med:
+        assert {len(t) for t in tidsserier} == {len(indeks.arrays(OMRÅDE, FRA, TIL))}
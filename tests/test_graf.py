@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from dataclasses import replace
+from datetime import date
+
+import flex_beregner as fb
+from flex_beregner.benchmark import skriv_syntetiske_data, syntetiske_priser
+from flex_beregner.graf import Beregningsgraf, Knude
+from flex_beregner.lager import kortlæg_tidsindeks, skriv_partitioneret
+
+OMRÅDE = "DK1"
+FRA, TIL = date(2025, 5, 5), date(2025, 5, 6)
+FELTER = ["rådighedsindtjening", "aktiveringsindtjening", "aktiveringsomkostninger", "aktiveret_MWh", "antal_aktiveringer"]
+
+
+@pytest.fixture(scope="module")
+def rod(tmp_path_factory):
+    mappe = tmp_path_factory.mktemp("aktiveringsdata")
+    kilde = skriv_syntetiske_data(str(mappe / "rå.parquet"), FRA, TIL, områder=[OMRÅDE])
+    skriv_partitioneret(kilde, str(mappe / "lager"))
+    return str(mappe / "lager")
+
+
+@pytest.fixture
+def graf(rod):
+    priser = syntetiske_priser(OMRÅDE, FRA, TIL)
+    indeks = kortlæg_tidsindeks(rod, OMRÅDE)
+    return fb.aktiveringsgraf(lambda område, fra, til: indeks.arrays(område, fra, til), lambda område, fra, til: priser)
+
+
+def _scenarie(**felter):
+    return fb.Scenarie(OMRÅDE, FRA, TIL, "aFRR-opregulering", fb.tom_budprofil(800.0), marginalpris=600.0, **felter)
+
+
+def test_resultat_som_beregn_filtreret(rod, graf):
+    scenarie = _scenarie(Aktiveringsbetaling=50)
+    r = graf.hent("resultat", scenarie, version=1)
+    assert set(graf.beregnede) == set(graf.knuder) - {"tidsserie"}
+    df_spot, df_kapacitet = syntetiske_priser(OMRÅDE, FRA, TIL)
+    forventet = fb.beregn_filtreret(scenarie, kortlæg_tidsindeks(rod, OMRÅDE).arrays(OMRÅDE, FRA, TIL), df_spot, df_kapacitet, detaljer=False)
+    np.testing.assert_allclose([getattr(r, f) for f in FELTER], [getattr(forventet, f) for f in FELTER], rtol=1e-9)
+
+
+@pytest.mark.parametrize("ændring, regnes", [
+    (dict(), []),
+    (dict(delay=0, ramp_up=10), ["resultat"]),
+    (dict(Aktiveringsbetaling=120), ["aktivering", "resultat"]),
+    (dict(Rådighedsbetaling=30), ["rådighed", "aktivering", "resultat"]),
+    (dict(budprofil=fb.tom_budprofil(500.0)), ["rådighed", "aktivering", "resultat"]),
+    (dict(eltarif=10.0), ["tarif", "rådighed", "aktivering", "resultat"]),
+    (dict(kundetype="A-høj"), ["tarif", "rådighed", "aktivering", "resultat"]),
+    (dict(end_date=FRA), ["udsnit", "priser", "justering", "tarif", "rådighed", "aktivering", "resultat"]),
+])
+def test_kun_berørte_knuder_regnes_igen(graf, ændring, regnes):
+    scenarie = _scenarie(Aktiveringsbetaling=50)
+    graf.hent("resultat", scenarie, version=1)
+    graf.hent("resultat", replace(scenarie, **ændring), version=1)
+    assert sorted(graf.beregnede) == sorted(regnes)
+
+
+def test_ny_lagerversion_regner_udsnittet_igen(graf):
+    scenarie = _scenarie()
+    graf.hent("resultat", scenarie, version=1)
+    graf.hent("resultat", scenarie, version=2)
+    assert sorted(graf.beregnede) == sorted(["udsnit", "justering", "tarif", "rådighed", "aktivering", "resultat"])
+    # Priserne afhænger ikke af versionen
+    assert graf.ajour("priser", scenarie, version=3)
+
+
+def test_samme_tal_samme_nøgle(graf):
+    # 600 og 600.0 er samme input; en ændret værdi i budprofilen er et nyt
+    profil = fb.tom_budprofil(800.0)
+    a = graf.nøgle("resultat", _scenarie(Aktiveringsbetaling=50), version=1)
+    assert graf.nøgle("resultat", _scenarie(Aktiveringsbetaling=50.0), version=1) == a
+    profil.iloc[5, 2] = 801.0
+    assert graf.nøgle("resultat", replace(_scenarie(Aktiveringsbetaling=50), budprofil=profil), version=1) != a
+    assert graf.nøgle("resultat", _scenarie(Aktiveringsbetaling=50, delay=31), version=1) != a
+    assert graf.nøgle("aktivering", _scenarie(Aktiveringsbetaling=50, delay=31), version=1) == graf.nøgle("aktivering", _scenarie(Aktiveringsbetaling=50), version=1)
+
+
+def test_knude_ser_kun_sine_input():
+    # En knude der bruger et felt den ikke har erklæret fejler i stedet for at give en forældet værdi
+    graf = Beregningsgraf([Knude("a", lambda p: p.delay, input=("ramp_up",))])
+    with pytest.raises(AttributeError, match="delay"):
+        graf.hent("a", _scenarie())
+
+
+def test_gemte_poster_pr_knude():
+    # Med maks_poster=2 ligger de to senest beregnede værdier klar; den ældste ryger (et fund flytter den ikke)
+    kald = []
+    graf = Beregningsgraf([Knude("a", lambda p: kald.append(p.delay) or p.delay, input=("delay",))], maks_poster=2)
+    for delay in (1, 2, 1, 3, 1, 2):
+        assert graf.hent("a", _scenarie(delay=delay)) == delay
+    assert kald == [1, 2, 3, 1, 2]
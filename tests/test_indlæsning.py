@@ -0,0 +1,68 @@
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from datetime import date
+
+from flex_beregner.benchmark import skriv_syntetiske_data, syntetiske_aktiveringer
+from flex_beregner.data import RÅ_KOLONNER
+from flex_beregner.indlæsning import Mappekilde, indlæs
+from flex_beregner.lager import _læs_tabel, kortlæg_tidsindeks, skriv_kompakt, skriv_partitioneret
+
+DAG1, DAG2 = date(2025, 5, 5), date(2025, 5, 6)
+
+
+def _lager(tmp_path):
+    kilde = skriv_syntetiske_data(str(tmp_path / "rå.parquet"), DAG1, DAG1)
+    rod = str(tmp_path / "lager")
+    skriv_partitioneret(kilde, rod)
+    kortlæg_tidsindeks(rod, ["DK1", "DK2"])  # kompakte kopier findes og er ajour før indlæsningen
+    return rod
+
+
+def _leverance():
+    # Anden halvdel af dag 1 (overlapper lageret) og hele dag 2 med nye priser. Nogle sekunder står to gange
+    # i leverancen - den sidste række vinder
+    tabel = pa.concat_tables(syntetiske_aktiveringer(DAG1, DAG2, seed=7)).slice(86400, 3 * 86400)
+    dubletter = tabel.slice(1000, 200)
+    dubletter = dubletter.set_column(3, RÅ_KOLONNER[3], pc.add(dubletter.column(3), 1000.0))
+    return pa.concat_tables([tabel, dubletter])
+
+
+def test_overlappende_sekunder_erstattes(tmp_path):
+    rod = _lager(tmp_path)
+    indbakke = tmp_path / "indbakke"
+    indbakke.mkdir()
+    leverance = _leverance()
+    pq.write_table(leverance, str(indbakke / "leverance.parquet"))
+
+    df = indlæs(rod, Mappekilde(str(indbakke))).set_index("Synkronområde")
+    # Pr. område: 43200 sekunder af dag 1 erstattes, 86400 sekunder af dag 2 er nye
+    assert list(df.loc[["DK1", "DK2"], "erstattede"]) == [43200, 43200]
+    assert list(df.loc[["DK1", "DK2"], "nye"]) == [86400, 86400]
+
+    for område in ("DK1", "DK2"):
+        tabel = _læs_tabel(rod, område, DAG1, DAG2, RÅ_KOLONNER)
+        sekunder = tabel.column("ActivationTime").cast(pa.timestamp("s", tz="UTC")).cast(pa.int64()).to_numpy()
+        assert len(sekunder) == 2 * 86400 and len(np.unique(sekunder)) == len(sekunder)
+
+        # Leverancens værdier (den sidste af dubletterne) har erstattet lagerets
+        fra_leverance = leverance.filter(pc.equal(leverance.column("PriceArea"), område)).to_pandas()
+        fra_leverance["t"] = fra_leverance["ActivationTime"].astype("datetime64[s]").astype(np.int64)
+        forventet = fra_leverance.drop_duplicates("t", keep="last").set_index("t")["aFRR_UpActivatedPriceEUR"]
+        op = tabel.column("aFRR_UpActivatedPriceEUR").to_numpy(zero_copy_only=False)
+        fik = dict(zip(sekunder, op))
+        np.testing.assert_array_equal([fik[t] for t in forventet.index], forventet.to_numpy())
+
+        # Den flettede kompakte kopi er den samme som en nybygget fra parquet-filerne
+        flettet = kortlæg_tidsindeks(rod, område)
+        np.testing.assert_array_equal(flettet.sekunder[område], np.sort(sekunder))
+        flettet_op = flettet.op_eur[område].copy()
+        skriv_kompakt(rod, område)
+        ny = kortlæg_tidsindeks(rod, område)
+        np.testing.assert_array_equal(ny.sekunder[område], flettet.sekunder[område])
+        np.testing.assert_array_equal(ny.op_eur[område], flettet_op)
+
+    # Samme fil igen: intet at indlæse
+    assert len(indlæs(rod, Mappekilde(str(indbakke)))) == 0
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from flex_beregner.justering import MAKS_VARIGHED, Prisakse
+from flex_beregner.tidsindeks import epoch_sekunder
+
+
+def _tider(*dele):
+    return pd.Series(pd.DatetimeIndex(np.concatenate([pd.date_range(*d, tz="UTC") for d in dele])))
+
+
+def _sek(tekst):
+    return epoch_sekunder(pd.Series(pd.to_datetime([tekst], utc=True)))
+
+
+def test_skift_fra_kvarter_til_time():
+    # Kvarterpriser 21:00-21:45, derefter timepriser fra 22:00
+    akse = Prisakse(_tider(("2025-01-01 21:00", "2025-01-01 21:45", None, "15min"),
+                           ("2025-01-01 22:00", "2025-01-02 00:00", None, "h")))
+    assert list(akse.varighed) == [900] * 4 + [3600] * 3
+    assert akse.indeks(_sek("2025-01-01 21:50"))[0] == 3
+    assert akse.indeks(_sek("2025-01-01 22:30"))[0] == 4
+    assert akse.indeks(_sek("2025-01-02 00:59:59"))[0] == 6
+    assert akse.indeks(_sek("2025-01-02 01:00"))[0] == -1
+
+
+def test_skift_fra_time_til_kvarter():
+    akse = Prisakse(_tider(("2025-01-01 20:00", "2025-01-01 21:00", None, "h"),
+                           ("2025-01-01 22:00", "2025-01-01 22:45", None, "15min")))
+    assert list(akse.varighed) == [3600] * 2 + [900] * 4
+    assert akse.indeks(_sek("2025-01-01 21:59:59"))[0] == 1
+    assert akse.indeks(_sek("2025-01-01 22:50"))[0] == 5
+    assert akse.indeks(_sek("2025-01-01 23:00"))[0] == -1  # sidste kvarter dækker kun sit kvarter
+
+
+def test_hul_fyldes_højst_en_time():
+    akse = Prisakse(_tider(("2025-01-01 00:00", "2025-01-01 00:00", None, "h"),
+                           ("2025-01-01 03:00", "2025-01-01 03:00", None, "h")))
+    assert list(akse.varighed) == [MAKS_VARIGHED, MAKS_VARIGHED]
+    assert list(akse.indeks(_sek("2025-01-01 01:30"))) == [-1]
+
+
+def test_uordnet_rækkefølge_og_dubletter():
+    tider = pd.Series(pd.to_datetime(["2025-01-01 01:00", "2025-01-01 00:00", "2025-01-01 01:00"], utc=True))
+    akse = Prisakse(tider)
+    assert akse.indeks(_sek("2025-01-01 00:30"))[0] == 1
+    assert akse.indeks(_sek("2025-01-01 01:30"))[0] in (0, 2)
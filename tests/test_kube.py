@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataclasses import replace
+from datetime import date
+
+import flex_beregner as fb
+from flex_beregner.benchmark import skriv_syntetiske_data, syntetiske_priser
+from flex_beregner.kube import GRÆNSER_EUR, KVANTILER, byg_timekube, estimér_aktivering, kortlæg_timekube
+from flex_beregner.lager import kortlæg_tidsindeks, skriv_partitioneret
+
+T0 = int(pd.Timestamp("2025-06-02 00:00", tz="UTC").timestamp())
+
+
+def _sekunddata(timer=6, seed=0):
+    # Sekunder med huller og priser der spænder over hele histogrammet (også de åbne ender); ca. hver tiende pris mangler
+    rng = np.random.default_rng(seed)
+    sekunder = np.sort(rng.choice(np.arange(T0, T0 + timer * 3600), size=timer * 3000, replace=False)).astype(np.int64)
+    op = rng.normal(80, 150, len(sekunder))
+    op[rng.random(len(sekunder)) < 0.01] = 8000.0
+    ned = rng.normal(-20, 150, len(sekunder))
+    ned[rng.random(len(sekunder)) < 0.01] = -8000.0
+    op[rng.random(len(sekunder)) < 0.1] = np.nan
+    ned[rng.random(len(sekunder)) < 0.1] = np.nan
+    return sekunder, ned.astype(np.float32), op.astype(np.float32)
+
+
+def _pr_time(sekunder, priser):
+    time = (sekunder - T0) // 3600
+    return [priser[(time == t) & ~np.isnan(priser)].astype(np.float64) for t in range(time.max() + 1)]
+
+
+def test_antal_sum_og_kvantiler_pr_time():
+    sekunder, ned, op = _sekunddata()
+    kube = byg_timekube("DK1", sekunder, ned, op)
+    assert list(kube.timer) == [T0 + t * 3600 for t in range(6)]
+    for t, (p_op, p_ned) in enumerate(zip(_pr_time(sekunder, op), _pr_time(sekunder, ned))):
+        assert kube.op_antal[t] == len(p_op) and kube.ned_antal[t] == len(p_ned)
+        np.testing.assert_allclose(kube.op_sum[t], p_op.sum(), rtol=1e-9)
+        np.testing.assert_allclose(kube.op_kvantiler[t], np.quantile(p_op, KVANTILER), rtol=1e-5, atol=1e-3)
+        np.testing.assert_allclose(kube.ned_kvantiler[t], np.quantile(p_ned, KVANTILER), rtol=1e-5, atol=1e-3)
+        assert kube.op_hist_antal[t].sum() == len(p_op)
+
+
+@pytest.mark.parametrize("tærskel", [-5000.0, -200.0, -30.0, 0.0, 10.0, 150.0, 300.0, 5000.0])
+def test_halen_er_eksakt_på_grænserne(tærskel):
+    assert tærskel in GRÆNSER_EUR
+    sekunder, ned, op = _sekunddata()
+    kube = byg_timekube("DK1", sekunder, ned, op)
+    antal_op, sum_op = kube.antal_over(tærskel)
+    antal_ned, sum_ned = kube.antal_under(tærskel)
+    for t, (p_op, p_ned) in enumerate(zip(_pr_time(sekunder, op), _pr_time(sekunder, ned))):
+        assert antal_op[t] == (p_op > tærskel).sum() and antal_ned[t] == (p_ned < tærskel).sum()
+        np.testing.assert_allclose(sum_op[t], p_op[p_op > tærskel].sum(), rtol=1e-5, atol=1e-2)
+        np.testing.assert_allclose(sum_ned[t], p_ned[p_ned < tærskel].sum(), rtol=1e-5, atol=1e-2)
+
+
+def test_halen_interpoleres_inden_for_intervallet():
+    # Priserne ligger jævnt i [20, 30) - en tærskel inde i intervallet giver den jævne andel af antal og sum
+    sekunder = np.arange(T0, T0 + 3600, dtype=np.int64)
+    priser = (20 + (np.arange(3600) + 0.5) * 10 / 3600).astype(np.float32)
+    kube = byg_timekube("DK1", sekunder, priser, priser)
+    for tærskel in (20.0, 22.5, 24.0, 27.25, 30.0):
+        antal, summer = kube.antal_over(tærskel)
+        np.testing.assert_allclose(antal[0], (priser > tærskel).sum(), atol=1)
+        np.testing.assert_allclose(summer[0], priser[priser > tærskel].sum(dtype=np.float64), rtol=1e-4)
+        antal, summer = kube.antal_under(tærskel)
+        np.testing.assert_allclose(antal[0], (priser < tærskel).sum(), atol=1)
+        np.testing.assert_allclose(summer[0], priser[priser < tærskel].sum(dtype=np.float64), rtol=1e-4)
+
+    # En tærskel pr. time, og mellem to grænser ligger resultatet mellem grænsernes
+    sekunder, ned, op = _sekunddata()
+    kube = byg_timekube("DK1", sekunder, ned, op)
+    tærskler = np.array([15.0, 33.0, 47.5, 61.0, 99.0, 142.0])
+    antal, _ = kube.antal_over(tærskler)
+    nedre, _ = kube.antal_over(np.floor(tærskler / 10) * 10)
+    øvre, _ = kube.antal_over(np.ceil(tærskler / 10) * 10)
+    assert np.all(antal <= nedre) and np.all(antal >= øvre)
+
+
+def test_åbne_ender_efter_middelværdien():
+    # Over den største grænse tæller hele intervallet med, hvis dets middelværdi ligger over tærsklen
+    sekunder, ned, op = _sekunddata()
+    kube = byg_timekube("DK1", sekunder, ned, op)
+    antal, _ = kube.antal_over(6000.0)
+    np.testing.assert_array_equal(antal, kube.op_hist_antal[:, -1])
+    antal, _ = kube.antal_over(9000.0)
+    assert np.all(antal == 0)
+    antal, _ = kube.antal_under(-9000.0)
+    assert np.all(antal == 0)
+
+
+@pytest.fixture(scope="module")
+def rod(tmp_path_factory):
+    mappe = tmp_path_factory.mktemp("aktiveringsdata")
+    kilde = skriv_syntetiske_data(str(mappe / "rå.parquet"), date(2025, 5, 5), date(2025, 5, 6), områder=["DK1"])
+    skriv_partitioneret(kilde, str(mappe / "lager"))
+    return str(mappe / "lager")
+
+
+def test_kube_fra_lageret_som_fra_sekunddata(rod):
+    indeks = kortlæg_tidsindeks(rod, "DK1")
+    kube = kortlæg_timekube(rod, "DK1")
+    ny = byg_timekube("DK1", indeks.sekunder["DK1"], indeks.ned_eur["DK1"], indeks.op_eur["DK1"])
+    assert len(kube) == 48
+    np.testing.assert_array_equal(kube.op_hist_antal, ny.op_hist_antal)
+    np.testing.assert_array_equal(kube.ned_kvantiler, ny.ned_kvantiler)
+
+
+def test_estimat_i_grafen(rod):
+    # Knuden "estimat" giver det samme som estimér_aktivering og regnes kun igen når dens input ændres
+    fra, til = date(2025, 5, 5), date(2025, 5, 6)
+    df_spot, df_kapacitet = syntetiske_priser("DK1", fra, til)
+    kube = kortlæg_timekube(rod, "DK1")
+    graf = fb.aktiveringsgraf(lambda *a: None, lambda *a: (df_spot, df_kapacitet), hent_kube=lambda område: kube)
+    scenarie = fb.Scenarie("DK1", fra, til, "aFRR-opregulering", fb.tom_budprofil(1000.0), marginalpris=600.0, Aktiveringsbetaling=50)
+
+    estimat = graf.hent("estimat", scenarie, version=1)
+    assert estimat == estimér_aktivering(kube, scenarie, df_spot, df_kapacitet)
+    assert estimat["aktiveret_MWh"] > 0
+    assert graf.beregnede == ["priser", "estimat"]
+
+    graf.hent("estimat", replace(scenarie, delay=5), version=1)
+    assert graf.beregnede == []
+    graf.hent("estimat", replace(scenarie, Aktiveringsbetaling=80), version=1)
+    assert graf.beregnede == ["estimat"]
+    graf.hent("estimat", replace(scenarie, Aktiveringsbetaling=80), version=2)
+    assert graf.beregnede == ["estimat"]
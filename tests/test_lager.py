@@ -0,0 +1,40 @@
+import os
+
+import numpy as np
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from flex_beregner.benchmark import skriv_syntetiske_data
+from flex_beregner.kube import kortlæg_timekube
+from flex_beregner.lager import KOMPAKT_MAPPE, kortlæg_tidsindeks, læs_tidsindeks, skriv_kompakt, skriv_partitioneret
+
+DAG = date(2025, 5, 5)
+
+
+def _lager(tmp_path, områder):
+    kilde = skriv_syntetiske_data(str(tmp_path / "rå.parquet"), DAG, DAG, områder=områder)
+    rod = str(tmp_path / "lager")
+    skriv_partitioneret(kilde, rod)
+    return rod
+
+
+def test_område_uden_data_giver_tomt_indeks(tmp_path):
+    # Den kompakte kopi for et område uden rækker har ingen bidder - mappes som tomme arrays
+    rod = _lager(tmp_path, ["DK1"])
+    indeks = kortlæg_tidsindeks(rod, ["DK1", "DK2"])
+    assert len(indeks.sekunder["DK1"]) == 86400
+    assert len(indeks.sekunder["DK2"]) == 0 and indeks.sekunder["DK2"].dtype == np.int64
+    assert len(indeks.arrays("DK2", DAG, DAG)) == 0
+    assert len(kortlæg_timekube(rod, "DK2")) == 0
+
+
+def test_samtidige_kompakte_kopier(tmp_path):
+    # Flere tråde i samme proces skriver områdets kompakte kopi på én gang (f.eks. to Streamlit-sessioner)
+    rod = _lager(tmp_path, ["DK1"])
+    with ThreadPoolExecutor(8) as pulje:
+        stier = list(pulje.map(lambda _: skriv_kompakt(rod, "DK1"), range(16)))
+    assert len(set(stier)) == 1
+    assert not [navn for navn in os.listdir(os.path.join(rod, KOMPAKT_MAPPE)) if navn.endswith(".tmp")]
+    indeks = kortlæg_tidsindeks(rod, "DK1")
+    np.testing.assert_array_equal(indeks.sekunder["DK1"], læs_tidsindeks(rod, "DK1").sekunder["DK1"])
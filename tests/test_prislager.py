@@ -0,0 +1,170 @@
+import json
+import threading
+import urllib.parse
+
+import pandas as pd
+import pytest
+
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from flex_beregner.api import hent_records
+from flex_beregner.data import TIDSZONE
+from flex_beregner.prislager import Prislager
+
+
+# --------------------------------------------
+# Lokal stand-in for Energi Data Service: time- (kvarter- for DayAheadPrices) priser for de danske kalenderdage [start, end[,
+# nyeste først og med limit/offset som API'et. Hver forespørgsel logges som (datasæt, område, start, end).
+# Dage i server.tomme er endnu ikke publiceret og giver ingen records
+# --------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        q = urllib.parse.parse_qs(url.query)
+        dataset = url.path.rsplit("/", 1)[-1]
+        område = json.loads(q["filter"][0])["PriceArea"][0]
+        self.server.log.append((dataset, område, q["start"][0], q["end"][0]))
+
+        frekvens = "15min" if dataset == "DayAheadPrices" else "h"
+        dk = pd.date_range(q["start"][0], q["end"][0], freq=frekvens, tz=TIDSZONE, inclusive="left")
+        records = []
+        for t_dk, t_utc in zip(dk, dk.tz_convert("UTC")):
+            if t_dk.date() in self.server.tomme:
+                continue
+            pris = float(int(t_utc.timestamp()) // 3600 % 500)
+            if dataset == "Elspotprices":
+                records.append({"HourUTC": t_utc.strftime("%Y-%m-%dT%H:%M:%S"), "HourDK": t_dk.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "PriceArea": område, "SpotPriceDKK": pris})
+            elif dataset == "DayAheadPrices":
+                records.append({"TimeUTC": t_utc.strftime("%Y-%m-%dT%H:%M:%S"), "TimeDK": t_dk.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "PriceArea": område, "DayAheadPriceDKK": pris})
+            else:
+                records.append({"TimeUTC": t_utc.strftime("%Y-%m-%dT%H:%M:%S"), "TimeDK": t_dk.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "PriceArea": område, "UpPriceDKK": pris, "DownPriceDKK": pris / 2})
+        records = records[::-1]
+        offset, limit = int(q.get("offset", ["0"])[0]), int(q.get("limit", ["0"])[0])
+        side = records[offset:offset + limit] if limit else records[offset:]
+
+        body = json.dumps({"total": len(records), "records": side}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.log = []
+    server.tomme = set()
+    tråd = threading.Thread(target=server.serve_forever, daemon=True)
+    tråd.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def lager(api, tmp_path):
+    url = f"http://127.0.0.1:{api.server_address[1]}"
+    return Prislager(str(tmp_path), hent=lambda dataset, område, fra, til: hent_records(dataset, område, fra, til, api_url=url))
+
+
+def _dækning(lager, dataset, område):
+    with open(lager._sti(dataset, område, ".dækning.json")) as f:
+        return json.load(f)
+
+
+def test_kun_manglende_intervaller_hentes(api, lager):
+    lager.get_spotdata("DK1", date(2025, 3, 10), date(2025, 3, 12))
+    lager.get_spotdata("DK1", date(2025, 3, 20), date(2025, 3, 21))
+    assert len(api.log) == 2
+
+    # Hullet 13.-19. og halen 22.-23. hentes - ikke de dage der allerede ligger på disken
+    api.log.clear()
+    df = lager.get_spotdata("DK1", date(2025, 3, 8), date(2025, 3, 23))
+    assert sorted((start, end) for _, _, start, end in api.log) == [
+        ("2025-03-08", "2025-03-10"), ("2025-03-13", "2025-03-20"), ("2025-03-22", "2025-03-24")]
+    assert _dækning(lager, "Elspotprices", "DK1") == [["2025-03-08", "2025-03-23"]]
+
+    # 16 døgn - hver time præcis én gang og i stigende orden
+    assert len(df) == 16 * 24
+    assert df["HourUTC"].is_monotonic_increasing and df["HourUTC"].is_unique
+    datoer = df["HourDK"].dt.date
+    assert datoer.min() == date(2025, 3, 8) and datoer.max() == date(2025, 3, 23)
+
+
+def test_overlappende_interval_læses_fra_disk(api, lager):
+    først = lager.get_spotdata("DK2", date(2025, 1, 1), date(2025, 1, 31))
+    api.log.clear()
+
+    df = lager.get_spotdata("DK2", date(2025, 1, 10), date(2025, 1, 20))
+    assert api.log == []
+    assert df["HourDK"].dt.date.min() == date(2025, 1, 10) and df["HourDK"].dt.date.max() == date(2025, 1, 20)
+    forventet = først[(først["HourDK"].dt.date >= date(2025, 1, 10)) & (først["HourDK"].dt.date <= date(2025, 1, 20))]
+    pd.testing.assert_frame_equal(df, forventet.reset_index(drop=True))
+
+    # Datasæt og områder har hver deres dækning
+    lager.Rådighedspriser("DK2", date(2025, 1, 10), date(2025, 1, 20))
+    lager.get_spotdata("DK1", date(2025, 1, 10), date(2025, 1, 20))
+    assert [(dataset, område) for dataset, område, _, _ in api.log] == [("AfrrReservesNordic", "DK2"), ("Elspotprices", "DK1")]
+
+
+def test_i_dag_registreres_aldrig_som_dækket(api, lager):
+    i_dag = datetime.now(TIDSZONE).date()
+    fra, til = i_dag - timedelta(days=2), i_dag + timedelta(days=1)
+
+    lager.Rådighedspriser("DK1", fra, til)
+    assert _dækning(lager, "AfrrReservesNordic", "DK1") == [[fra.isoformat(), (i_dag - timedelta(days=1)).isoformat()]]
+
+    # I dag og i morgen hentes igen - dagene før ikke
+    api.log.clear()
+    df = lager.Rådighedspriser("DK1", fra, til)
+    assert api.log == [("AfrrReservesNordic", "DK1", i_dag.isoformat(), (til + timedelta(days=1)).isoformat())]
+    assert lager.manglende_intervaller("AfrrReservesNordic", "DK1", fra, til) == [(i_dag, til)]
+    assert df["TimeUTC"].is_unique
+    assert df["TimeDK"].dt.date.max() == til
+
+
+def test_dage_uden_records_hentes_igen(api, lager):
+    # Rådighedspriserne for 5. marts er ikke publiceret ved første hentning
+    api.tomme = {date(2025, 3, 5)}
+    df = lager.Rådighedspriser("DK1", date(2025, 3, 4), date(2025, 3, 6))
+    assert sorted(df["TimeDK"].dt.date.unique()) == [date(2025, 3, 4), date(2025, 3, 6)]
+    assert _dækning(lager, "AfrrReservesNordic", "DK1") == [["2025-03-04", "2025-03-04"], ["2025-03-06", "2025-03-06"]]
+
+    api.tomme = set()
+    api.log.clear()
+    df = lager.Rådighedspriser("DK1", date(2025, 3, 4), date(2025, 3, 6))
+    assert api.log == [("AfrrReservesNordic", "DK1", "2025-03-05", "2025-03-06")]
+    assert len(df) == 3 * 24 and df["TimeUTC"].is_monotonic_increasing
+    assert _dækning(lager, "AfrrReservesNordic", "DK1") == [["2025-03-04", "2025-03-06"]]
+
+
+def test_tomt_svar_har_datasættets_kolonner(api, lager):
+    api.tomme = {date(2025, 3, 5)}
+    df_spot, df_kapacitet = lager.hent_prisdata("DK2", date(2025, 3, 5), date(2025, 3, 5))
+    assert len(df_spot) == 0 and len(df_kapacitet) == 0
+    assert {"HourUTC", "HourDK", "SpotPriceDKK"} <= set(df_spot.columns)
+    assert {"TimeUTC", "TimeDK", "UpPriceDKK", "DownPriceDKK"} <= set(df_kapacitet.columns)
+    assert str(df_spot["HourUTC"].dt.tz) == "UTC"
+    assert lager.manglende_intervaller("Elspotprices", "DK2", date(2025, 3, 5), date(2025, 3, 5)) == [(date(2025, 3, 5), date(2025, 3, 5))]
+
+
+def test_spotpriser_skifter_til_kvarterer(api, lager):
+    # Timepriser til og med 30. september 2025, kvarterpriser fra 1. oktober - samlet i kvarterformatet
+    df = lager.get_spotdata("DK1", date(2025, 9, 30), date(2025, 10, 1))
+    assert sorted((dataset, start, end) for dataset, _, start, end in api.log) == [
+        ("DayAheadPrices", "2025-10-01", "2025-10-02"), ("Elspotprices", "2025-09-30", "2025-10-01")]
+    assert {"TimeUTC", "TimeDK", "DayAheadPriceDKK"} <= set(df.columns) and "HourUTC" not in df.columns
+    assert len(df) == 24 + 96 and df["TimeUTC"].is_monotonic_increasing
+    assert df["DayAheadPriceDKK"].notna().all()
+
+    # Kun timepriser: uændret format
+    assert "SpotPriceDKK" in lager.get_spotdata("DK1", date(2025, 9, 29), date(2025, 9, 30)).columns
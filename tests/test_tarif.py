@@ -0,0 +1,84 @@
+import holidays
+import numpy as np
+import pandas as pd
+import pytest
+
+from datetime import date
+
+from flex_beregner.beregning import KUNDETYPER
+from flex_beregner.tarif import FRIDAG, SOMMER, beregn_tarif, dagtyper, tarif_pr_tidspunkt
+from flex_beregner.tidsindeks import epoch_sekunder
+
+SATSER = dict(lavlast=110.0, højlast=330.0, spidslast=860.0)
+
+
+def _gammel_tarif(df, kundetype, lavlast, højlast, spidslast):
+    # Den oprindelige beregn_tarif fra appen (på HourDK) - referencen for tarifkalenderen. Eneste ændring:
+    # helligdagene for årene er udfyldt, for isin(holidays.Denmark()) så en tom kalender og fandt ingen helligdage
+    df = df.copy()
+    kolonne_0 = np.array([lavlast]*6 + [højlast]*11 + [spidslast]*4 + [højlast]*3)
+    kolonne_1 = np.array([lavlast]*6 + [spidslast]*15 + [højlast]*3)
+    kolonne_2 = np.array([lavlast]*6 + [højlast]*18)
+    kolonne_3 = np.array([lavlast]*24)
+    dk_holidays = list(holidays.Denmark(years=range(df['HourDK'].dt.year.min(), df['HourDK'].dt.year.max() + 1)))
+
+    df['hour'] = df['HourDK'].dt.hour
+    df['weekday'] = df['HourDK'].dt.weekday
+    df['month'] = df['HourDK'].dt.month
+    df['is_holiday'] = df['HourDK'].dt.date.isin(dk_holidays)
+
+    if kundetype == "C":
+        df['tarif'] = kolonne_0[df['hour']]
+    else:
+        conditions = [
+            ((df['month'] >= 4) & (df['month'] <= 9)) & ((df['weekday'] >= 5) | df['is_holiday']),
+            ((df['month'] >= 4) & (df['month'] <= 9)) & ((df['weekday'] < 5) & (~df['is_holiday'])),
+            ((df['month'] < 4) | (df['month'] > 9)) & ((df['weekday'] >= 5) | df['is_holiday']),
+            ((df['month'] < 4) | (df['month'] > 9)) & ((df['weekday'] < 5) & (~df['is_holiday']))
+        ]
+        choices = [kolonne_3[df['hour']], kolonne_2[df['hour']], kolonne_2[df['hour']], kolonne_1[df['hour']]]
+        df['tarif'] = np.select(conditions, choices)
+    return df
+
+
+def _spottimer(fra, til):
+    tid_utc = pd.date_range(fra, til, freq="h", tz="UTC", inclusive="left")
+    return pd.DataFrame({"HourUTC": tid_utc, "HourDK": tid_utc.tz_convert("Europe/Copenhagen"), "SpotPriceDKK": 500.0})
+
+
+@pytest.mark.parametrize("kundetype", KUNDETYPER)
+def test_kalender_som_oprindelig_tarif(kundetype):
+    # Tre hele år med påske, pinse, jul og alle skift mellem sommer- og vintertid - og årsskifter
+    df = _spottimer("2023-12-31 20:00", "2026-12-31 23:00")
+    ny = beregn_tarif(df, kundetype, **SATSER)["tarif"].to_numpy()
+    gammel = _gammel_tarif(df, kundetype, **SATSER)["tarif"].to_numpy(dtype=float)
+    np.testing.assert_array_equal(ny, gammel)
+
+
+@pytest.mark.parametrize("dag", [date(2025, 3, 30), date(2025, 10, 26), date(2025, 4, 18), date(2025, 12, 24)])
+def test_tarif_pr_sekund_følger_timen(dag):
+    # Hvert sekund får tariffen for den danske time det ligger i - også i døgn med 23 og 25 timer
+    start = pd.Timestamp(dag, tz="Europe/Copenhagen").tz_convert("UTC")
+    sekunder = pd.date_range(start, start + pd.Timedelta(hours=25), freq="7s", inclusive="left")
+    timer = _spottimer(start.floor("h"), start + pd.Timedelta(hours=26))
+    forventet = _gammel_tarif(timer, "B-høj", **SATSER).set_index("HourUTC")["tarif"]
+    fik = tarif_pr_tidspunkt(epoch_sekunder(sekunder), "B-høj", **SATSER)
+    np.testing.assert_array_equal(fik, forventet.loc[sekunder.floor("h")].to_numpy(dtype=float))
+
+
+def test_helligdage_er_fridage():
+    # Langfredag 2025 (sommer) og juledag 2025 (torsdag, vinter) tariferes som weekend - almindelige hverdage ikke
+    df = _spottimer("2025-04-15 22:00", "2025-04-18 22:00")
+    df = pd.concat([df, _spottimer("2025-12-23 23:00", "2025-12-25 23:00")], ignore_index=True)
+    tarif = beregn_tarif(df, "A-høj", **SATSER).set_index("HourDK")["tarif"]
+    assert tarif.loc["2025-04-16 12:00"].item() == SATSER["højlast"]
+    assert tarif.loc["2025-04-18 12:00"].item() == SATSER["lavlast"]
+    assert tarif.loc["2025-12-24 12:00"].item() == SATSER["spidslast"]
+    assert tarif.loc["2025-12-25 12:00"].item() == SATSER["højlast"]
+
+
+def test_dagtyper():
+    # Dagtype for kl. 12 dansk tid: sommer (april-september) og weekend/helligdag
+    middag = pd.DatetimeIndex([pd.Timestamp(d, tz="Europe/Copenhagen") + pd.Timedelta(hours=12) for d in
+                               ["2025-03-31", "2025-04-01", "2025-04-18", "2025-04-19", "2025-10-01", "2025-12-25"]])
+    assert list(dagtyper(epoch_sekunder(middag))) == [0, SOMMER, SOMMER + FRIDAG, SOMMER + FRIDAG, 0, FRIDAG]
@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datetime import date
+
+from flex_beregner.data import filtrer_data, klargør_aktiveringsdata
+from flex_beregner.tidsindeks import Tidsindeks
+
+
+def _data():
+    # Ét minut ad gangen for begge områder hen over begge skift mellem sommer- og vintertid, i blandet rækkefølge
+    tider = np.concatenate([pd.date_range("2025-03-28 20:00", "2025-04-01 02:00", freq="min", tz="UTC"),
+                            pd.date_range("2025-10-24 20:00", "2025-10-28 02:00", freq="min", tz="UTC")])
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "ActivationTime": np.tile(tider, 2),
+        "PriceArea": np.repeat(["DK1", "DK2"], len(tider)),
+        "aFRR_DownActivatedPriceEUR": rng.normal(50, 20, 2 * len(tider)).astype(np.float32),
+        "aFRR_UpActivatedPriceEUR": rng.normal(90, 30, 2 * len(tider)).astype(np.float32),
+    })
+    return klargør_aktiveringsdata(df.sample(frac=1, random_state=1).reset_index(drop=True))
+
+
+@pytest.mark.parametrize("fra, til", [(date(2025, 3, 29), date(2025, 3, 31)), (date(2025, 3, 30), date(2025, 3, 30)),
+                                      (date(2025, 10, 26), date(2025, 10, 26)), (date(2025, 3, 31), date(2025, 10, 25)),
+                                      (date(2025, 6, 1), date(2025, 6, 30))])
+def test_udsnit_som_filtrer_data(fra, til):
+    df = _data()
+    indeks = Tidsindeks(df)
+    for område in ("DK1", "DK2"):
+        forventet = filtrer_data(df, område, fra, til).sort_values("Tid (UTC)", kind="stable").reset_index(drop=True)
+        udsnit = indeks.udsnit(område, fra, til)
+        assert list(udsnit["Tid (UTC)"]) == list(forventet["Tid (UTC)"])
+        np.testing.assert_array_equal(udsnit["aFRR-op aktiveringspris (EUR)"], forventet["aFRR-op aktiveringspris (EUR)"])
+        assert (udsnit["Tid (DK)"].dt.date >= fra).all() and (udsnit["Tid (DK)"].dt.date <= til).all()
+        assert indeks.antal_dage(område, fra, til) == forventet["Tid (DK)"].dt.date.nunique()
+
+
+def test_døgn_ved_skift_til_sommer_og_vintertid():
+    indeks = Tidsindeks(_data())
+    assert len(indeks.arrays("DK1", date(2025, 3, 30), date(2025, 3, 30))) == 23 * 60
+    assert len(indeks.arrays("DK1", date(2025, 10, 26), date(2025, 10, 26))) == 25 * 60
+
+
+def test_arrays_er_views_uden_kopi():
+    indeks = Tidsindeks(_data())
+    udsnit = indeks.arrays("DK2", date(2025, 3, 29), date(2025, 3, 30))
+    assert np.shares_memory(udsnit.sekunder, indeks.sekunder["DK2"])
+    assert np.shares_memory(udsnit.op_eur, indeks.op_eur["DK2"])
+    assert np.all(np.diff(indeks.sekunder["DK2"]) > 0)
+
+
+def test_ukendt_område():
+    with pytest.raises(KeyError):
+        Tidsindeks(_data()).arrays("SE3", date(2025, 3, 29), date(2025, 3, 30))
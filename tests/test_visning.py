@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from flex_beregner.visning import MAKS_PUNKTER, aggreger, decimer, lttb_indeks, minmax_indeks
+
+
+def _serie(n, seed=0):
+    # Støj med enkelte spidser og et hul med NaN
+    rng = np.random.default_rng(seed)
+    y = np.cumsum(rng.normal(0, 1, n))
+    y[rng.choice(n, 5, replace=False)] += 500
+    y[n // 3:n // 3 + 50] = np.nan
+    return y
+
+
+def test_korte_serier_røres_ikke():
+    y = _serie(MAKS_PUNKTER)
+    np.testing.assert_array_equal(minmax_indeks(y), np.arange(len(y)))
+    np.testing.assert_array_equal(lttb_indeks(np.arange(len(y)), y), np.arange(len(y)))
+
+
+@pytest.mark.parametrize("n, maks", [(86400, 2000), (25 * 3600, 400), (10_001, 8), (5000, 4001)])
+def test_minmax_bevarer_toppe_og_dale(n, maks):
+    y = _serie(n)
+    indeks = minmax_indeks(y, maks)
+    assert len(indeks) <= maks and np.all(np.diff(indeks) > 0)
+    assert indeks[0] == 0 and indeks[-1] == n - 1
+    assert np.nanmax(y[indeks]) == np.nanmax(y) and np.nanmin(y[indeks]) == np.nanmin(y)
+
+    # Hver spands mindste og største værdi er med
+    spande = maks // 4
+    bredde = -(-n // spande)
+    for s in range(0, n, bredde):
+        spand = y[s:s + bredde]
+        if np.isnan(spand).all():
+            continue
+        valgt = y[indeks[(indeks >= s) & (indeks < s + bredde)]]
+        assert np.nanmax(valgt) == np.nanmax(spand) and np.nanmin(valgt) == np.nanmin(spand)
+
+
+def test_lttb_vælger_ét_punkt_pr_spand():
+    n, maks = 86400, 500
+    x = np.arange(n, dtype=float)
+    y = np.zeros(n)
+    y[12345] = 100.0  # en enkelt spids skal med
+    indeks = lttb_indeks(x, y, maks)
+    assert len(indeks) == maks and indeks[0] == 0 and indeks[-1] == n - 1
+    assert np.all(np.diff(indeks) > 0)
+    assert 12345 in indeks
+
+    # Et punkt i hver spand mellem kanterne
+    kanter = np.linspace(1, n - 1, maks - 1).astype(np.int64)
+    assert np.all((indeks[1:-1] >= kanter[:-1]) & (indeks[1:-1] < kanter[1:]))
+
+
+@pytest.mark.parametrize("metode", ["minmax", "lttb"])
+def test_decimer_på_dansk_tid(metode):
+    # Et døgn pr. sekund hen over skiftet til vintertid: værdierne er seriens egne, indekset er dansk vægur
+    tid = pd.date_range("2025-10-25 22:00", "2025-10-26 23:00", freq="s", tz="UTC", inclusive="left")
+    df = pd.DataFrame({"Tid (DK)": tid.tz_convert("Europe/Copenhagen"), "aktiveret_MW": _serie(len(tid))})
+    ud = decimer(df, "aktiveret_MW", maks_punkter=1000, metode=metode)
+    assert len(ud) <= 1000 and ud.index.name == "Tid (DK)" and ud.index.tz is None
+    assert ud.index[0] == pd.Timestamp("2025-10-26 00:00") and ud.index[-1] == pd.Timestamp("2025-10-26 23:59:59")
+    opslag = pd.Series(df["aktiveret_MW"].to_numpy(), index=df["Tid (DK)"].dt.tz_localize(None))
+    opslag = opslag[~opslag.index.duplicated()]  # 02:00-03:00 forekommer to gange på vægur
+    enkelt = ~ud.index.isin(opslag.index[(opslag.index.hour == 2)])
+    np.testing.assert_array_equal(ud["aktiveret_MW"].to_numpy()[enkelt], opslag.loc[ud.index[enkelt]].to_numpy())
+
+
+def test_aggreger_pr_time_over_skift_til_vintertid():
+    # 25 timer i døgnet; satser pr. sekund summeres til MWh
+    tid = pd.date_range("2025-10-25 22:00", "2025-10-26 23:00", freq="s", tz="UTC", inclusive="left")
+    df = pd.DataFrame({"Tid (DK)": tid.tz_convert("Europe/Copenhagen"), "aktiveret_MW": 2.0})
+    pr_time = aggreger(df, "h")
+    assert len(pr_time) == 25 and (pr_time["rækker"] == 3600).all()
+    np.testing.assert_allclose(pr_time["aktiveret_MWh"], 2.0)
+    pr_dag = aggreger(df, "D")
+    assert len(pr_dag) == 1 and pr_dag["aktiveret_MWh"].item() == pytest.approx(50.0)